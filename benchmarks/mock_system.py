@@ -0,0 +1,262 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+"""Synthetic large Qubes systems for benchmarks: MockQubesComplete extended
+with a given number of generated qubes, devices, pools and policy files."""
+
+# pylint: disable=protected-access
+import subprocess
+from typing import Dict, List
+
+from qubesadmin.tests.mock_app import MockDevice, MockQube, MockQubesComplete
+
+try:
+    from qrexec.policy.admin import PolicyAdminFileNotFoundException
+
+    admin_exc = True
+except ImportError:
+    admin_exc = False
+
+LABELS = ["red", "orange", "yellow", "green", "gray", "blue", "purple", "black"]
+
+# files read by the global config; see global_config.PAGE_POLICY_FILES
+CONFIG_POLICY_FILES = {
+    "qubes.InputKeyboard": "50-config-input",
+    "qubes.InputMouse": "50-config-input",
+    "qubes.InputTablet": "50-config-input",
+    "u2f.Register": "50-config-u2f",
+    "u2f.Authenticate": "50-config-u2f",
+    "policy.RegisterArgument": "50-config-u2f",
+    "qubes.UpdatesProxy": "50-config-updates",
+    "qubes.Gpg": "50-config-splitgpg",
+    "qubes.ClipboardPaste": "50-config-clipboard",
+    "qubes.Filecopy": "50-config-filecopy",
+    "qubes.OpenInVM": "50-config-openinvm",
+    "qubes.OpenURL": "50-config-openurl",
+}
+
+# file with a rule for every generated qube, listed for every service
+USER_POLICY_FILE = "30-user"
+
+
+class BenchmarkPolicyClient:
+    """Policy client serving generated policy files; every call is recorded
+    in `calls`, as each of them is a separate qrexec call on a real
+    system."""
+
+    def __init__(self, files: Dict[str, str]):
+        self.files = files
+        self.file_tokens = {name: str(len(text)) for name, text in files.items()}
+        self.include_files: Dict[str, str] = {}
+        self.calls: List[tuple] = []
+
+    def policy_get_files(self, service_name):
+        self.calls.append(("policy_get_files", service_name))
+        files = [USER_POLICY_FILE]
+        if service_name in CONFIG_POLICY_FILES:
+            files.append(CONFIG_POLICY_FILES[service_name])
+        return files
+
+    def policy_get(self, file_name):
+        self.calls.append(("policy_get", file_name))
+        if file_name in self.files:
+            return self.files[file_name], self.file_tokens[file_name]
+        if admin_exc:
+            raise PolicyAdminFileNotFoundException
+        raise subprocess.CalledProcessError(2, "test")
+
+    def policy_include_get(self, file_name):
+        self.calls.append(("policy_include_get", file_name))
+        if file_name in self.include_files:
+            return self.include_files[file_name], str(len(file_name))
+        if admin_exc:
+            raise PolicyAdminFileNotFoundException
+        raise subprocess.CalledProcessError(2, "test")
+
+    def policy_replace(self, filename, policy_text, token="any"):
+        # pylint: disable=unused-argument
+        self.calls.append(("policy_replace", filename))
+        self.files[filename] = policy_text
+        self.file_tokens[filename] = str(len(policy_text))
+
+    def policy_include_replace(self, filename, policy_text, token="any"):
+        # pylint: disable=unused-argument
+        self.calls.append(("policy_include_replace", filename))
+        self.include_files[filename] = policy_text
+
+    def policy_list(self):
+        self.calls.append(("policy_list",))
+        return list(self.files.keys())
+
+    def policy_include_list(self):
+        self.calls.append(("policy_include_list",))
+        return list(self.include_files.keys())
+
+
+class MockSystem:
+    """A mock Qubes system with num_qubes generated qubes: one in ten is a
+    template, one in twenty a disposable template, the rest are AppVMs
+    based on them; every third AppVM is running. Every fifth AppVM has
+    an USB device assigned, and there are 1/10 as many block devices and
+    1/50 as many additional pools as qubes."""
+
+    def __init__(self, num_qubes: int):
+        self.num_qubes = num_qubes
+        self.qapp = MockQubesComplete()
+        self.templates: List[str] = []
+        self.dvm_templates: List[str] = []
+        self.appvms: List[str] = []
+
+        self._add_qubes()
+        self.qapp.update_vm_calls()
+        self._add_devices()
+        self.qapp.update_vm_calls()
+        self._add_pools()
+
+        self.policy_files = self.generate_policy()
+        self.policy_client = BenchmarkPolicyClient(dict(self.policy_files))
+
+    def _add_qubes(self):
+        num_templates = max(1, self.num_qubes // 10)
+        num_dvm_templates = max(1, self.num_qubes // 20)
+        for i in range(self.num_qubes):
+            label = LABELS[i % len(LABELS)]
+            if i < num_templates:
+                name = f"bench-template-{i}"
+                MockQube(
+                    name=name,
+                    qapp=self.qapp,
+                    klass="TemplateVM",
+                    label=label,
+                    netvm="",
+                    updateable=True,
+                    installed_by_rpm=True,
+                    features={
+                        "updates-available": "1" if i % 2 else "",
+                        "last-updates-check": "2026-01-01 00:00:00",
+                        "last-update": "2026-01-01 00:00:00",
+                        "template-name": "fedora-42",
+                    },
+                )
+                self.templates.append(name)
+                continue
+            template = self.templates[i % len(self.templates)]
+            if i < num_templates + num_dvm_templates:
+                name = f"bench-dvm-{i}"
+                MockQube(
+                    name=name,
+                    qapp=self.qapp,
+                    label=label,
+                    template=template,
+                    template_for_dispvms=True,
+                    features={"appmenus-dispvm": "1"},
+                )
+                self.dvm_templates.append(name)
+                continue
+            name = f"bench-vm-{i}"
+            MockQube(
+                name=name,
+                qapp=self.qapp,
+                label=label,
+                template=template,
+                netvm="sys-firewall",
+                running=len(self.appvms) % 3 == 0,
+            )
+            self.appvms.append(name)
+
+    def _add_devices(self):
+        for i, vm_name in enumerate(self.appvms[::5]):
+            self.qapp._devices.append(
+                MockDevice(
+                    self.qapp,
+                    dev_class="usb",
+                    product=f"Bench USB {i}",
+                    vendor="ACME",
+                    backend_vm="sys-usb",
+                    assigned=[(vm_name, "auto-attach", None)],
+                    device_id=f"{i}:{i}:u011010",
+                    port=f"3-{i}",
+                )
+            )
+        for i in range(self.num_qubes // 10):
+            self.qapp._devices.append(
+                MockDevice(
+                    self.qapp,
+                    dev_class="block",
+                    product=f"Bench Disk {i}",
+                    vendor="ACME",
+                    backend_vm="sys-usb",
+                    device_id=f"{i}:{i}:b123422",
+                    port=f"loop{i}",
+                )
+            )
+
+    def _add_pools(self):
+        list_call = ("dom0", "admin.pool.List", None, None)
+        pool_list = self.qapp.expected_calls.get(list_call, b"0\x00")
+        for i in range(self.num_qubes // 50):
+            name = f"bench-pool-{i}"
+            size = 100 * 1024**3
+            usage = (i * 7 % 100) * 1024**3
+            pool_list += f"{name}\n".encode()
+            self.qapp.expected_calls[("dom0", "admin.pool.Info", name, None)] = (
+                f"0\x00driver=lvm_thin\nrevisions_to_keep=2\n"
+                f"size={size}\nusage={usage}\n".encode()
+            )
+            self.qapp.expected_calls[
+                ("dom0", "admin.pool.UsageDetails", name, None)
+            ] = (
+                f"0\x00data_size={size}\ndata_usage={usage}\n"
+                f"metadata_size={size // 100}\nmetadata_usage={usage // 100}\n".encode()
+            )
+        self.qapp.expected_calls[list_call] = pool_list
+
+    def generate_policy(self) -> Dict[str, str]:
+        """Policy files referencing the generated qubes: a rule for every
+        AppVM in the user file and in the file copy and clipboard config
+        files, and a few rules in the remaining config files."""
+        files = {name: "" for name in set(CONFIG_POLICY_FILES.values())}
+        user_rules = []
+        filecopy_rules = []
+        clipboard_rules = []
+        for i, vm_name in enumerate(self.appvms):
+            target = self.appvms[(i + 1) % len(self.appvms)]
+            user_rules.append(f"qubes.VMShell * {vm_name} {target} ask")
+            filecopy_rules.append(
+                f"qubes.Filecopy * {vm_name} {target} " f"{'allow' if i % 2 else 'ask'}"
+            )
+            clipboard_rules.append(f"qubes.ClipboardPaste * {vm_name} @anyvm ask")
+        user_rules.append("qubes.VMShell * @anyvm @anyvm deny")
+        filecopy_rules.append("qubes.Filecopy * @anyvm @anyvm ask")
+        clipboard_rules.append("qubes.ClipboardPaste * @adminvm @anyvm deny")
+
+        files[USER_POLICY_FILE] = "\n".join(user_rules)
+        files["50-config-filecopy"] = "\n".join(filecopy_rules)
+        files["50-config-clipboard"] = "\n".join(clipboard_rules)
+        for vm_name in self.dvm_templates:
+            files[
+                "50-config-openinvm"
+            ] += f"qubes.OpenInVM * @anyvm @dispvm:{vm_name} allow\n"
+        return files
+
+    def admin_calls(self) -> int:
+        return len(self.qapp.actual_calls)
+
+    def policy_calls(self) -> int:
+        return len(self.policy_client.calls)
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+"""
+Benchmarks of widgets and global config on synthetic large systems.
+
+For every system size, each benchmark is run on a freshly generated
+mock system (see mock_system.py); wall-clock time and the number of
+Admin API and policy API calls are reported as JSON, e.g.:
+
+    PYTHONPATH=.:../core-admin-client:../core-qrexec xvfb-run \\
+        python3 benchmarks/run_benchmarks.py --output benchmarks.json
+
+Calls made by background threads started by the measured code (for
+example, global config prefetching) are counted, but their time is not.
+"""
+
+# pylint: disable=wrong-import-position,import-error
+import argparse
+import asyncio
+import importlib.resources
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import traceback
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gi  # isort:skip
+
+gi.require_version("Gtk", "3.0")  # isort:skip
+from gi.repository import Gtk  # isort:skip
+
+from qubesadmin.tests.mock_app import MockDispatcher
+
+from benchmarks.mock_system import MockSystem, USER_POLICY_FILE
+from qubes_config.global_config.global_config import GlobalConfig
+from qubes_config.global_config.policy_handler import PolicyHandler
+from qubes_config.global_config.policy_manager import PolicyManager
+from qubes_config.global_config.policy_rules import (
+    RuleSimple,
+    SimpleVerbDescription,
+)
+from qui.devices import backend
+from qui.devices.device_widget import DevicesTray
+from qui.tray import disk_space
+from qui.tray.domains import DomainTray
+from qui.updater.intro_page import IntroPage
+
+DEFAULT_SIZES = [50, 200, 1000]
+
+Measurement = Dict[str, float]
+
+
+class UpdaterSettings:
+    """Default updater settings."""
+
+    # pylint: disable=too-few-public-methods
+    update_if_stale = 7
+    restart_service_vms = True
+    restart_other_vms = True
+    max_concurrency = None
+    hide_updated = False
+    hide_skipped = True
+    hide_prohibited = True
+
+
+def measure(
+    system: MockSystem, func: Callable, settle: Optional[Callable] = None
+) -> Measurement:
+    """Time func() and count calls it made; settle() is called after
+    the time is measured, but before calls are counted."""
+    admin_calls = system.admin_calls()
+    policy_calls = system.policy_calls()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    if settle:
+        settle()
+    return {
+        "seconds": seconds,
+        "admin_calls": system.admin_calls() - admin_calls,
+        "policy_calls": system.policy_calls() - policy_calls,
+    }
+
+
+def get_policy_manager(system: MockSystem) -> PolicyManager:
+    manager = PolicyManager()
+    manager.policy_client = system.policy_client
+    return manager
+
+
+def get_builder(glade_file: str, package: str = "qubes_config") -> Gtk.Builder:
+    builder = Gtk.Builder()
+    glade_ref = importlib.resources.files(package) / glade_file
+    with importlib.resources.as_file(glade_ref) as path:
+        builder.add_from_file(str(path))
+    return builder
+
+
+def bench_domains(system: MockSystem) -> Iterator[Tuple[str, Measurement]]:
+    dispatcher = MockDispatcher(system.qapp)
+    app = DomainTray(
+        f"org.qubes.qui.tray.Domains.bench{system.num_qubes}",
+        system.qapp,
+        dispatcher,
+        MockDispatcher(system.qapp),
+    )
+    yield "DomainTray.initialize_menu", measure(system, app.initialize_menu)
+
+
+def bench_devices(system: MockSystem) -> Iterator[Tuple[str, Measurement]]:
+    app = DevicesTray(
+        f"org.qubes.qui.tray.Devices.bench{system.num_qubes}",
+        system.qapp,
+        MockDispatcher(system.qapp),
+    )
+
+    # the constructor already did it once, start from scratch
+    app.devices = backend.DeviceRegistry()
+    app.cameras_to_hide = []
+    yield "DevicesTray.initialize_dev_data", measure(system, app.initialize_dev_data)
+
+    yield "DevicesTray.show_menu", measure(
+        system, lambda: app.show_menu(None, None), settle=app.tray_menu.popdown
+    )
+
+
+def bench_disk_space(system: MockSystem) -> Iterator[Tuple[str, Measurement]]:
+    # do not touch the usage history of the user running the benchmarks
+    with mock.patch.object(disk_space.UsageHistory, "load"), mock.patch.object(
+        disk_space.UsageHistory, "save"
+    ):
+        app = disk_space.DiskSpace(system.qapp, MockDispatcher(system.qapp))
+        loop = asyncio.new_event_loop()
+
+        def refresh():
+            for vm in disk_space.VMUsageData.find_running(system.qapp):
+                app.vm_data.add_vm(vm)
+            loop.run_until_complete(app.refresh_usage())
+            app.refresh_icon()
+
+        try:
+            yield "DiskSpace.refresh_usage+refresh_icon", measure(system, refresh)
+        finally:
+            app.poll_executor.shutdown(wait=True)
+            loop.close()
+
+
+def bench_global_config(system: MockSystem) -> Iterator[Tuple[str, Measurement]]:
+    try:
+        GlobalConfig.register_signals()
+    except RuntimeError:
+        # signals already registered
+        pass
+    app = GlobalConfig(system.qapp, get_policy_manager(system))
+    with mock.patch("subprocess.check_output", return_value=b""), mock.patch(
+        "qubes_config.global_config.global_config.show_error"
+    ):
+        yield "GlobalConfig.perform_setup", measure(
+            system,
+            app.perform_setup,
+            # count also calls made by prefetching of other pages
+            settle=app._shutdown_executor,  # pylint: disable=protected-access
+        )
+
+
+def bench_updater(system: MockSystem) -> Iterator[Tuple[str, Measurement]]:
+    builder = get_builder("updater.glade", package="qui")
+    next_button = builder.get_object("button_next")
+    page = IntroPage(builder, mock.Mock(), next_button)
+    with mock.patch("subprocess.check_output", return_value=b""):
+        yield "IntroPage.populate_vm_list", measure(
+            system, lambda: page.populate_vm_list(system.qapp, UpdaterSettings())
+        )
+
+
+def bench_policy_handler(system: MockSystem) -> Iterator[Tuple[str, Measurement]]:
+    try:
+        GlobalConfig.register_signals()
+    except RuntimeError:
+        # signals already registered
+        pass
+    policy_manager = get_policy_manager(system)
+    handler = PolicyHandler(
+        qapp=system.qapp,
+        gtk_builder=get_builder("tests/test.glade"),
+        prefix="policytest",
+        policy_manager=policy_manager,
+        default_policy="qubes.VMShell * @anyvm @anyvm deny",
+        service_name="qubes.VMShell",
+        policy_file_name=USER_POLICY_FILE,
+        verb_description=SimpleVerbDescription({}),
+        rule_class=RuleSimple,
+    )
+    rules = policy_manager.text_to_rules(system.policy_files[USER_POLICY_FILE])
+    yield "PolicyHandler.populate_rule_lists", measure(
+        system, lambda: handler.populate_rule_lists(rules)
+    )
+
+
+BENCHMARKS: Dict[str, Callable[[MockSystem], Iterator[Tuple[str, Measurement]]]] = {
+    "domains": bench_domains,
+    "devices": bench_devices,
+    "disk_space": bench_disk_space,
+    "global_config": bench_global_config,
+    "updater": bench_updater,
+    "policy_handler": bench_policy_handler,
+}
+
+
+def run_benchmark(name: str, num_qubes: int, repeat: int) -> List[Dict]:
+    """Run a benchmark repeat times, each time on a new system; the best
+    time is reported."""
+    results: Dict[str, Dict] = {}
+    for _ in range(repeat):
+        system = MockSystem(num_qubes)
+        try:
+            for case, measurement in BENCHMARKS[name](system):
+                result = results.setdefault(
+                    case, {"benchmark": case, "group": name, "qubes": num_qubes}
+                )
+                result["seconds"] = min(
+                    measurement["seconds"], result.get("seconds", float("inf"))
+                )
+                result["admin_calls"] = measurement["admin_calls"]
+                result["policy_calls"] = measurement["policy_calls"]
+        except Exception:  # pylint: disable=broad-except
+            # keep results of other benchmarks, but make the failure visible
+            results.setdefault(
+                name, {"benchmark": name, "group": name, "qubes": num_qubes}
+            )["error"] = traceback.format_exc(limit=5)
+            break
+    return list(results.values())
+
+
+def get_commit() -> Optional[str]:
+    commit = os.environ.get("CI_COMMIT_SHA")
+    if commit:
+        return commit
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="numbers of qubes in generated systems",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=list(BENCHMARKS),
+        help="run only selected benchmarks",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="run every benchmark this many times and report the best time",
+    )
+    parser.add_argument(
+        "--output", help="write results to this file instead of standard output"
+    )
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    results = []
+    for num_qubes in args.sizes:
+        for name in args.only or BENCHMARKS:
+            results.extend(run_benchmark(name, num_qubes, max(1, args.repeat)))
+
+    report = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    return int(any("error" in result for result in results))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -88,6 +88,8 @@ class ConflictFileHandler:
 
         conflicting_files = []
 
+        # get file lists for all services in one batch
+        self.policy_manager.get_policy_files(self.service_names)
         for service in self.service_names:
             conflicting_files.extend(
                 self.policy_manager.get_conflicting_policy_files(
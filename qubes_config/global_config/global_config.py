@@ -21,10 +21,11 @@
 # pylint: disable=import-error
 """Global Qubes Config tool."""
 
+import concurrent.futures
 import sys
 import threading
 import time
-from typing import Dict, Optional, List, Union, Any
+from typing import Dict, Optional, List, Union, Any, Callable
 from html import escape
 import importlib.resources
 import logging
@@ -41,6 +42,7 @@ from ..widgets.gtk_utils import (
     show_dialog,
 )
 from ..widgets.gtk_widgets import ProgressBarDialog, ViewportHandler
+from ..widgets.profiler import setup_profiling
 from ..widgets.utils import open_url_in_disposable
 from .page_handler import PageHandler
 from .policy_handler import PolicyHandler, VMSubsetPolicyHandler
@@ -55,7 +57,7 @@ from .policy_manager import PolicyManager
 from .updates_handler import UpdatesHandler
 from .usb_devices import DevicesHandler
 from .basics_handler import BasicSettingsHandler, FeatureHandler
-from .thisdevice_handler import ThisDeviceHandler
+from .thisdevice_handler import ThisDeviceHandler, HCLReport
 from .device_attachments import DevAttachmentHandler
 from .disposables import DisposablesHandler
 
@@ -96,6 +98,34 @@ LOCATIONS = [
     "preloading",
 ]
 
+PREFETCH_WORKERS = 4
+
+# policy files read by page handlers, fetched in background at startup
+PAGE_POLICY_FILES = {
+    "usb": ["50-config-input", "50-config-u2f"],
+    "updates": ["50-config-updates"],
+    "splitgpg": ["50-config-splitgpg"],
+    "clipboard": ["50-config-clipboard"],
+    "file": ["50-config-filecopy"],
+    "disposables": ["50-config-openinvm", "50-config-openurl"],
+}
+
+# services whose policy files are checked for conflicts by page handlers
+POLICY_SERVICES = [
+    "qubes.InputKeyboard",
+    "qubes.InputMouse",
+    "qubes.InputTablet",
+    "u2f.Register",
+    "u2f.Authenticate",
+    "policy.RegisterArgument",
+    "qubes.UpdatesProxy",
+    "qubes.Gpg",
+    "qubes.ClipboardPaste",
+    "qubes.Filecopy",
+    "qubes.OpenInVM",
+    "qubes.OpenURL",
+]
+
 
 class ClipboardHandler(PageHandler):
     """Handler for Clipboard policy. Adds a couple of comboboxes to a
@@ -218,6 +248,10 @@ class GlobalConfig(Gtk.Application):
         self.save_thread: threading.Thread | None = None
         self.save_errors: List[str] = []
         self.handlers: Dict[str, PageHandler] = {}
+        self.handler_factories: Dict[str, Callable[[], PageHandler]] = {}
+        self.executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.prefetch_futures: Dict[str, concurrent.futures.Future] = {}
+        self.hcl_report = HCLReport()
 
     def do_command_line(self, command_line):
         """
@@ -260,6 +294,10 @@ class GlobalConfig(Gtk.Application):
             widget = self.builder.get_object(widget_name)
             widget.set_visible(False)
 
+        # hardware report takes seconds, generate it only once the window
+        # is up, so that This Device page can be shown right away
+        GLib.idle_add(self.start_hcl_report)
+
         self.hold()
 
     def scroll_to_location(self, location_string):
@@ -273,11 +311,7 @@ class GlobalConfig(Gtk.Application):
         else:
             page, location = location_string, None
 
-        for i in range(self.main_notebook.get_n_pages()):
-            if self.main_notebook.get_nth_page(i).get_name() == page:
-                self.main_notebook.set_current_page(i)
-                break
-        else:
+        if not self.select_page(page):
             print("Page not found: ", page, file=sys.stderr)
             return
 
@@ -288,6 +322,15 @@ class GlobalConfig(Gtk.Application):
         elif location:
             print("Location not found: ", location, file=sys.stderr)
 
+    def select_page(self, page_name: str) -> bool:
+        """Switch to the page with the provided name. Return False if
+        no such page was found."""
+        for i in range(self.main_notebook.get_n_pages()):
+            if self.main_notebook.get_nth_page(i).get_name() == page_name:
+                self.main_notebook.set_current_page(i)
+                return True
+        return False
+
     @staticmethod
     def register_signals():
         """Register necessary Gtk signals"""
@@ -351,28 +394,129 @@ class GlobalConfig(Gtk.Application):
 
         self.main_window.connect("delete-event", self._ask_to_quit)
 
-        page_progress = 1 / self.main_notebook.get_n_pages()
+        # match page by widget name to handler factory; handlers are
+        # created when their page is first shown
+        self.handler_factories = {
+            "basics": self._create_basics_handler,
+            "usb": self._create_usb_handler,
+            "updates": self._create_updates_handler,
+            "attachments": self._create_attachments_handler,
+            "splitgpg": self._create_splitgpg_handler,
+            "clipboard": self._create_clipboard_handler,
+            "file": self._create_file_handler,
+            "disposables": self._create_disposables_handler,
+            "thisdevice": self._create_thisdevice_handler,
+        }
+        self.start_prefetch()
+        self.progress_bar_dialog.update_progress(0.5)
 
-        # match page by widget name to handler
-        self.handlers["basics"] = BasicSettingsHandler(self.builder, self.qapp)
-        self.progress_bar_dialog.update_progress(page_progress)
+        if self.open_at:
+            self.select_page(self.open_at.split("#")[0])
+        self.get_current_page()
+
+        self.main_notebook.connect("switch-page", self._page_switched)
+
+        self._handle_urls()
 
-        self.handlers["usb"] = DevicesHandler(
-            self.qapp, self.policy_manager, self.builder
+        self.viewport_handler = ViewportHandler(
+            self.main_window,
+            [
+                self.builder.get_object("basics_scrolled_window"),
+                self.builder.get_object("usb_scrolled_window"),
+                self.builder.get_object("updates_scrolled_window"),
+                self.builder.get_object("splitgpg_scrolled_window"),
+                self.builder.get_object("clipboard_scrolled_window"),
+                self.builder.get_object("file_scrolled_window"),
+                self.builder.get_object("disp_scrolled_window"),
+                self.builder.get_object("thisdevice_scrolled_window"),
+            ],
+        )
+
+        # workaround the uncomfortable behavior with comboboxes: combobox
+        # should not change item ID on random scrolling around
+        for obj in self.builder.get_objects():
+            if isinstance(obj, (Gtk.ComboBox, Gtk.ComboBoxText)):
+                obj.connect("scroll-event", lambda *args: True)
+
+        self.progress_bar_dialog.update_progress(1)
+        self.progress_bar_dialog.hide()
+        self.progress_bar_dialog.destroy()
+
+    def start_prefetch(self):
+        """Start fetching policy data needed by all pages in background
+        threads, so that building page handlers later does not have to wait
+        for policy admin. qubesd data is not prefetched: the Qubes object
+        is not thread-safe, so handlers read it in the main thread."""
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=PREFETCH_WORKERS, thread_name_prefix="global-config"
+            )
+        self.prefetch_futures["services"] = self.executor.submit(
+            self._prefetch_services
         )
-        self.progress_bar_dialog.update_progress(page_progress)
+        for page_name, file_names in PAGE_POLICY_FILES.items():
+            self.prefetch_futures[page_name] = self.executor.submit(
+                self._prefetch_policy, file_names
+            )
+
+    def start_hcl_report(self):
+        """Generate the HCL report in background, unless there is a valid
+        one cached."""
+        if self.hcl_report.text is None and self.executor:
+            self.hcl_report.refresh(self.executor)
+        return False
 
-        self.handlers["updates"] = UpdatesHandler(
+    def _prefetch_services(self):
+        try:
+            self.policy_manager.get_policy_files(POLICY_SERVICES)
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.debug("Failed to prefetch policy file lists: %s", ex)
+
+    def _prefetch_policy(self, file_names: List[str]):
+        try:
+            self.policy_manager.prefetch_files(file_names)
+        except Exception as ex:  # pylint: disable=broad-except
+            logger.debug("Failed to prefetch policy files %s: %s", file_names, ex)
+
+    def wait_for_prefetch(self, page_name: str):
+        """Wait until data prefetched for a given page is available; if
+        it is not yet done, that page would read stale data later."""
+        for name in ("services", page_name):
+            future = self.prefetch_futures.pop(name, None)
+            if future:
+                concurrent.futures.wait([future])
+
+    def get_handler(self, page_name: str) -> Optional[PageHandler]:
+        """Get handler for page of a given name, creating it if necessary."""
+        if page_name not in self.handlers:
+            factory = self.handler_factories.get(page_name)
+            if not factory:
+                return None
+            self.wait_for_prefetch(page_name)
+            self.handlers[page_name] = factory()
+            # anything the handler did not use would only go stale
+            for file_name in PAGE_POLICY_FILES.get(page_name, []):
+                self.policy_manager.prefetched.pop(file_name, None)
+        return self.handlers[page_name]
+
+    def _create_basics_handler(self) -> PageHandler:
+        return BasicSettingsHandler(self.builder, self.qapp)
+
+    def _create_usb_handler(self) -> PageHandler:
+        return DevicesHandler(self.qapp, self.policy_manager, self.builder)
+
+    def _create_updates_handler(self) -> PageHandler:
+        return UpdatesHandler(
             qapp=self.qapp,
             policy_manager=self.policy_manager,
             gtk_builder=self.builder,
         )
-        self.progress_bar_dialog.update_progress(page_progress)
 
-        self.handlers["attachments"] = DevAttachmentHandler(self.qapp, self.builder)
-        self.progress_bar_dialog.update_progress(page_progress)
+    def _create_attachments_handler(self) -> PageHandler:
+        return DevAttachmentHandler(self.qapp, self.builder)
 
-        self.handlers["splitgpg"] = VMSubsetPolicyHandler(
+    def _create_splitgpg_handler(self) -> PageHandler:
+        return VMSubsetPolicyHandler(
             qapp=self.qapp,
             gtk_builder=self.builder,
             policy_manager=self.policy_manager,
@@ -396,16 +540,16 @@ class GlobalConfig(Gtk.Application):
                 }
             ),
         )
-        self.progress_bar_dialog.update_progress(page_progress)
 
-        self.handlers["clipboard"] = ClipboardHandler(
+    def _create_clipboard_handler(self) -> PageHandler:
+        return ClipboardHandler(
             qapp=self.qapp,
             gtk_builder=self.builder,
             policy_manager=self.policy_manager,
         )
-        self.progress_bar_dialog.update_progress(page_progress)
 
-        self.handlers["file"] = PolicyHandler(
+    def _create_file_handler(self) -> PageHandler:
+        return PolicyHandler(
             qapp=self.qapp,
             gtk_builder=self.builder,
             prefix="filecopy",
@@ -424,48 +568,19 @@ qubes.Filecopy * @anyvm @anyvm ask""",
             rule_class=RuleSimple,
         )
 
-        self.progress_bar_dialog.update_progress(page_progress)
-        self.handlers["disposables"] = DisposablesHandler(
+    def _create_disposables_handler(self) -> PageHandler:
+        return DisposablesHandler(
             qapp=self.qapp, policy_manager=self.policy_manager, gtk_builder=self.builder
         )
-        self.progress_bar_dialog.update_progress(page_progress)
 
-        self.handlers["thisdevice"] = ThisDeviceHandler(
-            self.qapp, self.builder, self.policy_manager
+    def _create_thisdevice_handler(self) -> PageHandler:
+        return ThisDeviceHandler(
+            self.qapp,
+            self.builder,
+            self.policy_manager,
+            hcl_report=self.hcl_report,
+            executor=self.executor,
         )
-        self.progress_bar_dialog.update_progress(page_progress)
-
-        self.main_notebook.connect("switch-page", self._page_switched)
-
-        self._handle_urls()
-
-        self.progress_bar_dialog.update_progress(1)
-        self.progress_bar_dialog.hide()
-        self.progress_bar_dialog.destroy()
-
-        self.viewport_handler = ViewportHandler(
-            self.main_window,
-            [
-                self.builder.get_object("basics_scrolled_window"),
-                self.builder.get_object("usb_scrolled_window"),
-                self.builder.get_object("updates_scrolled_window"),
-                self.builder.get_object("splitgpg_scrolled_window"),
-                self.builder.get_object("clipboard_scrolled_window"),
-                self.builder.get_object("file_scrolled_window"),
-                self.builder.get_object("disp_scrolled_window"),
-                self.builder.get_object("thisdevice_scrolled_window"),
-            ],
-        )
-
-        # workaround the uncomfortable behavior with comboboxes: combobox
-        # should not change item ID on random scrolling around
-        for obj in self.builder.get_objects():
-            if isinstance(obj, (Gtk.ComboBox, Gtk.ComboBoxText)):
-                obj.connect("scroll-event", lambda *args: True)
-
-        self.progress_bar_dialog.update_progress(1)
-        self.progress_bar_dialog.hide()
-        self.progress_bar_dialog.destroy()
 
     def _handle_urls(self):
         url_label_ids = [
@@ -510,9 +625,7 @@ qubes.Filecopy * @anyvm @anyvm ask""",
     def get_current_page(self) -> Optional[PageHandler]:
         """Get currently visible page."""
         page_num = self.main_notebook.get_current_page()
-        return self.handlers.get(
-            self.main_notebook.get_nth_page(page_num).get_name(), None
-        )
+        return self.get_handler(self.main_notebook.get_nth_page(page_num).get_name())
 
     def perform_save(self, page):
         """Actual saving thread"""
@@ -520,6 +633,7 @@ qubes.Filecopy * @anyvm @anyvm ask""",
         # need to invalidate cache before and after saving to avoid
         # stale cache
         self.qapp._invalidate_cache_all()
+        self.policy_manager.invalidate_cache()
         try:
             page.save()
             for name, handler in self.handlers.items():
@@ -594,13 +708,15 @@ qubes.Filecopy * @anyvm @anyvm ask""",
                 return False
         return True
 
-    def _page_switched(self, *_args):
+    def _page_switched(self, _notebook, page: Gtk.Widget, _page_num):
         old_page_num = self.main_notebook.get_current_page()
         allow_switch = self.verify_changes()
         if not allow_switch:
             GLib.timeout_add(
                 1, lambda: self.main_notebook.set_current_page(old_page_num)
             )
+            return
+        self.get_handler(page.get_name())
 
     def _ask_unsaved(self, description: str) -> Gtk.ResponseType:
         box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
@@ -642,9 +758,15 @@ qubes.Filecopy * @anyvm @anyvm ask""",
         if page:
             page.reset()
 
+    def _shutdown_executor(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
     def _quit(self, _widget=None):
         # Hide the main Window
         self.main_window.hide()
+        self._shutdown_executor()
         while Gtk.events_pending():
             Gtk.main_iteration()
         # Then wait for disposable helper threads to finish
@@ -659,6 +781,7 @@ qubes.Filecopy * @anyvm @anyvm ask""",
         if not can_quit:
             return True
         self.main_window.hide()
+        self._shutdown_executor()
         while Gtk.events_pending():
             Gtk.main_iteration()
         self.quit()
@@ -705,6 +828,7 @@ def main():
     """
     Start the app
     """
+    setup_profiling()
     qapp = Qubes()
     qapp.cache_enabled = True
     policy_manager = PolicyManager()
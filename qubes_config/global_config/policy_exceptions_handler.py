@@ -30,7 +30,7 @@ from qrexec.policy.parser import Rule
 from .page_handler import PageHandler
 
 from .policy_handler import PolicyHandler, ErrorHandler, RawPolicyTextHandler
-from .policy_rules import SimpleVerbDescription, RuleDispVM
+from .policy_rules import SimpleVerbDescription, RuleDispVM, RuleIndex
 from .rule_list_widgets import RuleListBoxRow, DispvmRuleRow
 
 import gi
@@ -181,17 +181,14 @@ class PolicyExceptionsHandler:
         new_target: str,
         new_action: str,
     ) -> Optional[str]:
+        # pylint: disable=unused-argument
         """
         Verify correctness of a rule with new_source, new_target and new_action
         if it was to be associated with provided row. Return None if rule would
         be correct, and string description of error otherwise.
         """
-        for other_row in other_rows:
-            if other_row == row:
-                continue
-            if other_row.rule.is_rule_conflicting(new_source, new_target, new_action):
-                return str(other_row)
-        return None
+        conflict = RuleIndex(other_rows).find_conflict(row, new_source, new_target)
+        return str(conflict) if conflict else None
 
     def verify_new_rule(
         self,
@@ -308,8 +305,6 @@ class DispvmExceptionHandler(PageHandler):
             self.current_token,
         )
 
-        _rules, self.current_token = self.policy_manager.get_rules_from_filename(
-            self.policy_file_name, ""
-        )
+        self.current_token = self.policy_manager.get_token(self.policy_file_name)
 
         self.initial_rules = deepcopy(self.list_handler.current_rules)
@@ -31,7 +31,7 @@ from qrexec.exc import PolicySyntaxError
 from ..widgets.gtk_widgets import VMListModeler, ExpanderHandler
 from ..widgets.gtk_utils import show_error, ask_question, show_dialog_with_icon
 from .page_handler import PageHandler
-from .policy_rules import AbstractRuleWrapper, AbstractVerbDescription
+from .policy_rules import AbstractRuleWrapper, AbstractVerbDescription, RuleIndex
 from .policy_manager import PolicyManager
 from .rule_list_widgets import (
     RuleListBoxRow,
@@ -97,6 +97,8 @@ class PolicyHandler(PageHandler):
         self.verb_description = verb_description
         self.rule_class = rule_class
         self.include_adminvm = include_admin_vm
+        # index of current rows for conflict checking, built on demand
+        self.rule_index: Optional[RuleIndex] = None
 
         # main widgets
         self.custom_settings_box: Gtk.Box = gtk_builder.get_object(
@@ -162,6 +164,7 @@ class PolicyHandler(PageHandler):
         self.main_list_box.connect("map", self.on_switch)
 
     def _populate_raw_rules(self, *_args):
+        self.rule_index = None
         self.raw_handler.fill_raw(self.current_rules)
 
     def add_new_rule(self, *_args):
@@ -344,17 +347,14 @@ class PolicyHandler(PageHandler):
         new_target: str,
         new_action: str,
     ) -> Optional[str]:
+        # pylint: disable=unused-argument
         """
         Verify correctness of a rule with new_source, new_target and new_action
         if it was to be associated with provided row. Return None if rule would
         be correct, and string description of error otherwise.
         """
-        for other_row in other_rows:
-            if other_row == row:
-                continue
-            if other_row.rule.is_rule_conflicting(new_source, new_target, new_action):
-                return str(other_row)
-        return None
+        conflict = RuleIndex(other_rows).find_conflict(row, new_source, new_target)
+        return str(conflict) if conflict else None
 
     def verify_new_rule(
         self,
@@ -363,14 +363,17 @@ class PolicyHandler(PageHandler):
         new_target: str,
         new_action: str,
     ) -> Optional[str]:
+        # pylint: disable=unused-argument
         """
         Verify correctness of a rule with new_source, new_target and new_action
         if it was to be associated with provided row. Return None if rule would
         be correct, and string description of error otherwise.
         """
-        return self.verify_rule_against_rows(
-            self.current_rows, row, new_source, new_target, new_action
-        )
+        rows = self.current_rows
+        if self.rule_index is None or not self.rule_index.is_current(rows):
+            self.rule_index = RuleIndex(rows)
+        conflict = self.rule_index.find_conflict(row, new_source, new_target)
+        return str(conflict) if conflict else None
 
     @staticmethod
     def close_rows_in_list(row_list: List[RuleListBoxRow]):
@@ -416,9 +419,7 @@ class PolicyHandler(PageHandler):
         """Save current rules, whatever they are - custom or default."""
         rules = self.current_rules
         self.policy_manager.save_rules(self.policy_file_name, rules, self.current_token)
-        _r, self.current_token = self.policy_manager.get_rules_from_filename(
-            self.policy_file_name, self.default_policy
-        )
+        self.current_token = self.policy_manager.get_token(self.policy_file_name)
 
         self.initial_rules = deepcopy(rules)
 
@@ -816,12 +817,15 @@ class VMSubsetPolicyHandler(PolicyHandler):
         if self.disable_radio.get_active():
             return self.policy_manager.text_to_rules(self.default_policy)
         rules: List[Rule] = []
+        # canonical text of rules already added
+        rule_texts: Set[str] = set()
         for row in self.exception_list_box.get_children():
             new_rule: Rule = row.rule.raw_rule
-            if str(new_rule) in [str(rule) for rule in rules]:
+            if str(new_rule) in rule_texts:
                 # do not save duplicates
                 continue
             rules.append(new_rule)
+            rule_texts.add(str(new_rule))
 
             if new_rule.target == "@default":
                 if getattr(new_rule.action, "default_target", None):
@@ -836,10 +840,11 @@ class VMSubsetPolicyHandler(PolicyHandler):
                     target=new_target,
                     action=type(new_rule.action).__name__.lower(),
                 )
-                if str(another_rule) in [str(rule) for rule in rules]:
+                if str(another_rule) in rule_texts:
                     # do not save duplicates
                     continue
                 rules.append(another_rule)
+                rule_texts.add(str(another_rule))
         rules.extend([row.rule.raw_rule for row in self.main_list_box.get_children()])
         return rules
 
@@ -19,10 +19,12 @@
 # with this program; if not, see <http://www.gnu.org/licenses/>.
 """Class used to manage PolicyClient and do some convenience processing."""
 
+import concurrent.futures
 import subprocess
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, Iterable
 
 from qubes_config.widgets.utils import compare_rule_lists
+from qrexec.exc import PolicySyntaxError
 from qrexec.policy.admin_client import PolicyClient
 from qrexec.policy.parser import StringPolicy, Rule
 
@@ -35,6 +37,9 @@ except ImportError:
     PolicyAdminException = subprocess.CalledProcessError
     PolicyAdminFileNotFoundException = subprocess.CalledProcessError
 
+# how many policy admin calls can be made at the same time
+POLICY_ADMIN_WORKERS = 4
+
 import gettext
 
 t = gettext.translation("desktop-linux-manager", fallback=True)
@@ -54,14 +59,63 @@ class PolicyManager:
 # Any changes made manually may be overwritten by Qubes Configuration Tools.
 
 """)
+        # file name -> (rules, token) or None for missing files; filled by
+        # prefetch_files and consumed by the next get_rules_from_filename,
+        # so the rules are never shared between callers
+        self.prefetched: Dict[str, Optional[Tuple[List[Rule], str]]] = {}
+        # service name -> list of relevant policy files
+        self.service_files: Dict[str, List[str]] = {}
+
+    def invalidate_cache(self):
+        """Forget cached lists of policy files, e.g. when policy could have
+        been changed outside of this manager."""
+        self.service_files.clear()
+
+    def prefetch_files(self, filenames: Iterable[str]):
+        """Fetch and parse provided policy files ahead of time (this is safe
+        to call from a worker thread). The next get_rules_from_filename call
+        for each of the files will use fetched rules instead of querying
+        policy admin again."""
+        for filename in filenames:
+            try:
+                rules_text, token = self.policy_client.policy_get(filename)
+            except (PolicyAdminFileNotFoundException, subprocess.CalledProcessError):
+                self.prefetched[filename] = None
+                continue
+            try:
+                self.prefetched[filename] = (self.text_to_rules(rules_text), token)
+            except PolicySyntaxError:
+                # leave reporting the error to the caller
+                self.prefetched.pop(filename, None)
 
-    def get_all_policy_files(self, service: str) -> List[str]:
-        """Just get a straightforward list of all relevant policy files."""
+    def _get_policy_files(self, service: str) -> List[str]:
         try:
-            return self.policy_client.policy_get_files(service)
+            return list(self.policy_client.policy_get_files(service))
         except (PolicyAdminException, subprocess.CalledProcessError):
             return []
 
+    def get_policy_files(self, services: Iterable[str]) -> Dict[str, List[str]]:
+        """Get lists of policy files relevant to each of the provided
+        services. Lists that are not cached yet are requested concurrently,
+        so the whole batch costs about a single policy admin round-trip."""
+        services = list(dict.fromkeys(services))
+        missing = [s for s in services if s not in self.service_files]
+        if len(missing) == 1:
+            self.service_files[missing[0]] = self._get_policy_files(missing[0])
+        elif missing:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=POLICY_ADMIN_WORKERS
+            ) as executor:
+                for service, files in zip(
+                    missing, executor.map(self._get_policy_files, missing)
+                ):
+                    self.service_files[service] = files
+        return {service: list(self.service_files[service]) for service in services}
+
+    def get_all_policy_files(self, service: str) -> List[str]:
+        """Just get a straightforward list of all relevant policy files."""
+        return self.get_policy_files([service])[service]
+
     def get_conflicting_policy_files(self, service: str, own_file: str) -> List[str]:
         """
         Get a list of policy files (as str) that apply to the selected service
@@ -88,17 +142,34 @@ class PolicyManager:
         """Get rules contained in a provided file. If the file does not exist,
         return default policy.
         Return list of Rule objects and str of the PolicyClient's token
-        for the file."""
+        for the file. Every call returns new Rule objects, so callers are
+        free to modify them."""
+        if filename in self.prefetched:
+            prefetched = self.prefetched.pop(filename)
+            if prefetched is None:
+                return self._get_default_rules(default_policy)
+            return prefetched
         try:
             rules_text, token = self.policy_client.policy_get(filename)
         except (PolicyAdminFileNotFoundException, subprocess.CalledProcessError):
-            if not default_policy:
-                return [], None
-            rules_text, token = default_policy, None
-
-        rules = self.text_to_rules(rules_text)
-
-        return rules, token
+            return self._get_default_rules(default_policy)
+        return self.text_to_rules(rules_text), token
+
+    def _get_default_rules(self, default_policy: str) -> Tuple[List[Rule], None]:
+        if not default_policy:
+            return [], None
+        return self.text_to_rules(default_policy), None
+
+    def get_token(self, filename: str) -> Optional[str]:
+        """Get current PolicyClient's token for a file, or None if the file
+        does not exist. Cheaper than get_rules_from_filename, as the file
+        is not parsed; meant to be used after save_rules."""
+        self.prefetched.pop(filename, None)
+        try:
+            _text, token = self.policy_client.policy_get(filename)
+        except (PolicyAdminFileNotFoundException, subprocess.CalledProcessError):
+            return None
+        return token
 
     def compare_rules_to_text(self, rules, file_text) -> bool:
         """Check if the list of rules is equivalent to policy file text."""
@@ -123,7 +194,10 @@ class PolicyManager:
         a token corresponding to last file access, to avoid unexpected
         overwriting."""
         new_text = self.rules_to_text(rules_list)
+        self.prefetched.pop(file_name, None)
         self.policy_client.policy_replace(file_name, new_text, token or "any")
+        # a new file may now be relevant for some services
+        self.invalidate_cache()
 
     def rules_to_text(self, rules_list: List[Rule]) -> str:
         """Convert list of Rules to text ready to be stored in a file."""
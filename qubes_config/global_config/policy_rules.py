@@ -21,7 +21,7 @@
 
 import abc
 
-from typing import Dict, Optional
+from typing import Dict, Optional, List, Tuple, Iterable, Any
 from qrexec.policy.parser import (
     Rule,
     Allow,
@@ -107,6 +107,15 @@ class AbstractRuleWrapper(abc.ABC):
         """
         return self.source == other_source and self.target == other_target
 
+    def get_conflict_keys(self) -> List[Tuple[str, Optional[str]]]:
+        """
+        Return keys under which this rule is stored in a RuleIndex: a rule
+        with other_source and other_target conflicts with self if
+        (other_source, other_target) or (other_source, None) is among them.
+        Must agree with is_rule_conflicting.
+        """
+        return [(self.source, self.target)]
+
     @staticmethod
     # pylint: disable=unused-argument
     def get_rule_errors(source: str, target: str, action: str) -> Optional[str]:
@@ -400,6 +409,12 @@ class RuleTargeted(AbstractRuleWrapper):
             return True
         return False
 
+    def get_conflict_keys(self) -> List[Tuple[str, Optional[str]]]:
+        keys = super().get_conflict_keys()
+        if self.action == "allow":
+            keys.append((self.source, None))
+        return keys
+
 
 class RuleDispVM(AbstractRuleWrapper):
     """
@@ -507,6 +522,44 @@ class RuleDispVM(AbstractRuleWrapper):
             return True
         return False
 
+    def get_conflict_keys(self) -> List[Tuple[str, Optional[str]]]:
+        return [(self.source, None)]
+
+
+class RuleIndex:
+    """
+    Index of rule list rows (objects with a rule attribute containing an
+    AbstractRuleWrapper) by conflict keys of their rules, so that checking
+    a rule for conflicts does not require asking every row.
+    """
+
+    def __init__(self, rows: Iterable[Any]):
+        self.rows = tuple(rows)
+        self._index: Dict[Tuple[str, Optional[str]], List[Tuple[int, Any]]] = {}
+        for position, row in enumerate(self.rows):
+            for key in row.rule.get_conflict_keys():
+                self._index.setdefault(key, []).append((position, row))
+
+    def is_current(self, rows: Iterable[Any]) -> bool:
+        """Check if the index was built from the provided rows."""
+        return self.rows == tuple(rows)
+
+    def find_conflict(self, row: Any, source: str, target: str) -> Optional[Any]:
+        """Find the first row, other than the provided row, whose rule
+        would conflict with a rule from source to target. Return None if
+        there is no such row."""
+        best_position: Optional[int] = None
+        best_row: Optional[Any] = None
+        for key in ((source, target), (source, None)):
+            for position, other_row in self._index.get(key, []):
+                if other_row == row:
+                    continue
+                if best_position is None or position < best_position:
+                    best_position = position
+                    best_row = other_row
+                break
+        return best_row
+
 
 class AbstractVerbDescription(abc.ABC):
     """Class used to represent human-readable verb descriptions:
@@ -113,14 +113,11 @@ class VMWidget(Gtk.Box):
         self.combobox: Gtk.ComboBox = Gtk.ComboBox.new_with_entry()
         self.combobox.get_style_context().add_class("flat_combo")
         self.combobox.get_child().set_width_chars(24)
-        self.model = VMListModeler(
-            combobox=self.combobox,
-            qapp=self.qapp,
-            filter_function=self.filter_function,
-            event_callback=change_callback,
-            current_value=str(self.selected_value),
-            additional_options=categories,
-        )
+        self.categories = categories
+        self.change_callback = change_callback
+        # the combobox model is only needed when editing, so it's created
+        # on first use; policy pages can have hundreds of these widgets
+        self._model: VMListModeler | None = None
 
         self.name_widget = TokenName(
             self.selected_value, self.qapp, categories=categories
@@ -148,6 +145,20 @@ class VMWidget(Gtk.Box):
 
         self.set_editable(False)
 
+    @property
+    def model(self) -> VMListModeler:
+        """VMListModeler of the combobox, created on first use."""
+        if self._model is None:
+            self._model = VMListModeler(
+                combobox=self.combobox,
+                qapp=self.qapp,
+                filter_function=self.filter_function,
+                event_callback=self.change_callback,
+                current_value=str(self.selected_value),
+                additional_options=self.categories,
+            )
+        return self._model
+
     def set_editable(self, editable: bool):
         """Change state between editable and non-editable."""
         # if setting editable to False, make sure combobox is
@@ -155,11 +166,17 @@ class VMWidget(Gtk.Box):
         if not editable:
             self.revert_changes()
         if not self.selectors_hidden:
+            if editable:
+                # make sure the combobox has its model before it is shown
+                _ = self.model
             self.combobox.set_visible(editable)
             self.name_widget.set_visible(not editable)
 
     def is_changed(self) -> bool:
         """Return True if widget was changed from its initial state."""
+        if self._model is None:
+            # never edited
+            return False
         new_value = self.model.get_selected()
         return str(self.selected_value) != str(new_value)
 
@@ -183,7 +200,8 @@ class VMWidget(Gtk.Box):
 
     def revert_changes(self):
         """Roll back to last saved state."""
-        self.model.select_value(self.selected_value)
+        if self._model is not None:
+            self._model.select_value(self.selected_value)
 
     def hide_selectors(self):
         self.selectors_hidden = True
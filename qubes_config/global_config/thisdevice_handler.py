@@ -17,10 +17,15 @@
 #
 # You should have received a copy of the GNU Lesser General Public License along
 # with this program; if not, see <http://www.gnu.org/licenses/>.
+import concurrent.futures
+import json
+import os
 import yaml
 import subprocess
 import logging
+from typing import Any, Dict, Optional
 
+import qubesadmin.exc
 import qubesadmin.vm
 from ..widgets.gtk_utils import show_error, load_icon, copy_to_global_clipboard
 from .page_handler import PageHandler
@@ -29,7 +34,7 @@ from .policy_manager import PolicyManager
 import gi
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk
+from gi.repository import Gtk, GLib
 
 import gettext
 
@@ -38,6 +43,94 @@ _ = t.gettext
 
 logger = logging.getLogger("qubes-global-config")
 
+HCL_CACHE_FILE = os.path.join(GLib.get_user_cache_dir(), "qubes-hcl-report.json")
+BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+XEN_VERSION_DIR = "/sys/hypervisor/version"
+
+
+class HCLReport:
+    """
+    Output of qubes-hcl-report, which probes hardware and takes seconds.
+    The report is generated in a background thread and cached on disk,
+    keyed by boot ID and kernel and Xen versions, as hardware cannot
+    change without a reboot.
+    """
+
+    def __init__(self, path: str = HCL_CACHE_FILE):
+        self.path = path
+        self.text: Optional[str] = self.load()
+        self.future: Optional[concurrent.futures.Future] = None
+
+    @staticmethod
+    def get_system_key() -> Dict[str, Optional[str]]:
+        """Identify the current boot of the system."""
+        key: Dict[str, Optional[str]] = {"kernel": os.uname().release}
+        try:
+            with open(BOOT_ID_FILE, encoding="utf-8") as file:
+                key["boot_id"] = file.read().strip()
+        except OSError:
+            key["boot_id"] = None
+        try:
+            version = []
+            for part in ("major", "minor", "extra"):
+                with open(
+                    os.path.join(XEN_VERSION_DIR, part), encoding="utf-8"
+                ) as file:
+                    version.append(file.read().strip())
+            key["xen"] = "{}.{}{}".format(*version)
+        except OSError:
+            key["xen"] = None
+        return key
+
+    def load(self) -> Optional[str]:
+        """Get cached report, if it was generated during this boot."""
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict):
+            return None
+        key = self.get_system_key()
+        if not key["boot_id"] or entry.get("key") != key:
+            return None
+        return entry.get("report")
+
+    def save(self, text: str):
+        key = self.get_system_key()
+        if not key["boot_id"]:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump({"key": key, "report": text}, file)
+            os.replace(tmp_path, self.path)
+        except OSError as ex:
+            logger.warning("Failed to save HCL report cache: %s", str(ex))
+
+    def _generate(self) -> str:
+        text = subprocess.check_output(["qubes-hcl-report", "-y"]).decode()
+        try:
+            valid = bool(yaml.safe_load(text))
+        except yaml.YAMLError:
+            valid = False
+        # do not keep failures around until the next reboot
+        if valid:
+            self.text = text
+            self.save(text)
+        return text
+
+    def refresh(
+        self, executor: concurrent.futures.Executor
+    ) -> concurrent.futures.Future:
+        """Generate the report again in the background; if it is already
+        being generated, return the pending job. The future's result is the
+        report text."""
+        if self.future is None or self.future.done():
+            self.future = executor.submit(self._generate)
+        return self.future
+
 
 class ThisDeviceHandler(PageHandler):
     """Handler for the ThisDevice page."""
@@ -49,9 +142,17 @@ class ThisDeviceHandler(PageHandler):
         qapp: qubesadmin.Qubes,
         gtk_builder: Gtk.Builder,
         policy_manager: PolicyManager,
+        hcl_report: Optional[HCLReport] = None,
+        executor: Optional[concurrent.futures.Executor] = None,
     ):
         self.qapp = qapp
         self.policy_manager = policy_manager
+        self.hcl_report = hcl_report if hcl_report else HCLReport()
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="thisdevice"
+            )
+        self.executor = executor
 
         self.model_label: Gtk.Label = gtk_builder.get_object("thisdevice_model_label")
         self.data_label: Gtk.Label = gtk_builder.get_object("thisdevice_data_label")
@@ -107,16 +208,62 @@ class ThisDeviceHandler(PageHandler):
             "thisdevice_copy_hcl_button"
         )
 
-        label_text = ""
-        self.hcl_yaml = {}
+        self.refresh_button: Gtk.Button = gtk_builder.get_object(
+            "thisdevice_refresh_button"
+        )
+
+        self.hcl_check = ""
+        self.hcl_yaml: Dict[str, Any] = {}
+
+        self.set_policy_state()
+
+        self.refresh_button.connect("clicked", self._refresh_clicked)
+
+        self.copy_button.connect("clicked", self._copy_to_clipboard)
+        self.copy_hcl_button.connect("clicked", self._copy_to_clipboard)
+
+        self.data_label.get_toplevel().connect("page-changed", self._page_saved)
+
+        if self.hcl_report.text is not None:
+            self.fill_report(self.hcl_report.text)
+        else:
+            self.refresh_report()
+        self.refresh_pv_state()
+
+    def _refresh_clicked(self, _widget=None):
+        self.refresh_report()
+
+    def refresh_report(self):
+        """Generate the HCL report in the background and show it once
+        ready."""
+        self.refresh_button.set_sensitive(False)
+        self.data_label.get_style_context().remove_class("red_code")
+        self.data_label.set_markup(_("Loading system data..."))
+        future = self.hcl_report.refresh(self.executor)
+        future.add_done_callback(
+            lambda future: GLib.idle_add(self._report_ready, future)
+        )
 
+    def _report_ready(self, future: concurrent.futures.Future):
         try:
-            self.hcl_check = subprocess.check_output(
-                ["qubes-hcl-report", "-y"]
-            ).decode()
-        except subprocess.CalledProcessError as ex:
-            label_text += _("Failed to load system data: {ex}\n").format(ex=str(ex))
-            self.hcl_check = ""
+            text = future.result()
+        except concurrent.futures.CancelledError:
+            return False
+        except (subprocess.CalledProcessError, OSError) as ex:
+            self.fill_report(
+                "", _("Failed to load system data: {ex}\n").format(ex=str(ex))
+            )
+        else:
+            self.fill_report(text)
+        return False
+
+    def fill_report(self, text: str, error: str = ""):
+        """Show data from qubes-hcl-report output."""
+        self.refresh_button.set_sensitive(True)
+        label_text = error
+        self.hcl_check = text
+        self.hcl_yaml = {}
+        self.data_label.get_style_context().remove_class("red_code")
 
         try:
             if self.hcl_check:
@@ -184,11 +331,31 @@ class ThisDeviceHandler(PageHandler):
             f"<b>Remapping:</b> {self._get_data('remap')}"
         )
 
-        self.set_policy_state()
+        self.data_label.set_markup(label_text)
+
+        self.certified_box_yes.set_visible(self.is_certified())
 
-        pv_vms = [
-            vm for vm in self.qapp.domains if getattr(vm, "virt_mode", None) == "pv"
-        ]
+    def refresh_pv_state(self):
+        """Check virtualization mode of all qubes once the page is drawn.
+        This is done in the main thread, as the Qubes object is not
+        thread-safe; the handler itself is only created when its page is
+        first shown."""
+        self.compat_pv_label.set_markup(_("<b>PV qubes:</b> checking..."))
+        self.compat_pv_tooltip.set_visible(False)
+        GLib.idle_add(self._check_pv_state)
+
+    def _check_pv_state(self):
+        try:
+            pv_vms = [
+                vm.name
+                for vm in self.qapp.domains
+                if getattr(vm, "virt_mode", None) == "pv"
+            ]
+        except qubesadmin.exc.QubesException as ex:
+            logger.warning("Failed to check virtualization modes: %s", str(ex))
+            self.set_state(self.compat_pv_image, "maybe")
+            self.compat_pv_label.set_markup(_("<b>PV qubes:</b> unknown"))
+            return False
 
         self.set_state(self.compat_pv_image, "no" if pv_vms else "yes")
         self.compat_pv_label.set_markup(
@@ -196,18 +363,10 @@ class ThisDeviceHandler(PageHandler):
         )
         self.compat_pv_tooltip.set_tooltip_markup(
             _("<b>The following qubes have PV virtualization mode:</b>\n - ")
-            + "\n - ".join([vm.name for vm in pv_vms])
+            + "\n - ".join(pv_vms)
         )
         self.compat_pv_tooltip.set_visible(bool(pv_vms))
-
-        self.data_label.set_markup(label_text)
-
-        self.certified_box_yes.set_visible(self.is_certified())
-
-        self.copy_button.connect("clicked", self._copy_to_clipboard)
-        self.copy_hcl_button.connect("clicked", self._copy_to_clipboard)
-
-        self.data_label.get_toplevel().connect("page-changed", self._page_saved)
+        return False
 
     def _get_data(self, name) -> str:
         data = self.hcl_yaml.get(name, _("unknown")).strip()
@@ -29,7 +29,7 @@ from qrexec.policy.parser import Rule
 from qrexec.client import call as qrexec_call
 
 from ..widgets.gtk_widgets import VMListModeler, NONE_CATEGORY
-from ..widgets.utils import get_boolean_feature, apply_feature_change
+from ..widgets.utils import get_boolean_feature, apply_feature_change, FeatureBatch
 from .page_handler import PageHandler
 from .policy_rules import RuleTargeted, SimpleVerbDescription
 from .policy_handler import PolicyHandler
@@ -342,7 +342,6 @@ class UpdateCheckerHandler:
 
     def save(self):
         """Save any changes."""
-        # FUTURE: this is fairly slow
         if self.initial_dom0 != self.dom0_update_check.get_active():
             apply_feature_change(
                 self.qapp.domains["dom0"],
@@ -364,24 +363,22 @@ class UpdateCheckerHandler:
             self.initial_default = default_state
 
         exceptions = self.flowbox_handler.selected_vms
+        batch = FeatureBatch(self.FEATURE_NAME, apply_feature_change)
         if changed_default or self.flowbox_handler.is_changed():
-            for vm in self.qapp.domains:
-                if vm.klass == "AdminVM":
-                    continue
+            vms = [vm for vm in self.qapp.domains if vm.klass != "AdminVM"]
+            changes = {}
+            for vm, vm_value in batch.get_boolean(vms, True).items():
                 vm_desired_state = (
                     default_state if vm not in exceptions else not default_state
                 )
-                vm_value = get_boolean_feature(vm, self.FEATURE_NAME, True)
                 if vm_value != vm_desired_state:
                     # if we want False, we need to explicitly set it, else
                     # we just need to erase the feature
-                    apply_feature_change(
-                        vm,
-                        self.FEATURE_NAME,
-                        None if vm_desired_state else False,
-                    )
+                    changes[vm] = None if vm_desired_state else False
+            batch.apply(changes)
 
         self.flowbox_handler.save()
+        batch.raise_errors()
 
     def reset(self):
         """Reset changes and go back to initial state."""
@@ -655,20 +652,14 @@ class UpdateProxy:
         self.policy_manager.save_rules(
             self.policy_file_name, raw_rules, self.current_token
         )
-        _r, self.current_token = self.policy_manager.get_rules_from_filename(
-            self.policy_file_name, ""
-        )
+        self.current_token = self.policy_manager.get_token(self.policy_file_name)
         self.rules = self.current_exception_rules
 
-        for vm in self.qapp.domains:
-            if "service.qubes-updates-proxy" in vm.features:
-                apply_feature_change(
-                    vm,
-                    "service.qubes-updates-proxy",
-                    True if vm in new_update_proxies else None,
-                )
-            elif vm in new_update_proxies:
-                apply_feature_change(vm, "service.qubes-updates-proxy", True)
+        batch = FeatureBatch("service.qubes-updates-proxy", apply_feature_change)
+        batch.update(
+            {vm: True if vm in new_update_proxies else None for vm in self.qapp.domains}
+        )
+        batch.raise_errors()
 
     def close_all_edits(self):
         """Close all edited rows."""
@@ -28,7 +28,7 @@ from qrexec.policy.parser import Allow
 from qubesadmin.device_protocol import DeviceCategory
 
 from ..widgets.gtk_widgets import TokenName, TextModeler, VMListModeler
-from ..widgets.utils import get_feature, apply_feature_change
+from ..widgets.utils import get_feature, apply_feature_change, FeatureBatch
 from ..widgets.gtk_utils import ask_question, show_error
 from .page_handler import PageHandler
 from .policy_rules import RuleTargetedAdminVM, Rule
@@ -218,9 +218,7 @@ qubes.InputTablet * {vm.name} @adminvm deny"""
             rules.append(widget.rule.raw_rule)
 
         self.policy_manager.save_rules(self.policy_file_name, rules, self.current_token)
-        _r, self.current_token = self.policy_manager.get_rules_from_filename(
-            self.policy_file_name, self.default_policy
-        )
+        self.current_token = self.policy_manager.get_token(self.policy_file_name)
 
         for widget in self.widgets.values():
             widget.update_changed()
@@ -546,8 +544,9 @@ policy.RegisterArgument +u2f.Register @anyvm @anyvm deny
 
         if not self.enable_check.get_active():
             # disable all service:
-            for vm in self.initially_enabled_vms:
-                apply_feature_change(vm, self.SERVICE_FEATURE, None)
+            batch = FeatureBatch(self.SERVICE_FEATURE, apply_feature_change)
+            batch.update({vm: None for vm in self.initially_enabled_vms})
+            batch.raise_errors()
 
             self.policy_manager.save_rules(
                 self.policy_filename,
@@ -570,9 +569,11 @@ policy.RegisterArgument +u2f.Register @anyvm @anyvm deny
                 ),
             )
 
-        for vm in self.available_vms:
-            value = None if vm not in enabled_vms else True
-            apply_feature_change(vm, self.SERVICE_FEATURE, value)
+        batch = FeatureBatch(self.SERVICE_FEATURE, apply_feature_change)
+        batch.update(
+            {vm: None if vm not in enabled_vms else True for vm in self.available_vms}
+        )
+        batch.raise_errors()
 
         rules = []
 
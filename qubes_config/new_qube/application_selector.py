@@ -21,7 +21,7 @@
 
 # pylint: disable=import-error
 import os
-from typing import Optional, List
+from typing import Optional, List, Set
 import logging
 
 import qubesadmin.vm
@@ -255,6 +255,8 @@ class ApplicationBoxHandler:
             "change_template_box"
         )
         self.target_template_name_widget: Optional[Gtk.Widget] = None
+        # templates whose apps are already in the "other templates" list
+        self.other_templates: Set[qubesadmin.vm.QubesVM] = set()
 
         self.change_template_cancel.connect("clicked", self._hide_template_change)
         self.change_template_ok.connect("clicked", self._do_template_change)
@@ -283,6 +285,7 @@ class ApplicationBoxHandler:
         self.flowbox.set_sort_func(self._sort_flowbox)
 
         self.apps_window.connect("delete-event", self._hide_window)
+        self.apps_list_other.connect("row-activated", self._ask_template_change)
         self._fill_others_list()
 
     @staticmethod
@@ -324,20 +327,17 @@ class ApplicationBoxHandler:
 
     def _load_all_apps(self, *_args):
         self.load_all_button.set_label("Loading applications...")
+        self.load_all_button.set_sensitive(False)
+        self.apps_list_other.set_visible(True)
 
-        while Gtk.events_pending():
-            Gtk.main_iteration()
+        # apps are added to the list as soon as they are loaded
+        self.template_selector.load_all_available_apps(
+            self._add_other_apps, self._all_apps_loaded
+        )
 
-        self.template_selector.load_all_available_apps()
-        self._fill_others_list()
+    def _all_apps_loaded(self):
         self.apps_list_other.invalidate_filter()
-
-        while Gtk.events_pending():
-            Gtk.main_iteration()
-
-        self.apps_list_other.set_visible(True)
         self.load_all_button.set_label("No matching applications found")
-        self.load_all_button.set_sensitive(False)
 
     @staticmethod
     def _row_activated(listbox: Gtk.ListBox, row: ApplicationRow):
@@ -395,11 +395,18 @@ class ApplicationBoxHandler:
 
     def _fill_others_list(self):
         # and the other apps
-        for app in self.template_selector.get_available_apps():
+        self._add_other_apps(self.template_selector.get_available_apps())
+        self.apps_list_other.set_visible(False)
+
+    def _add_other_apps(self, apps: List[ApplicationData]):
+        templates = set()
+        for app in apps:
+            if app.template in self.other_templates:
+                continue
+            templates.add(app.template)
             row = OtherTemplateApplicationRow(app)
             self.apps_list_other.add(row)
-        self.apps_list_other.set_visible(False)
-        self.apps_list_other.connect("row-activated", self._ask_template_change)
+        self.other_templates.update(templates)
 
     def _hide_template_change(self, *_args):
         self.change_template_msg.hide()
@@ -37,6 +37,7 @@ from .template_handler import TemplateHandler, TemplateSelector
 from .network_selector import NetworkSelector
 from .advanced_handler import AdvancedHandler
 from ..widgets.gtk_utils import load_icon, show_error, load_theme
+from ..widgets.profiler import setup_profiling
 from ..widgets.gtk_widgets import (
     ProgressBarDialog,
     ImageListModeler,
@@ -423,6 +424,7 @@ def main():
     """
     Start the app
     """
+    setup_profiling()
     qapp = qubesadmin.Qubes()
     app = CreateNewQube(qapp)
     app.run(sys.argv)
@@ -19,8 +19,12 @@
 # with this program; if not, see <http://www.gnu.org/licenses/>.
 """Template handling."""
 
+import concurrent.futures
+import functools
+import json
+import os
 import subprocess
-from typing import Optional, List, Dict, Callable
+from typing import Optional, List, Dict, Callable, Tuple
 import abc
 import logging
 
@@ -34,7 +38,7 @@ from .application_selector import ApplicationData
 import gi
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk
+from gi.repository import Gtk, GLib
 
 import gettext
 
@@ -44,6 +48,133 @@ _ = t.gettext
 logger = logging.getLogger("qubes-new-qube")
 WHONIX_QUBE_NAME = "sys-whonix"
 
+APPMENUS_DIR = os.path.expanduser("~/.local/share/qubes-appmenus")
+APPMENUS_CACHE_FILE = os.path.join(
+    GLib.get_user_cache_dir(), "qubes-new-qube-appmenus.json"
+)
+# files in the appmenus directories of a qube and its template that
+# qvm-appmenus --get-default-whitelist reads
+WHITELIST_FILES = [
+    "whitelisted-appmenus.list",
+    "vm-whitelisted-appmenus.list",
+    "netvm-whitelisted-appmenus.list",
+]
+# number of qvm-appmenus processes run at once when loading all applications
+APPMENUS_WORKERS = 4
+# errors of a failed, missing or garbled qvm-appmenus run
+APPMENUS_ERRORS = (subprocess.CalledProcessError, OSError, UnicodeDecodeError)
+
+
+class AppmenusCache:
+    """
+    On-disk cache of qvm-appmenus output, keyed by qube name, kind of output
+    and its generation: the newest modification time of the appmenus files
+    the output is built from, in the directories of the qube and its
+    template. Output without any such files is never cached.
+    """
+
+    def __init__(self, path: str = APPMENUS_CACHE_FILE):
+        self.path = path
+        # qube name -> kind -> {"generation": int, "lines": list of lines}
+        self.entries: Dict[str, Dict[str, Dict]] = {}
+        self.changed = False
+        self.load()
+
+    @staticmethod
+    def get_sources(vm: qubesadmin.vm.QubesVM) -> List[str]:
+        """Names of qubes whose appmenus directories qvm-appmenus reads for
+        a given qube: the qube itself and its template, if it has one."""
+        sources = [vm.name]
+        template = getattr(vm, "template", None)
+        if template is not None:
+            sources.append(str(template))
+        return sources
+
+    @staticmethod
+    def _get_paths(vm_name: str, kind: str) -> List[str]:
+        vm_dir = os.path.join(APPMENUS_DIR, vm_name)
+        templates_dir = os.path.join(vm_dir, "apps.templates")
+        if kind == "default":
+            # default-menu-items feature is refreshed together with
+            # apps.templates, so the directory itself is a source too
+            return [templates_dir] + [
+                os.path.join(vm_dir, file_name) for file_name in WHITELIST_FILES
+            ]
+        try:
+            file_names = os.listdir(templates_dir)
+        except OSError:
+            return []
+        # the directory itself changes when a file is removed
+        return [templates_dir] + [
+            os.path.join(templates_dir, file_name) for file_name in file_names
+        ]
+
+    @staticmethod
+    def get_generation(sources: List[str], kind: str) -> Optional[int]:
+        """Get current generation of a given kind of qvm-appmenus output
+        for a qube with given sources (see get_sources), if known. Does not
+        use the cache, only stats the appmenus files."""
+        generation = None
+        for vm_name in sources:
+            for path in AppmenusCache._get_paths(vm_name, kind):
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                if generation is None or mtime > generation:
+                    generation = mtime
+        return generation
+
+    def get(self, sources: List[str], kind: str) -> Optional[List[str]]:
+        """Get cached output lines for a qube with given sources, if they
+        are still valid."""
+        entry = self.entries.get(sources[0], {}).get(kind)
+        if not isinstance(entry, dict):
+            return None
+        generation = self.get_generation(sources, kind)
+        if generation is None or entry.get("generation") != generation:
+            return None
+        return entry.get("lines")
+
+    def set(
+        self,
+        sources: List[str],
+        kind: str,
+        lines: List[str],
+        generation: Optional[int],
+    ):
+        """Store output lines obtained at a given generation."""
+        if generation is None:
+            return
+        self.entries.setdefault(sources[0], {})[kind] = {
+            "generation": generation,
+            "lines": lines,
+        }
+        self.changed = True
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            return
+        if isinstance(entries, dict):
+            self.entries = entries
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(self.entries, file)
+            os.replace(tmp_path, self.path)
+        except OSError as ex:
+            logger.warning("Failed to save application cache: %s", str(ex))
+            return
+        self.changed = False
+
 
 class TemplateSelector(abc.ABC):
     """
@@ -301,6 +432,9 @@ class TemplateHandler:
         self._application_data: Dict[qubesadmin.vm.QubesVM, List[ApplicationData]] = {}
         self._default_applications: Dict[qubesadmin.vm.QubesVM, List[str]] = {}
 
+        self.appmenus_cache = AppmenusCache()
+        self.executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
     def change_vm_type(self, vm_type: str):
         """Change selector to one appropriate for the type of VM
         being created"""
@@ -321,37 +455,123 @@ class TemplateHandler:
             return self.template_selectors[self.selected_type].is_vm_available(template)
         return False
 
-    def load_all_available_apps(self):
+    @staticmethod
+    def _run_appmenus(
+        command: List[str], sources: List[str], kind: str
+    ) -> Tuple[Optional[int], List[str]]:
+        """Run qvm-appmenus, return generation of its output (taken before
+        running it) and output lines. Can be called from worker threads."""
+        generation = AppmenusCache.get_generation(sources, kind)
+        return generation, subprocess.check_output(command).decode().splitlines()
+
+    @staticmethod
+    def _get_available_command(vm: qubesadmin.vm.QubesVM) -> List[str]:
+        return [
+            "qvm-appmenus",
+            "--get-available",
+            "--i-understand-format-is-unstable",
+            "--file-field",
+            "Comment",
+            vm.name,
+        ]
+
+    def _store_available_apps(
+        self, vm: qubesadmin.vm.QubesVM, lines: List[str]
+    ) -> List[ApplicationData]:
+        available_apps = [
+            ApplicationData.from_line(line, template=vm) for line in lines
+        ]
+        self._application_data[vm] = available_apps
+        return available_apps
+
+    def _show_load_error(self, vm: qubesadmin.vm.QubesVM):
+        show_error(
+            self.main_window,
+            _("Failed to load application data"),
+            _("Failed to load application data for ") + vm.name,
+        )
+
+    def load_all_available_apps(
+        self,
+        callback: Optional[Callable[[List[ApplicationData]], None]] = None,
+        done_callback: Optional[Callable[[], None]] = None,
+    ):
+        """Load apps available for all qubes. Qubes that are not cached are
+        queried by a pool of workers; callback is called (in the main thread)
+        with the apps of each qube as soon as they are known, and
+        done_callback once all qubes are done."""
+        to_fetch = []
         for vm in self.qapp.domains:
-            self.get_available_apps(vm)
+            if vm not in self._application_data:
+                sources = self.appmenus_cache.get_sources(vm)
+                lines = self.appmenus_cache.get(sources, "available")
+                if lines is None:
+                    to_fetch.append((vm, sources))
+                    continue
+                self._store_available_apps(vm, lines)
+            if callback:
+                callback(self._application_data[vm])
+
+        if not to_fetch:
+            if done_callback:
+                done_callback()
+            return
+
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=APPMENUS_WORKERS
+            )
+        remaining = {vm for vm, _sources in to_fetch}
+
+        def _fetched(vm, sources, future):
+            try:
+                try:
+                    generation, lines = future.result()
+                except APPMENUS_ERRORS:
+                    self._show_load_error(vm)
+                    lines = []
+                else:
+                    self.appmenus_cache.set(sources, "available", lines, generation)
+                available_apps = self._store_available_apps(vm, lines)
+                if callback:
+                    callback(available_apps)
+            finally:
+                remaining.discard(vm)
+                if not remaining:
+                    self.appmenus_cache.save()
+                    if done_callback:
+                        done_callback()
+            return False
+
+        for vm, sources in to_fetch:
+            future = self.executor.submit(
+                self._run_appmenus,
+                self._get_available_command(vm),
+                sources,
+                "available",
+            )
+            future.add_done_callback(
+                functools.partial(GLib.idle_add, _fetched, vm, sources)
+            )
 
     def get_available_apps(self, vm: Optional[qubesadmin.vm.QubesVM] = None):
         """Get apps available for a given template."""
         if vm:
             if vm in self._application_data:
                 return self._application_data.get(vm, [])
-            command = [
-                "qvm-appmenus",
-                "--get-available",
-                "--i-understand-format-is-unstable",
-                "--file-field",
-                "Comment",
-                vm.name,
-            ]
-            try:
-                available_apps = [
-                    ApplicationData.from_line(line, template=vm)
-                    for line in subprocess.check_output(command).decode().splitlines()
-                ]
-                self._application_data[vm] = available_apps
-            except subprocess.CalledProcessError:
-                show_error(
-                    self.main_window,
-                    _("Failed to load application data"),
-                    _("Failed to load application data for ") + vm.name,
-                )
-                available_apps = []
-            return available_apps
+            sources = self.appmenus_cache.get_sources(vm)
+            lines = self.appmenus_cache.get(sources, "available")
+            if lines is None:
+                try:
+                    generation, lines = self._run_appmenus(
+                        self._get_available_command(vm), sources, "available"
+                    )
+                except APPMENUS_ERRORS:
+                    self._show_load_error(vm)
+                    return []
+                self.appmenus_cache.set(sources, "available", lines, generation)
+                self.appmenus_cache.save()
+            return self._store_available_apps(vm, lines)
 
         return [
             appdata
@@ -364,18 +584,26 @@ class TemplateHandler:
         if vm in self._default_applications:
             return self._default_applications.get(vm, [])
 
-        command = ["qvm-appmenus", "--get-default-whitelist", vm.name]
-        try:
-            default_applications = (
-                subprocess.check_output(command).decode().splitlines()
-            )
-        except subprocess.CalledProcessError:
-            show_error(
-                self.main_window,
-                _("Failed to load application data"),
-                _("Failed to load default_applications for ") + vm.name,
-            )
-            default_applications = []
+        sources = self.appmenus_cache.get_sources(vm)
+        default_applications = self.appmenus_cache.get(sources, "default")
+        if default_applications is None:
+            command = ["qvm-appmenus", "--get-default-whitelist", vm.name]
+            try:
+                generation, default_applications = self._run_appmenus(
+                    command, sources, "default"
+                )
+            except APPMENUS_ERRORS:
+                show_error(
+                    self.main_window,
+                    _("Failed to load application data"),
+                    _("Failed to load default_applications for ") + vm.name,
+                )
+                default_applications = []
+            else:
+                self.appmenus_cache.set(
+                    sources, "default", default_applications, generation
+                )
+                self.appmenus_cache.save()
         self._default_applications[vm] = default_applications
         return default_applications
 
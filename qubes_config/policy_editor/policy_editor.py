@@ -21,7 +21,8 @@ import html
 import subprocess
 import sys
 import re
-from typing import Callable, Optional, Dict, Tuple
+import threading
+from typing import Callable, Optional, Dict, List, Set, Tuple
 
 import gi
 import importlib.resources
@@ -46,16 +47,21 @@ from qubes_config.widgets.gtk_utils import (
     ask_question,
     is_theme_light,
 )
+from qubes_config.widgets.profiler import setup_profiling
 from qubes_config.widgets.utils import open_url_in_disposable
 
 gi.require_version("Gtk", "3.0")
 gi.require_version("GtkSource", "4")
-from gi.repository import Gtk, GtkSource, Gio, Gdk
+from gi.repository import Gtk, GtkSource, Gio, Gdk, GLib
 
 HEADER_NORMAL = (
     " service_name\targument\tsource_qube\ttarget_qube\taction [parameter=value]    "
 )
 
+POLICY_DIR = "/etc/qubes/policy.d/"
+# how long to wait after the last change before re-rendering the error list
+ERROR_INFO_DELAY = 250
+
 
 class FileListBoxRow(Gtk.ListBoxRow):
     def __init__(self, filename):
@@ -158,6 +164,121 @@ class PolicyClientWrapper:
         self.policy_client.policy_replace(name, content, token)
 
 
+class PolicyLineValidator:
+    """
+    Keeps syntax errors of a policy text buffer up to date line by line.
+    Only lines touched by insert/delete since the last `validate` call are
+    checked again, and results are cached by line content.
+    """
+
+    CACHE_SIZE = 10000
+
+    def __init__(self, buffer: Gtk.TextBuffer):
+        self.buffer = buffer
+        # line content -> error message, or None if the line is correct
+        self.cache: Dict[str, Optional[str]] = {}
+        # content and error message of each line of the buffer
+        self.lines: List[str] = [""]
+        self.line_errors: List[Optional[str]] = [None]
+        self.dirty_lines: Set[int] = set()
+        # set when include statements might have changed
+        self.includes_changed = False
+        self.parse_count = 0
+
+        self.buffer.connect("insert-text", self._text_inserted)
+        self.buffer.connect("delete-range", self._range_deleted)
+
+    def _text_inserted(self, _buffer, location: Gtk.TextIter, text: str, _length):
+        line = location.get_line()
+        added = text.count("\n")
+        if added:
+            self.lines[line + 1 : line + 1] = [""] * added
+            self.line_errors[line + 1 : line + 1] = [None] * added
+            self.dirty_lines = {
+                dirty + added if dirty > line else dirty for dirty in self.dirty_lines
+            }
+        self.dirty_lines.update(range(line, line + added + 1))
+
+    def _range_deleted(self, _buffer, start: Gtk.TextIter, end: Gtk.TextIter):
+        first, last = start.get_line(), end.get_line()
+        removed = last - first
+        if removed:
+            if any(
+                line.startswith("!include") for line in self.lines[first + 1 : last + 1]
+            ):
+                self.includes_changed = True
+            del self.lines[first + 1 : last + 1]
+            del self.line_errors[first + 1 : last + 1]
+            self.dirty_lines = {
+                dirty - removed if dirty > last else dirty
+                for dirty in self.dirty_lines
+                if not first < dirty <= last
+            }
+        self.dirty_lines.add(first)
+
+    def _get_line(self, lineno: int) -> str:
+        start = self.buffer.get_iter_at_line(lineno)
+        end = start.copy()
+        if not end.ends_line():
+            end.forward_to_line_end()
+        return self.buffer.get_text(start, end, False)
+
+    def check_line(self, line: str) -> Optional[str]:
+        """Return syntax error message for a single line, or None."""
+        if not line or line.startswith("#") or line.startswith("!include"):
+            return None
+        if line in self.cache:
+            return self.cache[line]
+        self.parse_count += 1
+        try:
+            _ = StringPolicy(policy={"__main__": line}).rules
+            error = None
+        except PolicySyntaxError as ex:
+            error = str(ex).split(":", 2)[-1]
+        if len(self.cache) >= self.CACHE_SIZE:
+            self.cache.clear()
+        self.cache[line] = error
+        return error
+
+    def validate(self):
+        """Check lines changed since the last call."""
+        for lineno in sorted(self.dirty_lines):
+            if lineno >= len(self.lines):
+                continue
+            line = self._get_line(lineno)
+            if line.startswith("!include") or self.lines[lineno].startswith("!include"):
+                self.includes_changed = True
+            self.lines[lineno] = line
+            self.line_errors[lineno] = self.check_line(line)
+        self.dirty_lines.clear()
+
+    @property
+    def has_errors(self) -> bool:
+        return any(error is not None for error in self.line_errors)
+
+    def get_errors(self) -> List[Tuple[int, str]]:
+        """List of (line number, counting from 1, error message)."""
+        return [
+            (lineno + 1, error)
+            for lineno, error in enumerate(self.line_errors)
+            if error is not None
+        ]
+
+    def get_includes(self) -> List[Tuple[int, str]]:
+        """List of (line number, counting from 1, included file name) for
+        include statements that refer to a single file."""
+        result = []
+        for lineno, line in enumerate(self.lines):
+            if not line.startswith("!include"):
+                continue
+            tokens = line.split()
+            if tokens[0] == "!include" and len(tokens) == 2:
+                result.append((lineno + 1, tokens[1]))
+            elif tokens[0] == "!include-service" and len(tokens) == 4:
+                result.append((lineno + 1, tokens[3]))
+        return result
+
+
 class PolicyEditor(Gtk.Application):
     """
     Main Gtk.Application for new qube widget.
@@ -175,6 +296,14 @@ class PolicyEditor(Gtk.Application):
         self.action_items: Dict[str, Gio.SimpleAction] = {}
         self.accel_group = Gtk.AccelGroup()
 
+        self.error_info_timeout: Optional[int] = None
+        # names of existing policy files, fetched when needed to check includes
+        self.known_files: Optional[Set[str]] = None
+        self.include_check_generation = 0
+        self.include_warnings: List[Tuple[int, str]] = []
+        # created with the source buffer, in setup_source
+        self.validator: PolicyLineValidator
+
     def do_activate(self, *args, **kwargs):
         """
         Method called whenever this program is run; it executes actual setup
@@ -357,6 +486,7 @@ class PolicyEditor(Gtk.Application):
             self.source_view.get_input_hints() | Gtk.InputHints.NO_EMOJI
         )
         self.source_view.set_monospace(True)
+        self.validator = PolicyLineValidator(self.source_buffer)
         self.source_buffer.connect("changed", self._text_changed)
         self.source_buffer.connect("modified-changed", self._text_changed)
         self.source_buffer.get_undo_manager().connect(
@@ -469,6 +599,8 @@ class PolicyEditor(Gtk.Application):
                 err_msg += str(ex)
             show_error(self.main_window, "Failed to save policy", err_msg)
             return False
+        # the saved file might be a new one
+        self.known_files = None
         self.open_policy_file(self.filename)
         self.source_buffer.set_modified(False)
         self.action_items["save"].set_enabled(False)
@@ -578,33 +710,34 @@ class PolicyEditor(Gtk.Application):
         self._set_policy_file(name, text)
 
     def _text_changed(self, *_args):
-        errors = []
-        text = self.policy_text
-        for lineno, line in enumerate(text.split("\n")):
-            if not line or line.startswith("#") or line.startswith("!include"):
-                continue
-            try:
-                StringPolicy(policy={"__main__": line}).rules
-            except PolicySyntaxError as ex:
-                msg = str(ex).split(":", 2)[-1]
-                msg = html.escape(msg, quote=True)
-                errors.append("<b>Line " + str(lineno + 1) + "</b>:" + msg)
+        self.validator.validate()
+        has_errors = self.validator.has_errors
+        if self.validator.includes_changed:
+            self.validator.includes_changed = False
+            self._check_includes()
 
-        if errors:
+        if has_errors:
             self.error_info.get_style_context().remove_class("error_ok")
             self.error_info.get_style_context().add_class("error_bad")
-            self.error_info.set_markup("<b>Errors found:</b>\n" + "\n".join(errors))
         else:
             self.error_info.get_style_context().remove_class("error_bad")
             self.error_info.get_style_context().add_class("error_ok")
-            self.error_info.set_text("No errors found!")
+
+        if has_errors or self.include_warnings:
+            # listing all errors is not cheap, do not do it on every keystroke
+            if self.error_info_timeout is None:
+                self.error_info_timeout = GLib.timeout_add(
+                    ERROR_INFO_DELAY, self._flush_error_info
+                )
+        else:
+            self._update_error_info()
 
         if self.source_buffer.get_modified():
             self.main_window.set_title(self.window_title + " *")
         else:
             self.main_window.set_title(self.window_title)
 
-        if not errors and self.source_buffer.get_modified():
+        if not has_errors and self.source_buffer.get_modified():
             self.action_items["save"].set_enabled(True)
             self.action_items["save_exit"].set_enabled(True)
         else:
@@ -614,6 +747,76 @@ class PolicyEditor(Gtk.Application):
         # source_buffer can_undo and can_redo always report False here
         # do not use them to fix undo/redo enabledness
 
+    def _flush_error_info(self):
+        self.error_info_timeout = None
+        self._update_error_info()
+        return False
+
+    def _update_error_info(self):
+        if self.error_info_timeout is not None:
+            GLib.source_remove(self.error_info_timeout)
+            self.error_info_timeout = None
+
+        errors = [
+            "<b>Line " + str(lineno) + "</b>:" + html.escape(msg, quote=True)
+            for lineno, msg in self.validator.get_errors()
+        ]
+        warnings = [
+            "<b>Line "
+            + str(lineno)
+            + "</b>: included file "
+            + html.escape(name, quote=True)
+            + " not found"
+            for lineno, name in self.include_warnings
+        ]
+
+        if errors:
+            markup = "<b>Errors found:</b>\n" + "\n".join(errors)
+        else:
+            markup = "No errors found!"
+        if warnings:
+            markup += "\n<b>Warnings:</b>\n" + "\n".join(warnings)
+        self.error_info.set_markup(markup)
+
+    def _check_includes(self):
+        """Check if included files exist. Getting the list of policy files
+        might take a while, so it's done in a separate thread."""
+        self.include_check_generation += 1
+        includes = self.validator.get_includes()
+        if not includes:
+            self._set_include_warnings(self.include_check_generation, [])
+            return
+        threading.Thread(
+            target=self._find_missing_includes,
+            args=(self.include_check_generation, includes),
+            daemon=True,
+        ).start()
+
+    def _find_missing_includes(self, generation: int, includes: List[Tuple[int, str]]):
+        known_files = self.known_files
+        if known_files is None:
+            try:
+                known_files = set(self.policy_client.policy_list())
+            except (PolicyAdminException, subprocess.CalledProcessError):
+                return
+            self.known_files = known_files
+        missing = []
+        for lineno, path in includes:
+            name = path.removeprefix(POLICY_DIR)
+            if not name.startswith(PolicyClientWrapper.INCLUDE_PREFIX):
+                name = name.removesuffix(".policy")
+            if name not in known_files:
+                missing.append((lineno, path))
+        GLib.idle_add(self._set_include_warnings, generation, missing)
+
+    def _set_include_warnings(self, generation: int, warnings: List[Tuple[int, str]]):
+        if generation != self.include_check_generation:
+            # text changed in the meantime
+            return
+        if warnings != self.include_warnings:
+            self.include_warnings = warnings
+            self._update_error_info()
+
     def _redo_changed(self, undo_manager):
         self.action_items["redo"].set_enabled(undo_manager.can_redo())
 
@@ -633,6 +836,7 @@ def main():
     """
     Start the app
     """
+    setup_profiling()
     policy_client = PolicyClient()
     if len(sys.argv) > 1:
         filename = sys.argv[1]
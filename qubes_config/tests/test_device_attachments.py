@@ -1336,3 +1336,24 @@ def test_req_port_not_required(required_handler):
 
     for call in expected_calls:
         assert call in qapp.actual_calls
+
+
+def test_find_duplicate_rows(auto_attach_handler, required_handler):
+    all_rows = (
+        auto_attach_handler.rule_list.get_children()
+        + required_handler.rule_list.get_children()
+    )
+
+    def check_duplicates():
+        duplicates = DevAttachmentHandler.find_duplicate_rows(all_rows)
+        for row in all_rows:
+            assert (row in duplicates) == (not row.validate(all_rows))
+        return duplicates
+
+    check_duplicates()
+
+    # assign the same device to the same qube in two rows
+    all_rows[1].assignment_wrapper = all_rows[0].assignment_wrapper
+    duplicates = check_duplicates()
+    assert all_rows[0] in duplicates
+    assert all_rows[1] in duplicates
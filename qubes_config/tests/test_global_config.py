@@ -32,6 +32,7 @@ from ..global_config.global_config import (
     VMCollection,
     Qubes,
     PolicyHandler,
+    PAGE_POLICY_FILES,
 )
 from ..global_config.basics_handler import BasicSettingsHandler
 from qubesadmin.tests import TestVMCollection, QubesTest
@@ -147,6 +148,33 @@ def test_global_config_init(
     mock_error.assert_not_called()
 
 
+@patch("subprocess.check_output")
+@patch("qubes_config.global_config.global_config.show_error")
+def test_global_config_lazy_pages(
+    mock_error, mock_subprocess, test_qapp, test_policy_manager, test_builder
+):
+    mock_subprocess.return_value = b""
+    app = GlobalConfig(test_qapp, test_policy_manager)
+    app.open_at = "file#filecopy_policy"
+    app.perform_setup()
+    assert test_builder
+
+    # only policy data is fetched in background
+    assert set(app.prefetch_futures) <= {"services", *PAGE_POLICY_FILES}
+
+    # only the requested page should be ready
+    assert list(app.handlers) == ["file"]
+    assert isinstance(app.get_current_page(), PolicyHandler)
+    assert "50-config-filecopy" not in test_policy_manager.prefetched
+
+    # other pages are created when shown
+    app.select_page("clipboard")
+    assert isinstance(app.handlers["clipboard"], ClipboardHandler)
+    assert "thisdevice" not in app.handlers
+
+    mock_error.assert_not_called()
+
+
 @patch("subprocess.check_output")
 @patch("qubes_config.global_config.global_config.show_error")
 def test_global_config_page_change(
@@ -36,6 +36,7 @@ from ..widgets.gtk_utils import (
     is_theme_light,
     show_dialog_with_icon_async,
     RESPONSES_OK,
+    PixbufCache,
 )
 
 
@@ -61,6 +62,43 @@ def test_load_icon():
     assert isinstance(icon_from_error, GdkPixbuf.Pixbuf)
 
 
+def test_load_icon_cached():
+    """Loading the same icon twice should return the same, cached pixbuf"""
+    icon_1 = load_icon("xterm", 18, 18)
+    icon_2 = load_icon("xterm", 18, 18)
+    icon_other_size = load_icon("xterm", 20, 20)
+
+    assert icon_1 is icon_2
+    assert icon_1 is not icon_other_size
+
+
+def test_pixbuf_cache():
+    cache = PixbufCache(max_size=2)
+    loader = Mock(
+        side_effect=lambda: GdkPixbuf.Pixbuf.new(
+            GdkPixbuf.Colorspace.RGB, True, 8, 10, 10
+        )
+    )
+
+    pixbuf_a = cache.get(("a", 10, 10), loader)
+    assert cache.get(("a", 10, 10), loader) is pixbuf_a
+    assert loader.call_count == 1
+
+    cache.get(("b", 10, 10), loader)
+    # a was used most recently, so b is evicted
+    cache.get(("a", 10, 10), loader)
+    cache.get(("c", 10, 10), loader)
+    assert cache.get(("a", 10, 10), loader) is pixbuf_a
+    cache.get(("b", 10, 10), loader)
+    assert loader.call_count == 4
+
+    assert cache.get_statistics() == {"hits": 3, "misses": 4, "size": 2}
+
+    # theme change drops all cached icons
+    Gtk.IconTheme.get_default().emit("changed")
+    assert cache.get(("a", 10, 10), loader) is not pixbuf_a
+
+
 def test_ask_question():
     """Simple test to see if the function does something
     and if the function correctly executes run and destroy (instead of,
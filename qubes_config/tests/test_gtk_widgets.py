@@ -387,6 +387,29 @@ def test_vmmodeler_filter_include_internal(test_qapp):
     assert sorted(selected_vms) == sorted(vms)
 
 
+def test_vmmodeler_shared_catalogue(test_qapp):
+    combobox_1: Gtk.ComboBox = Gtk.ComboBox.new_with_entry()
+    combobox_2: Gtk.ComboBox = Gtk.ComboBox.new_with_entry()
+    modeler_1 = gtk_widgets.VMListModeler(combobox=combobox_1, qapp=test_qapp)
+    calls_before = len(test_qapp.actual_calls)
+    modeler_2 = gtk_widgets.VMListModeler(combobox=combobox_2, qapp=test_qapp)
+
+    catalogue = modeler_1.catalogue
+    assert modeler_2.catalogue is catalogue
+    assert catalogue.refcount == 2
+    # qube features were not queried again for the second modeler
+    for call in test_qapp.actual_calls[calls_before:]:
+        assert call[1] != "admin.vm.feature.Get"
+    assert len(combobox_1.get_model()) == len(combobox_2.get_model())
+
+    combobox_1.destroy()
+    assert catalogue.refcount == 1
+    combobox_2.destroy()
+    assert catalogue.refcount == 0
+    # cached data was dropped
+    assert not catalogue.get_entry("test-vm").get("icon")
+
+
 def test_vmmodeler_categories_none(test_qapp):
     combobox: Gtk.ComboBox = Gtk.ComboBox.new_with_entry()
     _ = gtk_widgets.VMListModeler(
@@ -32,6 +32,11 @@ from ...new_qube.application_selector import (
 )
 from ...new_qube.template_handler import TemplateHandler
 
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gtk
+
 
 @patch("subprocess.check_output")
 def test_app_handler(mock_subprocess, test_qapp, new_qube_builder):
@@ -276,7 +281,14 @@ def test_app_handler_do_template(mock_subprocess, test_qapp, new_qube_builder):
 
     assert app_selector.apps_list_placeholder.get_visible()
     app_selector.load_all_button.clicked()
-    time.sleep(1)
+    # applications are loaded by worker threads and added in the main loop
+    for _ in range(50):
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+        if app_selector.load_all_button.get_label() != "Loading applications...":
+            break
+        time.sleep(0.1)
+    assert app_selector.load_all_button.get_label() == "No matching applications found"
 
     for child in app_selector.apps_list_other.get_children():
         # as we cannot use mapping in tests, let's just check the filter
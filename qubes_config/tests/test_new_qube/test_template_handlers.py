@@ -21,9 +21,13 @@
 # pylint: disable=missing-function-docstring
 # pylint: disable=missing-class-docstring
 
+import os
+import subprocess
+import time
 from unittest.mock import patch, Mock, ANY
 
-from ...new_qube.template_handler import TemplateHandler
+from ...new_qube import template_handler
+from ...new_qube.template_handler import TemplateHandler, AppmenusCache
 from ...new_qube.application_selector import ApplicationData
 
 import gi
@@ -147,6 +151,46 @@ def test_get_appdata(mock_subprocess, test_qapp, new_qube_builder):
     assert handler.get_available_apps() == [app_data]
 
 
+@patch("qubes_config.new_qube.template_handler.show_error")
+@patch("subprocess.check_output")
+def test_load_all_apps_errors(mock_subprocess, mock_error, test_qapp, new_qube_builder):
+    def mock_output(command):
+        vm_name = command[-1]
+        if vm_name == "fedora-35":
+            return b"test.desktop|Test App|test desc"
+        if vm_name == "fedora-36":
+            return b"\xff"
+        if vm_name == "test-vm":
+            raise FileNotFoundError("qvm-appmenus")
+        raise subprocess.CalledProcessError(1, command)
+
+    mock_subprocess.side_effect = mock_output
+
+    handler = TemplateHandler(new_qube_builder, test_qapp)
+    loaded = []
+    done = Mock()
+    handler.load_all_available_apps(callback=loaded.append, done_callback=done)
+
+    # any failure of a worker still counts the qube as done
+    for _ in range(50):
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+        if done.called:
+            break
+        time.sleep(0.1)
+    done.assert_called_once_with()
+    handler.executor.shutdown(wait=True)
+
+    assert len(loaded) == len(test_qapp.domains)
+    fedora35 = test_qapp.domains["fedora-35"]
+    assert [app.ident for app in handler.get_available_apps(fedora35)] == [
+        "test.desktop"
+    ]
+    assert handler.get_available_apps(test_qapp.domains["fedora-36"]) == []
+    assert handler.get_available_apps(test_qapp.domains["test-vm"]) == []
+    assert mock_error.call_count == len(test_qapp.domains) - 1
+
+
 @patch("subprocess.check_output")
 def test_template_emit_signal(mock_subprocess, test_qapp, new_qube_builder):
     mock_subprocess.return_value = b""
@@ -185,3 +229,69 @@ def test_template_emit_signal(mock_subprocess, test_qapp, new_qube_builder):
     handler.select_template(test_qapp.domains["fedora-35"])
 
     mock_emit.assert_called_with(ANY, "fedora-35")
+
+
+def test_appmenus_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_handler, "APPMENUS_DIR", str(tmp_path))
+    templates_dir = tmp_path / "fedora-36" / "apps.templates"
+    templates_dir.mkdir(parents=True)
+    (templates_dir / "a.desktop").write_text("")
+    cache_path = str(tmp_path / "cache.json")
+    template_sources = ["fedora-36"]
+    appvm_sources = ["test-vm", "fedora-36"]
+
+    cache = AppmenusCache(cache_path)
+    generation = AppmenusCache.get_generation(template_sources, "available")
+    assert generation is not None
+    assert AppmenusCache.get_generation(["fedora-35"], "available") is None
+    # app qubes use their template's appmenus
+    assert AppmenusCache.get_generation(appvm_sources, "available") == generation
+    # no whitelist files yet, only the templates directory itself
+    default_generation = AppmenusCache.get_generation(template_sources, "default")
+    assert default_generation == templates_dir.stat().st_mtime_ns
+
+    cache.set(template_sources, "available", ["a.desktop|A|a"], generation)
+    cache.set(appvm_sources, "available", ["a.desktop|A|a"], generation)
+    # no appmenus directory, nothing to key the cache on
+    cache.set(["fedora-35"], "available", ["b.desktop|B|b"], None)
+    cache.save()
+
+    cache = AppmenusCache(cache_path)
+    assert cache.get(template_sources, "available") == ["a.desktop|A|a"]
+    assert cache.get(appvm_sources, "available") == ["a.desktop|A|a"]
+    assert cache.get(template_sources, "default") is None
+    assert cache.get(["fedora-35"], "available") is None
+
+    # a file inside the directory changed, without touching the directory
+    dir_mtime = templates_dir.stat().st_mtime_ns
+    os.utime(templates_dir / "a.desktop", ns=(dir_mtime + 10**9,) * 2)
+    os.utime(templates_dir, ns=(dir_mtime, dir_mtime))
+    assert cache.get(template_sources, "available") is None
+    assert cache.get(appvm_sources, "available") is None
+
+
+def test_appmenus_cache_default(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_handler, "APPMENUS_DIR", str(tmp_path))
+    templates_dir = tmp_path / "fedora-36" / "apps.templates"
+    templates_dir.mkdir(parents=True)
+    whitelist = tmp_path / "fedora-36" / "vm-whitelisted-appmenus.list"
+    whitelist.write_text("a.desktop\n")
+    dir_mtime = templates_dir.stat().st_mtime_ns
+    os.utime(whitelist, ns=(dir_mtime + 10**9,) * 2)
+
+    cache = AppmenusCache(str(tmp_path / "cache.json"))
+    sources = ["fedora-36"]
+    generation = AppmenusCache.get_generation(sources, "default")
+    assert generation == dir_mtime + 10**9
+    cache.set(sources, "default", ["a.desktop"], generation)
+    assert cache.get(sources, "default") == ["a.desktop"]
+
+    # adding a desktop file does not change the default whitelist
+    (templates_dir / "b.desktop").write_text("")
+    os.utime(templates_dir / "b.desktop", ns=(dir_mtime + 10**9,) * 2)
+    os.utime(templates_dir, ns=(dir_mtime, dir_mtime))
+    assert cache.get(sources, "default") == ["a.desktop"]
+
+    # editing the whitelist does
+    os.utime(whitelist, ns=(dir_mtime + 2 * 10**9,) * 2)
+    assert cache.get(sources, "default") is None
@@ -22,7 +22,7 @@
 
 from unittest.mock import patch
 
-from ..policy_editor.policy_editor import PolicyEditor
+from ..policy_editor.policy_editor import PolicyEditor, PolicyLineValidator
 
 import gi
 
@@ -416,3 +416,38 @@ def test_includes(test_policy_client):
         )
         == """Test.Test +argument @anyvm @anyvm allow"""
     )
+
+
+def test_line_validator():
+    buffer = Gtk.TextBuffer()
+    validator = PolicyLineValidator(buffer)
+
+    buffer.set_text(
+        "# comment\nTest * @anyvm @anyvm allow\nTest * @anyvm @anyvm andruty\n"
+        "!include include/include-2"
+    )
+    validator.validate()
+    assert validator.parse_count == 2
+    assert [lineno for lineno, _msg in validator.get_errors()] == [3]
+    assert validator.get_includes() == [(4, "include/include-2")]
+    assert validator.includes_changed
+
+    # only the edited line is parsed again
+    buffer.insert(buffer.get_iter_at_line(1), "# ")
+    validator.validate()
+    assert validator.parse_count == 2
+    assert [lineno for lineno, _msg in validator.get_errors()] == [3]
+
+    # new lines shift the errors, known lines are not parsed again
+    buffer.insert(buffer.get_iter_at_line(0), "Test * @anyvm @anyvm andruty\n\n")
+    validator.validate()
+    assert validator.parse_count == 2
+    assert [lineno for lineno, _msg in validator.get_errors()] == [1, 5]
+
+    start = buffer.get_iter_at_line(0)
+    end = buffer.get_iter_at_line(4)
+    end.forward_to_line_end()
+    buffer.delete(start, end)
+    validator.validate()
+    assert not validator.has_errors
+    assert validator.lines == ["", "!include include/include-2"]
@@ -200,3 +200,79 @@ def test_save_policy():
     ) as mock_replace:
         mock_replace.side_effect = replace_file
         manager.save_rules("test", [rule], "any")
+
+
+def test_policy_files_batch():
+    calls = []
+
+    def return_files(service_name):
+        calls.append(service_name)
+        return {"a": ["1-a", "2-a"], "b": ["1-b"]}.get(service_name, [""])
+
+    manager = PolicyManager()
+    with patch(
+        "qubes_config.global_config.policy_manager.PolicyClient.policy_get_files"
+    ) as mock_get:
+        mock_get.side_effect = return_files
+
+        assert manager.get_policy_files(["a", "b", "c", "a"]) == {
+            "a": ["1-a", "2-a"],
+            "b": ["1-b"],
+            "c": [""],
+        }
+        assert sorted(calls) == ["a", "b", "c"]
+
+        # cached lists are used
+        assert manager.get_conflicting_policy_files("a", "2-a") == ["1-a"]
+        assert manager.get_all_policy_files("b") == ["1-b"]
+        assert len(calls) == 3
+
+        manager.invalidate_cache()
+        assert manager.get_all_policy_files("b") == ["1-b"]
+        assert len(calls) == 4
+
+
+def test_rules_not_shared():
+    class MockPolicy:
+        def __init__(self):
+            self.files = {"test": "Test\t*\t@anyvm\t@anyvm\tdeny"}
+            self.get_calls = 0
+
+        def policy_get(self, filename):
+            self.get_calls += 1
+            text = self.files[filename]
+            return text, str(len(text))
+
+        def policy_replace(self, filename, text, _token):
+            self.files[filename] = text
+
+    manager = PolicyManager()
+    manager.policy_client = MockPolicy()
+
+    with patch.object(
+        manager, "text_to_rules", wraps=PolicyManager.text_to_rules
+    ) as mock_parse:
+        # prefetched files are parsed in advance and used once
+        manager.prefetch_files(["test"])
+        assert mock_parse.call_count == 1
+        rules, token = manager.get_rules_from_filename("test", "")
+        assert mock_parse.call_count == 1
+        assert "test" not in manager.prefetched
+        # changing returned rules must not affect other callers
+        first_rule = rules[0]
+        rules.clear()
+
+        rules, token_2 = manager.get_rules_from_filename("test", "")
+        assert token_2 == token
+        assert rules[0] is not first_rule
+        assert [str(rule) for rule in rules] == ["Test\t*\t@anyvm\t@anyvm\tdeny"]
+        assert mock_parse.call_count == 2
+
+        rules.append(manager.new_rule("Test", "@anyvm", "@anyvm", "allow"))
+        manager.save_rules("test", rules, token)
+
+        # text that was just saved does not need to be parsed again
+        new_token = manager.get_token("test")
+        assert new_token != token
+        assert mock_parse.call_count == 2
+        assert manager.policy_client.get_calls == 3
@@ -20,6 +20,8 @@
 # pylint: disable=missing-module-docstring
 # pylint: disable=missing-function-docstring
 # pylint: disable=missing-class-docstring
+from types import SimpleNamespace
+
 import pytest
 
 from qrexec.policy.parser import Rule
@@ -28,6 +30,7 @@ from ..global_config.policy_rules import (
     RuleTargeted,
     RuleDispVM,
     RuleTargetedAdminVM,
+    RuleIndex,
 )
 
 
@@ -451,3 +454,34 @@ def test_dispvm_conflict():
         assert rule.is_rule_conflicting(
             other_source="vm1", other_target="vm3", other_action="allow"
         )
+
+
+def test_rule_index():
+    rows = [
+        SimpleNamespace(rule=RuleSimple(make_rule("vm1", "vm2", "allow"))),
+        SimpleNamespace(
+            rule=RuleTargeted(make_rule("vm1", "@default", "allow target=vm3"))
+        ),
+        SimpleNamespace(
+            rule=RuleTargeted(make_rule("vm2", "@default", "ask default_target=vm3"))
+        ),
+        SimpleNamespace(
+            rule=RuleDispVM(make_rule("vm4", "@dispvm", "allow target=@dispvm:vm2"))
+        ),
+    ]
+    index = RuleIndex(rows)
+    assert index.is_current(rows)
+    assert not index.is_current(rows[1:])
+
+    # the index must find the same row as asking all rows in order
+    for row in [None] + rows:
+        for source in ["vm1", "vm2", "vm4", "vm5"]:
+            for target in ["vm1", "vm2", "vm3", "vm5"]:
+                expected = None
+                for other_row in rows:
+                    if other_row is not row and other_row.rule.is_rule_conflicting(
+                        source, target, "deny"
+                    ):
+                        expected = other_row
+                        break
+                assert index.find_conflict(row, source, target) is expected
@@ -0,0 +1,133 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+import os
+import signal
+
+import qubesadmin.events
+
+from ..widgets.profiler import ENV_VARIABLE, Profiler, setup_profiling
+
+
+def test_setup_profiling_options(tmp_path, monkeypatch):
+    monkeypatch.delenv(ENV_VARIABLE, raising=False)
+    argv = ["qubes-global-config", "--open-at", "usb"]
+    assert setup_profiling(argv) is None
+    assert argv == ["qubes-global-config", "--open-at", "usb"]
+
+    trace_file = str(tmp_path / "trace.folded")
+    argv = ["qubes-global-config", f"--profile={trace_file}", "--open-at", "usb"]
+    profiler = setup_profiling(argv)
+    try:
+        assert profiler.output_path == trace_file
+        # the option must not reach the program's own argument parser
+        assert argv == ["qubes-global-config", "--open-at", "usb"]
+    finally:
+        profiler.uninstall()
+
+    monkeypatch.setenv(ENV_VARIABLE, trace_file)
+    profiler = setup_profiling(["qui-domains"])
+    try:
+        assert profiler.output_path == trace_file
+    finally:
+        profiler.uninstall()
+
+
+def test_profiler_trace(tmp_path):
+    profiler = Profiler(str(tmp_path / "trace.folded"))
+
+    def fake_qubesd_call(_app, _dest, _method, _arg=None, _payload=None):
+        return b"0\x00"
+
+    qubesd_call = profiler.trace_qubesd_call(fake_qubesd_call)
+
+    def refresh():
+        qubesd_call(None, "test-vm", "admin.vm.property.Get", "netvm")
+        qubesd_call(None, "dom0", "admin.vm.List")
+        return False
+
+    callback = profiler.trace_callback("idle", refresh)
+    assert callback() is False
+
+    assert [call[:3] for call in profiler.qubesd_calls] == [
+        ("admin.vm.property.Get", "test-vm", "netvm"),
+        ("admin.vm.List", "dom0", "None"),
+    ]
+    assert all("refresh" in call[4] for call in profiler.qubesd_calls)
+    assert (
+        profiler.callbacks[("idle", refresh.__module__ + "." + refresh.__qualname__)][0]
+        == 1
+    )
+
+    profiler.write_trace()
+    with open(profiler.output_path, encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    assert len(lines) == 3
+    for line in lines:
+        stack, value = line.rsplit(" ", 1)
+        assert int(value) > 0
+        assert "refresh" in stack
+    assert any(line.split(" ")[0].endswith(";qubesd:admin.vm.List") for line in lines)
+
+    summary = profiler.get_summary()
+    assert "2 qubesd calls" in summary
+    assert "admin.vm.property.Get" in summary
+
+
+def test_profiler_event_handlers(test_qapp, tmp_path):
+    profiler = Profiler(str(tmp_path / "trace.folded"))
+    profiler.install()
+    try:
+        calls = []
+
+        def handler(_subject, event, **_kwargs):
+            calls.append(event)
+
+        dispatcher = qubesadmin.events.EventsDispatcher(test_qapp)
+        dispatcher.add_handler("domain-start", handler)
+        dispatcher.handle("", "domain-start")
+        assert calls == ["domain-start"]
+        assert (
+            profiler.callbacks[
+                ("event domain-start", handler.__module__ + "." + handler.__qualname__)
+            ][0]
+            == 1
+        )
+
+        # handlers can still be removed with the original function
+        dispatcher.remove_handler("domain-start", handler)
+        dispatcher.handle("", "domain-start")
+        assert calls == ["domain-start"]
+    finally:
+        profiler.uninstall()
+
+
+def test_profiler_signals(tmp_path):
+    sigterm_handler = signal.getsignal(signal.SIGTERM)
+    profiler = Profiler(str(tmp_path / "trace.folded"))
+    profiler.install()
+    try:
+        # long-running widgets can be asked for a trace without stopping them
+        os.kill(os.getpid(), signal.SIGUSR1)
+        assert os.path.exists(profiler.output_path)
+    finally:
+        profiler.uninstall()
+    assert signal.getsignal(signal.SIGTERM) == sigterm_handler
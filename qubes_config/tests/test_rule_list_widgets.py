@@ -96,6 +96,19 @@ def test_vm_widget_changes(test_qapp):
     assert str(simple_widget.get_selected()) == "test-blue"
 
 
+def test_vm_widget_lazy_model(test_qapp):
+    widget = VMWidget(qapp=test_qapp, categories=None, initial_value="test-vm")
+
+    # combobox model is only needed when editing
+    assert widget.combobox.get_model() is None
+    assert not widget.is_changed()
+
+    widget.set_editable(True)
+    assert widget.combobox.get_model() is not None
+    assert widget.combobox.get_active_id() == "test-vm"
+    assert not widget.is_changed()
+
+
 def test_action_widget():
     rule = make_rule("vm1", "vm2", "allow")
     action_widget = ActionWidget(rule.ACTION_CHOICES, VERB_DESCR, rule)
@@ -0,0 +1,111 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=protected-access
+
+import concurrent.futures
+from unittest.mock import patch
+
+from ..global_config import thisdevice_handler
+from ..global_config.thisdevice_handler import HCLReport, ThisDeviceHandler
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gtk
+
+HCL_OUTPUT = b"""brand: |
+  ACME
+model: |
+  Laptop 3000
+hvm: |
+  yes
+versions:
+
+- qubes: |
+    R4.3
+  xen: |
+    4.19
+"""
+
+
+def test_hcl_report_cache(tmp_path, monkeypatch):
+    boot_id_file = tmp_path / "boot_id"
+    boot_id_file.write_text("boot-1\n")
+    monkeypatch.setattr(thisdevice_handler, "BOOT_ID_FILE", str(boot_id_file))
+    cache_path = str(tmp_path / "hcl.json")
+
+    report = HCLReport(cache_path)
+    assert report.text is None
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    with patch("subprocess.check_output") as mock_subprocess:
+        # failures are not cached
+        mock_subprocess.return_value = b""
+        assert report.refresh(executor).result() == ""
+        assert report.text is None
+        assert HCLReport(cache_path).text is None
+
+        mock_subprocess.return_value = HCL_OUTPUT
+        assert report.refresh(executor).result() == HCL_OUTPUT.decode()
+        assert report.text == HCL_OUTPUT.decode()
+    executor.shutdown(wait=True)
+
+    # the report survives restart of the program, but not a reboot
+    assert HCLReport(cache_path).text == HCL_OUTPUT.decode()
+    boot_id_file.write_text("boot-2\n")
+    assert HCLReport(cache_path).text is None
+
+
+def test_thisdevice_handler(test_qapp, test_policy_manager, real_builder, tmp_path):
+    report = HCLReport(str(tmp_path / "hcl.json"))
+    report.text = HCL_OUTPUT.decode()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    # cached report is shown right away
+    with patch("subprocess.check_output") as mock_subprocess:
+        handler = ThisDeviceHandler(
+            test_qapp,
+            real_builder,
+            test_policy_manager,
+            hcl_report=report,
+            executor=executor,
+        )
+        assert "ACME" in handler.data_label.get_text()
+        assert "4.19" in handler.data_label.get_text()
+        assert handler.refresh_button.get_sensitive()
+        mock_subprocess.assert_not_called()
+        # qubes are checked once the page had a chance to be drawn
+        assert "checking" in handler.compat_pv_label.get_text()
+
+        # refresh generates it again, in background
+        mock_subprocess.return_value = HCL_OUTPUT.replace(b"ACME", b"Other")
+        handler.refresh_button.clicked()
+        assert not handler.refresh_button.get_sensitive()
+        report.future.result()
+        executor.shutdown(wait=True)
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+
+    mock_subprocess.assert_called_once()
+    assert "Other" in handler.data_label.get_text()
+    assert handler.refresh_button.get_sensitive()
+    assert "found" in handler.compat_pv_label.get_text()
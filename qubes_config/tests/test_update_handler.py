@@ -935,6 +935,19 @@ def test_update_proxy_add_exception_err(
 def test_update_proxy_save_updatevm(
     mock_feature, real_builder, test_qapp_whonix, test_policy_manager
 ):
+    # only qubes whose value has to change are written
+    test_qapp_whonix.expected_calls[
+        ("sys-net", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"0\x001"
+    test_qapp_whonix.expected_calls[
+        ("sys-whonix", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"0\x001"
+    test_qapp_whonix.expected_calls[
+        ("sys-firewall", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"2\x00QubesFeatureNotFoundError\x00\x00service.qubes-updates-proxy\x00"
+    test_qapp_whonix.expected_calls[
+        ("anon-whonix", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"2\x00QubesFeatureNotFoundError\x00\x00service.qubes-updates-proxy\x00"
     handler = UpdateProxy(
         real_builder,
         test_qapp_whonix,
@@ -1037,6 +1050,15 @@ def test_update_proxy_apply(
 def test_update_proxy_save_justwhonix(
     mock_feature, real_builder, test_qapp_whonix, test_policy_manager
 ):
+    test_qapp_whonix.expected_calls[
+        ("sys-net", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"0\x001"
+    test_qapp_whonix.expected_calls[
+        ("sys-whonix", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"0\x001"
+    test_qapp_whonix.expected_calls[
+        ("anon-whonix", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"2\x00QubesFeatureNotFoundError\x00\x00service.qubes-updates-proxy\x00"
     handler = UpdateProxy(
         real_builder,
         test_qapp_whonix,
@@ -1066,7 +1088,8 @@ Proxy * @type:TemplateVM @default allow target=sys-net
         assert file == "proxy-file"
         assert [str(rule) for rule in expected_rules] == [str(rule) for rule in rules]
 
-        assert len(mock_feature.mock_calls) == 3
+        # sys-net already is an update proxy
+        assert len(mock_feature.mock_calls) == 2
         assert (
             call(
                 test_qapp_whonix.domains["anon-whonix"],
@@ -1081,7 +1104,7 @@ Proxy * @type:TemplateVM @default allow target=sys-net
                 "service.qubes-updates-proxy",
                 True,
             )
-            in mock_feature.mock_calls
+            not in mock_feature.mock_calls
         )
         assert (
             call(
@@ -1097,6 +1120,15 @@ Proxy * @type:TemplateVM @default allow target=sys-net
 def test_update_proxy_save_add_rule(
     mock_feature, real_builder, test_qapp_whonix, test_policy_manager
 ):
+    test_qapp_whonix.expected_calls[
+        ("sys-net", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"0\x001"
+    test_qapp_whonix.expected_calls[
+        ("sys-whonix", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"0\x00"
+    test_qapp_whonix.expected_calls[
+        ("sys-firewall", "admin.vm.feature.Get", "service.qubes-updates-proxy", None)
+    ] = b"2\x00QubesFeatureNotFoundError\x00\x00service.qubes-updates-proxy\x00"
     handler = UpdateProxy(
         real_builder,
         test_qapp_whonix,
@@ -1130,7 +1162,8 @@ Proxy * @type:TemplateVM @default allow target=sys-net
         assert file == "proxy-file"
         assert [str(rule) for rule in expected_rules] == [str(rule) for rule in rules]
 
-        assert len(mock_feature.mock_calls) == 3
+        # sys-net already is an update proxy
+        assert len(mock_feature.mock_calls) == 2
         assert (
             call(
                 test_qapp_whonix.domains["sys-whonix"],
@@ -1153,7 +1186,7 @@ Proxy * @type:TemplateVM @default allow target=sys-net
                 "service.qubes-updates-proxy",
                 True,
             )
-            in mock_feature.mock_calls
+            not in mock_feature.mock_calls
         )
 
 
@@ -824,7 +824,9 @@ def test_u2f_handler_save_complex(test_qapp, test_policy_manager, real_builder):
             call(test_qapp.domains["fedora-35"], handler.SERVICE_FEATURE, True)
             in mock_apply.mock_calls
         )
-        assert len(mock_apply.mock_calls) == 3
+        # the feature is not set in the remaining available qube, so it
+        # does not need to be removed
+        assert len(mock_apply.mock_calls) == 2
 
         expected_rules = handler.policy_manager.text_to_rules("""
 policy.RegisterArgument +u2f.Authenticate sys-usb @anyvm allow target=dom0
@@ -881,7 +883,9 @@ def test_u2f_handler_save_complex_2(test_qapp, test_policy_manager, real_builder
             call(test_qapp.domains["fedora-35"], handler.SERVICE_FEATURE, True)
             in mock_apply.mock_calls
         )
-        assert len(mock_apply.mock_calls) == 3
+        # the feature is not set in the remaining available qube, so it
+        # does not need to be removed
+        assert len(mock_apply.mock_calls) == 2
 
         expected_rules = handler.policy_manager.text_to_rules("""
 u2f.Register * fedora-35 sys-usb allow
@@ -29,6 +29,7 @@ from ..widgets.utils import (
     get_feature,
     apply_feature_change_from_widget,
     BiDictionary,
+    FeatureBatch,
 )
 
 
@@ -105,6 +106,71 @@ def test_feature_unavailable(test_qapp):
         apply_feature_change(vm, feature_name, True)
 
 
+def test_feature_batch(test_qapp):
+    feature_name = "test_feature"
+    not_found = b"2\x00QubesFeatureNotFoundError\x00\x00Feature not set\x00"
+    values = {
+        "test-vm": b"0\x001",
+        "test-red": b"0\x00",
+        "test-blue": not_found,
+        "fedora-35": b"0\x00text",
+        "sys-net": not_found,
+        "sys-usb": b"2\x00QubesDaemonAccessError\x00\x00Not allowed\x00",
+    }
+    for name, value in values.items():
+        test_qapp.expected_calls[(name, "admin.vm.feature.Get", feature_name, None)] = (
+            value
+        )
+    vms = [test_qapp.domains[name] for name in values]
+
+    batch = FeatureBatch(feature_name)
+    assert {str(vm): value for vm, value in batch.get(vms).items()} == {
+        "test-vm": "1",
+        "test-red": "",
+        "test-blue": None,
+        "fedora-35": "text",
+        "sys-net": None,
+        # access errors are treated as unset, as in get_feature
+        "sys-usb": None,
+    }
+    assert batch.get_boolean(vms[:3], True) == {
+        test_qapp.domains["test-vm"]: True,
+        test_qapp.domains["test-red"]: False,
+        test_qapp.domains["test-blue"]: True,
+    }
+
+    # only values that differ are written
+    desired = {
+        test_qapp.domains["test-vm"]: True,
+        test_qapp.domains["test-red"]: True,
+        test_qapp.domains["test-blue"]: None,
+        test_qapp.domains["fedora-35"]: "text",
+        test_qapp.domains["sys-net"]: False,
+    }
+    assert batch.get_changes(desired) == {
+        test_qapp.domains["test-red"]: True,
+        test_qapp.domains["sys-net"]: False,
+    }
+
+    # errors are collected and reported together
+    test_qapp.expected_calls[
+        ("test-red", "admin.vm.feature.Set", feature_name, b"1")
+    ] = b"0\x00"
+    test_qapp.expected_calls[("sys-net", "admin.vm.feature.Set", feature_name, b"")] = (
+        b"2\x00QubesDaemonAccessError\x00\x00Not allowed\x00"
+    )
+    batch.update(desired)
+    assert (
+        "test-red",
+        "admin.vm.feature.Set",
+        feature_name,
+        b"1",
+    ) in test_qapp.actual_calls
+    assert list(batch.errors) == [test_qapp.domains["sys-net"]]
+    with pytest.raises(qubesadmin.exc.QubesException):
+        batch.raise_errors()
+
+
 def test_apply_change_from_widget(test_qapp):
     vm = test_qapp.domains["test-vm"]
     feature_name = "test-feature"
@@ -20,13 +20,14 @@
 """Utility functions using Gtk"""
 
 import asyncio
+import collections
 import contextlib
 import importlib.resources
 import os
 
 import fcntl
 
-from typing import Dict, Union, Optional
+from typing import Any, Callable, Dict, Hashable, Union, Optional
 
 import gi
 
@@ -51,6 +52,65 @@ DATA = "/var/run/qubes/qubes-clipboard.bin"
 FROM = "/var/run/qubes/qubes-clipboard.bin.source"
 XEVENT = "/var/run/qubes/qubes-clipboard.bin.xevent"
 
+# maximum number of pixbufs kept in ICON_CACHE
+ICON_CACHE_SIZE = 512
+
+
+class PixbufCache:
+    """Process-wide LRU cache of loaded icons. Keys are tuples starting
+    with icon name and size; the cache is cleared whenever the default icon
+    theme changes."""
+
+    def __init__(self, max_size: int = ICON_CACHE_SIZE):
+        self.max_size = max_size
+        self._pixbufs: collections.OrderedDict = collections.OrderedDict()
+        self._theme: Optional[Gtk.IconTheme] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self, key: Hashable, loader: Callable[[], GdkPixbuf.Pixbuf]
+    ) -> GdkPixbuf.Pixbuf:
+        """Return pixbuf for a given key, calling loader() if it's not
+        in the cache yet. Returned pixbufs are shared and must not be
+        modified."""
+        self._watch_theme()
+        try:
+            pixbuf = self._pixbufs[key]
+        except KeyError:
+            self.misses += 1
+            pixbuf = loader()
+            self._pixbufs[key] = pixbuf
+            if len(self._pixbufs) > self.max_size:
+                self._pixbufs.popitem(last=False)
+            return pixbuf
+        self.hits += 1
+        self._pixbufs.move_to_end(key)
+        return pixbuf
+
+    def clear(self, *_args):
+        """Drop all cached pixbufs."""
+        self._pixbufs.clear()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._pixbufs),
+        }
+
+    def _watch_theme(self):
+        # default icon theme is only available once there is a screen
+        theme = Gtk.IconTheme.get_default()
+        if theme is not self._theme:
+            self.clear()
+            self._theme = theme
+            if theme:
+                theme.connect("changed", self.clear)
+
+
+ICON_CACHE = PixbufCache()
+
 
 def load_icon_at_gtk_size(
     icon_name, icon_size: Gtk.IconSize = Gtk.IconSize.LARGE_TOOLBAR
@@ -65,29 +125,40 @@ def load_icon_at_gtk_size(
 
 
 def load_icon(icon_name: str, width: int = 24, height: int = 24):
-    """Load icon from provided name, if available. If not, attempt to treat
-    provided name as a path. If icon not found in any of the above ways,
-    load a blank icon of specified size.
-    Returns GdkPixbuf.Pixbuf.
+    """Load icon from provided path (if icon_name contains a path separator)
+    or name (including its -symbolic variant). If icon not found in any of
+    the above ways, load a blank icon of specified size.
+    Returns GdkPixbuf.Pixbuf; it is cached in ICON_CACHE and shared, so it
+    must not be modified.
     width and height must be in pixels.
     """
-    try:
-        # icon_name is a path
-        return GdkPixbuf.Pixbuf.new_from_file_at_size(icon_name, width, height)
-    except (GLib.Error, TypeError):
+    return ICON_CACHE.get(
+        (icon_name, width, height), lambda: _load_icon(icon_name, width, height)
+    )
+
+
+def _load_icon(icon_name: str, width: int, height: int):
+    if icon_name and os.path.sep in icon_name:
+        try:
+            # icon_name is a path
+            return GdkPixbuf.Pixbuf.new_from_file_at_size(icon_name, width, height)
+        except (GLib.Error, TypeError):
+            pass
+    # icon_name is a name; some themes only have the symbolic variant
+    for name in (icon_name, f"{icon_name}-symbolic"):
         try:
-            # icon_name is a name
             image: GdkPixbuf.Pixbuf = Gtk.IconTheme.get_default().load_icon(
-                icon_name, width, Gtk.IconLookupFlags.FORCE_SIZE
+                name, width, Gtk.IconLookupFlags.FORCE_SIZE
             )
             return image
         except (TypeError, GLib.Error):
-            # icon not found in any way
-            pixbuf: GdkPixbuf.Pixbuf = GdkPixbuf.Pixbuf.new(
-                GdkPixbuf.Colorspace.RGB, True, 8, width, height
-            )
-            pixbuf.fill(0x000)
-            return pixbuf
+            continue
+    # icon not found in any way
+    pixbuf: GdkPixbuf.Pixbuf = GdkPixbuf.Pixbuf.new(
+        GdkPixbuf.Colorspace.RGB, True, 8, width, height
+    )
+    pixbuf.fill(0x000)
+    return pixbuf
 
 
 def show_error(parent, title, text):
@@ -26,11 +26,12 @@ import gi
 import abc
 import qubesadmin.vm
 import itertools
+import weakref
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GdkPixbuf
 
-from typing import Callable, Any
+from typing import Callable, Any, Optional
 
 from .gtk_utils import load_icon, is_theme_light
 
@@ -221,6 +222,86 @@ class TextModeler(TraitSelector):
         self._on_changed(None)
 
 
+class VMCatalogue:
+    """
+    Basic data (name, class, icon and the internal flag) of all qubes of a
+    given Qubes object, shared by all VMListModelers using that object, so
+    that every selector does not have to query every qube separately.
+    Use VMCatalogue.acquire to get it and release() when done; data is
+    dropped when nobody uses it.
+    """
+
+    _catalogues: "weakref.WeakKeyDictionary[qubesadmin.Qubes, VMCatalogue]" = (
+        weakref.WeakKeyDictionary()
+    )
+
+    def __init__(self, qapp: qubesadmin.Qubes):
+        self.qapp = qapp
+        self.refcount = 0
+        self._entries: dict[str, dict[str, Any]] = {}
+
+    @classmethod
+    def acquire(cls, qapp: qubesadmin.Qubes) -> "VMCatalogue":
+        """Get the catalogue for a given Qubes object and take a reference
+        to it."""
+        catalogue = cls._catalogues.get(qapp)
+        if catalogue is None:
+            catalogue = cls(qapp)
+            cls._catalogues[qapp] = catalogue
+        catalogue.refcount += 1
+        return catalogue
+
+    def release(self):
+        """Drop a reference to the catalogue."""
+        self.refcount -= 1
+        if self.refcount <= 0:
+            self.refcount = 0
+            self._entries.clear()
+
+    @staticmethod
+    def _fetch_entry(domain: qubesadmin.vm.QubesVM) -> dict[str, Any]:
+        # icon and internal flag are fetched on first use, see get_icon
+        # and is_internal
+        return {"name": domain.name, "klass": domain.klass, "vm": domain}
+
+    @staticmethod
+    def get_icon(entry: dict[str, Any]) -> str:
+        """Get icon name of a catalogue entry."""
+        if "icon" not in entry:
+            entry["icon"] = entry["vm"].icon
+        return entry["icon"]
+
+    @staticmethod
+    def is_internal(entry: dict[str, Any]) -> bool:
+        """Check if a catalogue entry is an internal qube."""
+        if "internal" not in entry:
+            entry["internal"] = get_boolean_feature(entry["vm"], "internal")
+        return entry["internal"]
+
+    def get_entry(self, vm_name: str) -> dict[str, Any] | None:
+        """Get data of a single qube, or None if there is no such qube."""
+        if vm_name not in self.qapp.domains:
+            return None
+        domain = self.qapp.domains[vm_name]
+        entry = self._entries.get(vm_name)
+        if entry is None or entry["vm"] is not domain:
+            entry = self._fetch_entry(domain)
+            self._entries[vm_name] = entry
+        return entry
+
+    def get_entries(self) -> list[dict[str, Any]]:
+        """Get data of all qubes. Qubes that were not seen before (or were
+        replaced by a new object) are queried, others come from cache."""
+        entries = []
+        for domain in self.qapp.domains:
+            entry = self._entries.get(domain.name)
+            if entry is None or entry["vm"] is not domain:
+                entry = self._fetch_entry(domain)
+                self._entries[domain.name] = entry
+            entries.append(entry)
+        return entries
+
+
 class VMListModeler(TraitSelector):
     """
     Modeler for Gtk.ComboBox contain a list of qubes VMs.
@@ -272,9 +353,11 @@ class VMListModeler(TraitSelector):
 
         self._entries: dict[str, dict[str, Any]] = {}
 
-        self._icons: dict[str, Gtk.Image] = {}
         self._icon_size = 20
 
+        self.catalogue: Optional[VMCatalogue] = VMCatalogue.acquire(qapp)
+        self.combo.connect("destroy", self._release_catalogue)
+
         self._create_entries(
             filter_function, default_value, additional_options, current_value
         )
@@ -323,10 +406,13 @@ class VMListModeler(TraitSelector):
         self.combo.set_active_id(self._initial_id)
 
     def _get_icon(self, name):
-        if name not in self._icons:
-            icon = load_icon(name, self._icon_size, self._icon_size)
-            self._icons[name] = icon
-        return self._icons[name]
+        # icons are cached process-wide by load_icon
+        return load_icon(name, self._icon_size, self._icon_size)
+
+    def _release_catalogue(self, *_args):
+        if self.catalogue:
+            self.catalogue.release()
+            self.catalogue = None
 
     def _create_entries(
         self,
@@ -346,25 +432,32 @@ class VMListModeler(TraitSelector):
                     "vm": None,
                 }
 
+        catalogue = self.catalogue
+        if catalogue is None:
+            # the combobox was already destroyed
+            return
+
         found_current = False
-        if current_value and current_value in self.qapp.domains:
+        current_entry = (
+            catalogue.get_entry(str(current_value)) if current_value else None
+        )
+        if current_entry:
             found_current = True
-            domain = self.qapp.domains[current_value]
-            icon = self._get_icon(domain.icon)
-            vm_name = domain.name
+            vm_name = current_entry["name"]
             self._entries[vm_name] = {
                 "api_name": vm_name,
-                "icon": icon,
-                "vm": domain,
+                "icon": self._get_icon(catalogue.get_icon(current_entry)),
+                "vm": current_entry["vm"],
             }
 
-        for domain in self.qapp.domains:
+        for vm_entry in catalogue.get_entries():
+            domain = vm_entry["vm"]
             if filter_function and not filter_function(domain):
                 continue
-            if not self.show_internal and get_boolean_feature(domain, "internal"):
+            if not self.show_internal and catalogue.is_internal(vm_entry):
                 continue
-            vm_name = domain.name
-            icon = self._get_icon(domain.icon)
+            vm_name = vm_entry["name"]
+            icon = self._get_icon(catalogue.get_icon(vm_entry))
             display_name = vm_name
 
             if domain == default_value:
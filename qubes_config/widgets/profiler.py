@@ -0,0 +1,374 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+"""
+Opt-in tracing of qubesd calls, GLib idle/timeout callbacks and qubesadmin
+event handlers, for finding out why a GUI tool is slow.
+
+Enabled with the --profile[=FILE] command line option of any of the GUI
+tools, or with the QUBES_GUI_PROFILE=FILE environment variable (use "1" for
+the default file name). On exit (including SIGTERM, which is how the tray
+widgets are stopped), and whenever SIGUSR1 is received, the time spent so far
+is written to FILE in the folded stacks format used by flamegraph.pl and
+speedscope, and a summary of the most expensive calls is printed to stderr.
+"""
+
+import atexit
+import functools
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import qubesadmin.app
+import qubesadmin.events
+
+ENV_VARIABLE = "QUBES_GUI_PROFILE"
+PROFILE_OPTION = "--profile"
+TOP_N = 20
+MAX_STACK_DEPTH = 64
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def function_name(func) -> str:
+    func = getattr(func, "__func__", func)
+    qualname = getattr(func, "__qualname__", None)
+    if qualname is None:
+        return repr(func)
+    return f"{getattr(func, '__module__', '?')}.{qualname}"
+
+
+class Profiler:
+    """Records time spent in qubesd calls and callbacks, together with the
+    Python stack they were called from."""
+
+    def __init__(self, output_path: str, top: int = TOP_N):
+        self.output_path = output_path
+        self.top = top
+        self.lock = threading.Lock()
+        # folded stack -> self time in microseconds
+        self.stacks: Dict[str, float] = {}
+        # (method, destination, argument, latency, caller)
+        self.qubesd_calls: List[Tuple[str, str, str, float, str]] = []
+        # kind, callback name -> [count, total time, max time]
+        self.callbacks: Dict[Tuple[str, str], List[float]] = {}
+        self.local = threading.local()
+        self._originals: List[Tuple[object, str, Callable]] = []
+        self._signal_handlers: Dict[int, Any] = {}
+
+    @staticmethod
+    def get_stack() -> List[FrameType]:
+        """Current Python stack, outermost frame first, without frames of
+        this module."""
+        frames: List[FrameType] = []
+        # pylint: disable=protected-access
+        frame: Optional[FrameType] = sys._getframe(1)
+        while frame and len(frames) < MAX_STACK_DEPTH:
+            if frame.f_globals.get("__name__") != __name__:
+                frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+        return frames
+
+    def span(self, leaf: str, func: Callable, *args, **kwargs):
+        """Call func, recording its self time (without time of nested spans)
+        under the current stack with leaf appended. Duration of the call is
+        available in self.local.last_duration afterwards."""
+        stack = ";".join(frame_name(frame) for frame in self.get_stack())
+        stack = f"{stack};{leaf}" if stack else leaf
+        spans = self.local.__dict__.setdefault("spans", [])
+        spans.append(0.0)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            nested = spans.pop()
+            if spans:
+                spans[-1] += duration
+            with self.lock:
+                self.stacks[stack] = (
+                    self.stacks.get(stack, 0) + (duration - nested) * 1e6
+                )
+            self.local.last_duration = duration
+
+    @staticmethod
+    def get_caller() -> str:
+        """First frame outside qubesadmin, as 'name (file:line)'."""
+        for frame in reversed(Profiler.get_stack()):
+            if not frame.f_globals.get("__name__", "").startswith("qubesadmin"):
+                return (
+                    f"{frame_name(frame)} "
+                    f"({os.path.basename(frame.f_code.co_filename)}:"
+                    f"{frame.f_lineno})"
+                )
+        return "?"
+
+    def trace_qubesd_call(self, original: Callable) -> Callable:
+        profiler = self
+
+        @functools.wraps(original)
+        def qubesd_call(app, dest, method, *args, **kwargs):
+            arg = args[0] if args else kwargs.get("arg")
+            caller = profiler.get_caller()
+            try:
+                return profiler.span(
+                    f"qubesd:{method}", original, app, dest, method, *args, **kwargs
+                )
+            finally:
+                with profiler.lock:
+                    profiler.qubesd_calls.append(
+                        (
+                            method,
+                            str(dest),
+                            str(arg),
+                            profiler.local.last_duration,
+                            caller,
+                        )
+                    )
+
+        return qubesd_call
+
+    def trace_callback(self, kind: str, callback: Callable) -> Callable:
+        profiler = self
+        name = function_name(callback)
+
+        @functools.wraps(callback)
+        def traced_callback(*args, **kwargs):
+            try:
+                return profiler.span(name, callback, *args, **kwargs)
+            finally:
+                duration = profiler.local.last_duration
+                with profiler.lock:
+                    stats = profiler.callbacks.setdefault((kind, name), [0, 0.0, 0.0])
+                    stats[0] += 1
+                    stats[1] += duration
+                    stats[2] = max(stats[2], duration)
+
+        return traced_callback
+
+    def _patch(self, owner, attribute: str, replacement: Callable):
+        self._originals.append((owner, attribute, getattr(owner, attribute)))
+        setattr(owner, attribute, replacement)
+
+    def install(self):
+        """Wrap qubesd call path, GLib callbacks and event handlers."""
+        for cls in (qubesadmin.app.QubesLocal, qubesadmin.app.QubesRemote):
+            if "qubesd_call" in cls.__dict__:
+                self._patch(cls, "qubesd_call", self.trace_qubesd_call(cls.qubesd_call))
+
+        self._install_dispatcher_hooks()
+        self._install_glib_hooks()
+        atexit.register(self.finish)
+        self._install_signal_handlers()
+
+    def _install_signal_handlers(self):
+        # atexit handlers do not run when the process is killed by a signal
+        for signum, handler in (
+            (signal.SIGTERM, self._handle_sigterm),
+            (signal.SIGUSR1, self._handle_sigusr1),
+        ):
+            try:
+                self._signal_handlers[signum] = signal.signal(signum, handler)
+            except ValueError:
+                # not in the main thread
+                pass
+
+    def _handle_sigusr1(self, _signum, _frame):
+        self.finish()
+
+    def _handle_sigterm(self, signum, frame):
+        self.uninstall()
+        self.finish()
+        # continue with whatever would have happened without the profiler
+        previous = signal.getsignal(signum)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            os.kill(os.getpid(), signum)
+
+    def _install_dispatcher_hooks(self):
+        profiler = self
+        add_handler = qubesadmin.events.EventsDispatcher.add_handler
+        remove_handler = qubesadmin.events.EventsDispatcher.remove_handler
+
+        def traced_add_handler(dispatcher, event, handler):
+            wrappers = dispatcher.__dict__.setdefault("_profiler_wrappers", {})
+            if (event, handler) not in wrappers:
+                wrappers[(event, handler)] = profiler.trace_callback(
+                    f"event {event}", handler
+                )
+            add_handler(dispatcher, event, wrappers[(event, handler)])
+
+        def traced_remove_handler(dispatcher, event, handler):
+            wrappers = dispatcher.__dict__.get("_profiler_wrappers", {})
+            remove_handler(dispatcher, event, wrappers.pop((event, handler), handler))
+
+        self._patch(
+            qubesadmin.events.EventsDispatcher, "add_handler", traced_add_handler
+        )
+        self._patch(
+            qubesadmin.events.EventsDispatcher, "remove_handler", traced_remove_handler
+        )
+
+    def _install_glib_hooks(self):
+        # pylint: disable=import-outside-toplevel
+        from gi.repository import GLib
+
+        def wrap_scheduler(kind: str, scheduler: Callable, callback_index: int):
+            @functools.wraps(scheduler)
+            def traced_scheduler(*args, **kwargs):
+                new_args = list(args)
+                if len(new_args) > callback_index and callable(
+                    new_args[callback_index]
+                ):
+                    new_args[callback_index] = self.trace_callback(
+                        kind, new_args[callback_index]
+                    )
+                return scheduler(*new_args, **kwargs)
+
+            return traced_scheduler
+
+        # the callback follows the (optional) priority and/or interval
+        for name, kind in (
+            ("idle_add", "idle"),
+            ("timeout_add", "timeout"),
+            ("timeout_add_seconds", "timeout"),
+        ):
+            scheduler = getattr(GLib, name)
+            index = 0 if name == "idle_add" else 1
+            self._patch(GLib, name, wrap_scheduler(kind, scheduler, index))
+
+    def uninstall(self):
+        atexit.unregister(self.finish)
+        while self._signal_handlers:
+            signum, handler = self._signal_handlers.popitem()
+            # None means the handler was not set from Python
+            signal.signal(signum, handler if handler is not None else signal.SIG_DFL)
+        while self._originals:
+            owner, attribute, original = self._originals.pop()
+            setattr(owner, attribute, original)
+
+    def write_trace(self):
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+        with open(self.output_path, "w", encoding="utf-8") as file:
+            for stack, microseconds in stacks:
+                file.write(f"{stack} {max(1, round(microseconds))}\n")
+
+    def get_summary(self) -> str:
+        """Human-readable summary of the most expensive calls."""
+        with self.lock:
+            calls = list(self.qubesd_calls)
+            callbacks = dict(self.callbacks)
+
+        lines = [
+            f"{len(calls)} qubesd calls, "
+            f"{sum(call[3] for call in calls) * 1000:.1f} ms in total",
+            "",
+            f"Top {self.top} qubesd call sites by total time:",
+            f"{'calls':>7} {'total ms':>10} {'max ms':>8}  method  caller",
+        ]
+        by_site: Dict[Tuple[str, str], List[float]] = {}
+        for method, _dest, _arg, duration, caller in calls:
+            stats = by_site.setdefault((method, caller), [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+        for (method, caller), (count, total, maximum) in sorted(
+            by_site.items(), key=lambda item: -item[1][1]
+        )[: self.top]:
+            lines.append(
+                f"{count:>7} {total * 1000:>10.1f} {maximum * 1000:>8.1f}  "
+                f"{method}  {caller}"
+            )
+
+        lines += ["", f"Top {self.top} slowest qubesd calls:"]
+        for method, dest, arg, duration, caller in sorted(
+            calls, key=lambda call: -call[3]
+        )[: self.top]:
+            lines.append(
+                f"{duration * 1000:>10.1f} ms  {method} {dest} {arg}  {caller}"
+            )
+
+        lines += [
+            "",
+            f"Top {self.top} callbacks and event handlers by total time:",
+            f"{'calls':>7} {'total ms':>10} {'max ms':>8}  kind  callback",
+        ]
+        for (kind, name), (count, total, maximum) in sorted(
+            callbacks.items(), key=lambda item: -item[1][1]
+        )[: self.top]:
+            lines.append(
+                f"{count:>7} {total * 1000:>10.1f} {maximum * 1000:>8.1f}  "
+                f"{kind}  {name}"
+            )
+        return "\n".join(lines)
+
+    def finish(self):
+        """Write the trace file and print the summary."""
+        try:
+            self.write_trace()
+        except OSError as ex:
+            print(
+                f"Failed to write profile to {self.output_path}: {ex}", file=sys.stderr
+            )
+        else:
+            print(f"Profile written to {self.output_path}", file=sys.stderr)
+        print(self.get_summary(), file=sys.stderr)
+
+
+def get_default_output_path() -> str:
+    program = os.path.basename(sys.argv[0]) if sys.argv else "qubes-gui"
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"{program}-{os.getpid()}.folded")
+
+
+def setup_profiling(argv: Optional[List[str]] = None) -> Optional[Profiler]:
+    """Enable profiling if requested with --profile[=FILE] option or the
+    QUBES_GUI_PROFILE environment variable. The option is removed from argv,
+    so that it does not confuse the program's own argument parsing."""
+    if argv is None:
+        argv = sys.argv
+    output_path = os.environ.get(ENV_VARIABLE) or None
+    if output_path == "1":
+        output_path = get_default_output_path()
+
+    for arg in list(argv[1:]):
+        if arg == PROFILE_OPTION:
+            output_path = output_path or get_default_output_path()
+            argv.remove(arg)
+        elif arg.startswith(PROFILE_OPTION + "="):
+            output_path = arg.split("=", 1)[1]
+            argv.remove(arg)
+
+    if not output_path:
+        return None
+    profiler = Profiler(output_path)
+    profiler.install()
+    return profiler
@@ -19,6 +19,7 @@
 # with this program; if not, see <http://www.gnu.org/licenses/>.
 """Qubes helper functions"""
 
+import concurrent.futures
 import subprocess
 import threading
 import qubesadmin
@@ -26,13 +27,16 @@ import qubesadmin.exc
 import qubesadmin.vm
 from qrexec.policy.parser import Rule
 
-from typing import Optional, Any, Dict, List
+from typing import Optional, Any, Callable, Dict, Iterable, List
 
 import gettext
 
 t = gettext.translation("desktop-linux-manager", fallback=True)
 _ = t.gettext
 
+# number of qubesd calls made at once by FeatureBatch
+FEATURE_BATCH_WORKERS = 8
+
 
 def get_feature(vm, feature_name, default_value=None):
     """Get feature, with a working default_value."""
@@ -83,6 +87,123 @@ def apply_feature_change(
         )
 
 
+class FeatureBatch:
+    """
+    Read and change a single feature in many qubes at once. Current values
+    of all qubes are read in one pass, only the qubes whose value differs
+    from the desired one are written, and both reads and writes are done
+    concurrently, with at most max_workers qubesd calls at a time.
+    Errors are collected per qube (in `errors`) instead of stopping at the
+    first failing qube; call raise_errors() after all changes are applied.
+    """
+
+    def __init__(
+        self,
+        feature_name: str,
+        apply_func: Optional[Callable] = None,
+        max_workers: int = FEATURE_BATCH_WORKERS,
+    ):
+        """
+        :param feature_name: name of the feature
+        :param apply_func: function used to change the feature, with the
+        same signature as apply_feature_change (which is the default)
+        :param max_workers: maximum number of concurrent qubesd calls
+        """
+        self.feature_name = feature_name
+        self.apply_func = apply_func if apply_func else apply_feature_change
+        self.max_workers = max_workers
+        self.errors: Dict[qubesadmin.vm.QubesVM, str] = {}
+
+    def _map(self, func: Callable, vms: List[qubesadmin.vm.QubesVM]) -> List:
+        """Call func for every qube, concurrently; returns list of
+        (qube, result) for qubes that did not fail."""
+        results = []
+
+        def _call(vm):
+            try:
+                return vm, func(vm), None
+            except qubesadmin.exc.QubesException as ex:
+                return vm, None, str(ex)
+
+        if len(vms) <= 1:
+            outcomes = [_call(vm) for vm in vms]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers
+            ) as executor:
+                outcomes = list(executor.map(_call, vms))
+
+        for vm, result, error in outcomes:
+            if error is not None:
+                self.errors[vm] = error
+            else:
+                results.append((vm, result))
+        return results
+
+    def get(
+        self, vms: Iterable[qubesadmin.vm.QubesVM]
+    ) -> Dict[qubesadmin.vm.QubesVM, Optional[str]]:
+        """Get current values of the feature; None means the feature is not
+        set. Qubes whose value could not be read are omitted."""
+        return dict(
+            self._map(lambda vm: get_feature(vm, self.feature_name, None), list(vms))
+        )
+
+    def get_boolean(
+        self, vms: Iterable[qubesadmin.vm.QubesVM], default: bool = False
+    ) -> Dict[qubesadmin.vm.QubesVM, bool]:
+        """Like get, but with values converted to bool as get_boolean_feature
+        does."""
+        return {
+            vm: default if value is None else bool(value)
+            for vm, value in self.get(vms).items()
+        }
+
+    @staticmethod
+    def is_equal(current: Optional[str], desired: Optional[Any]) -> bool:
+        """Does the current (string) value of a feature match the desired
+        one, as it would be set by apply_feature_change?"""
+        if desired is None or current is None:
+            return desired is None and current is None
+        if isinstance(desired, bool):
+            return bool(current) == desired
+        return current == str(desired)
+
+    def get_changes(
+        self, desired: Dict[qubesadmin.vm.QubesVM, Optional[Any]]
+    ) -> Dict[qubesadmin.vm.QubesVM, Optional[Any]]:
+        """Read current values and return only those desired values that
+        need to be written."""
+        current = self.get(desired.keys())
+        return {
+            vm: value
+            for vm, value in desired.items()
+            if vm in current and not self.is_equal(current[vm], value)
+        }
+
+    def apply(self, changes: Dict[qubesadmin.vm.QubesVM, Optional[Any]]):
+        """Write provided values (None removes the feature)."""
+        self._map(
+            lambda vm: self.apply_func(vm, self.feature_name, changes[vm]),
+            list(changes),
+        )
+
+    def update(self, desired: Dict[qubesadmin.vm.QubesVM, Optional[Any]]):
+        """Write values that differ from the current ones."""
+        self.apply(self.get_changes(desired))
+
+    def raise_errors(self):
+        """Raise a QubesException listing all failed qubes, if any."""
+        if not self.errors:
+            return
+        raise qubesadmin.exc.QubesException(
+            _("Failed to change {feature_name} in the following qubes:\n").format(
+                feature_name=self.feature_name
+            )
+            + "\n".join(f"{vm}: {error}" for vm, error in self.errors.items())
+        )
+
+
 class BiDictionary(dict):
     """Helper bi-directional dictionary. By design, duplicate values
     cause errors."""
@@ -62,7 +62,9 @@ import gettext
 t = gettext.translation("desktop-linux-manager", fallback=True)
 _ = t.gettext
 
+from .event_hub import HubEventsDispatcher
 from .utils import run_asyncio_and_show_errors
+from qubes_config.widgets.profiler import setup_profiling
 
 DATA = "/var/run/qubes/qubes-clipboard.bin"
 METADATA = "/var/run/qubes/qubes-clipboard.bin.metadata"
@@ -525,11 +527,12 @@ class NotificationApp(Gtk.Application):
 
 
 def main():
+    setup_profiling()
     loop = asyncio.get_event_loop()
     wm = pyinotify.WatchManager()
 
     qubes_app = qubesadmin.Qubes()
-    dispatcher = qubesadmin.events.EventsDispatcher(qubes_app)
+    dispatcher = HubEventsDispatcher(qubes_app)
 
     gtk_app = NotificationApp(wm, qubes_app, dispatcher)
 
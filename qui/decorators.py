@@ -8,10 +8,12 @@ containing helpful representation methods.
 import gi  # isort:skip
 
 gi.require_version("Gtk", "3.0")  # isort:skip
-from gi.repository import Gtk, Pango, GLib, GdkPixbuf  # isort:skip
+from gi.repository import Gtk, Pango  # isort:skip
 from qubesadmin import exc
 from qubesadmin.utils import size_to_human
 
+from qubes_config.widgets.gtk_utils import load_icon
+
 import gettext
 
 t = gettext.translation("desktop-linux-manager", fallback=True)
@@ -38,14 +40,17 @@ class PropertiesDecorator:
 class DomainDecorator(PropertiesDecorator):
     """Useful methods for domain data representation"""
 
-    def __init__(self, vm, margins=(5, 5)) -> None:
+    def __init__(self, vm, margins=(5, 5), property_cache=None) -> None:
         super().__init__(vm, margins)
         self.vm = vm
+        self.property_cache = property_cache
 
     class VMName(Gtk.Box):
-        def __init__(self, vm):
+        def __init__(self, vm, property_cache=None):
             super(DomainDecorator.VMName, self).__init__()
             self.vm = vm
+            # optional qui.utils.VMPropertyCache
+            self.property_cache = property_cache
 
             self.template_name = None
             self.netvm_name = None
@@ -114,6 +119,42 @@ class DomainDecorator(PropertiesDecorator):
             self.updates_available = updates_state
             self.update_tooltip()
 
+        def _fetch_tooltip_data(self, netvm_changed=False, storage_changed=False):
+            if self.property_cache:
+                # the snapshot is kept up to date by events, reading it is cheap
+                template = self.property_cache.get_property(self.vm, "template")
+                netvm = self.property_cache.get_property(self.vm, "netvm")
+                cur_storage, max_storage = self.property_cache.get_storage(self.vm)
+                self.template_name = template or _("None")
+                self.netvm_name = netvm or _("None")
+                self.cur_storage = cur_storage / 1024**3
+                self.max_storage = max_storage / 1024**3
+                return
+
+            if not self.template_name:
+                self.template_name = getattr(self.vm, "template", None)
+                self.template_name = (
+                    _("None") if not self.template_name else str(self.template_name)
+                )
+
+            if not self.netvm_name or netvm_changed:
+                self.netvm_name = getattr(self.vm, "netvm", _("permission denied"))
+                self.netvm_name = (
+                    _("None") if not self.netvm_name else str(self.netvm_name)
+                )
+
+            if not self.cur_storage or storage_changed:
+                try:
+                    self.cur_storage = self.vm.get_disk_utilization() / 1024**3
+                except (exc.QubesDaemonNoResponseError, KeyError):
+                    self.cur_storage = 0
+
+            if not self.max_storage or storage_changed:
+                try:
+                    self.max_storage = self.vm.volumes["private"].size / 1024**3
+                except (exc.QubesDaemonNoResponseError, KeyError):
+                    self.max_storage = 0
+
         def update_tooltip(self, netvm_changed=False, storage_changed=False):
 
             if self.vm is None:
@@ -126,29 +167,7 @@ class DomainDecorator(PropertiesDecorator):
                 tooltip += _("\nAdministrative domain")
 
             else:
-                if not self.template_name:
-                    self.template_name = getattr(self.vm, "template", None)
-                    self.template_name = (
-                        _("None") if not self.template_name else str(self.template_name)
-                    )
-
-                if not self.netvm_name or netvm_changed:
-                    self.netvm_name = getattr(self.vm, "netvm", _("permission denied"))
-                    self.netvm_name = (
-                        _("None") if not self.netvm_name else str(self.netvm_name)
-                    )
-
-                if not self.cur_storage or storage_changed:
-                    try:
-                        self.cur_storage = self.vm.get_disk_utilization() / 1024**3
-                    except (exc.QubesDaemonNoResponseError, KeyError):
-                        self.cur_storage = 0
-
-                if not self.max_storage or storage_changed:
-                    try:
-                        self.max_storage = self.vm.volumes["private"].size / 1024**3
-                    except (exc.QubesDaemonNoResponseError, KeyError):
-                        self.max_storage = 0
+                self._fetch_tooltip_data(netvm_changed, storage_changed)
 
                 if self.max_storage == 0:
                     perc_storage = 0
@@ -177,7 +196,7 @@ class DomainDecorator(PropertiesDecorator):
             self.label.set_tooltip_markup(tooltip)
 
     def name(self):
-        namebox = DomainDecorator.VMName(self.vm)
+        namebox = DomainDecorator.VMName(self.vm, self.property_cache)
         return namebox
 
     class VMCPU(Gtk.Box):
@@ -188,6 +207,17 @@ class DomainDecorator(PropertiesDecorator):
             self.cpu_label.set_width_chars(6)
             self.pack_start(self.cpu_label, True, True, 0)
 
+            self.markup = None
+            # markup for 0% depends on the theme, so it's computed lazily
+            self.zero_markup = None
+            self.cpu_label.connect("style-updated", self._style_updated)
+
+        def _style_updated(self, *_args):
+            self.zero_markup = None
+            if self.markup and self.markup.startswith("<span"):
+                self.markup = None
+                self.update_state(0)
+
         def update_state(self, cpu=0, header=False):
             if header:
                 markup = _("<b>CPU</b>")
@@ -195,13 +225,19 @@ class DomainDecorator(PropertiesDecorator):
                 # pylint: disable=consider-using-f-string
                 markup = "{:3d}%".format(cpu)
             else:
-                color = (
-                    self.cpu_label.get_style_context()
-                    .get_color(Gtk.StateFlags.INSENSITIVE)
-                    .to_color()
-                )
-                markup = f'<span color="{color.to_string()}">0%</span>'
+                if not self.zero_markup:
+                    color = (
+                        self.cpu_label.get_style_context()
+                        .get_color(Gtk.StateFlags.INSENSITIVE)
+                        .to_color()
+                    )
+                    self.zero_markup = f'<span color="{color.to_string()}">0%</span>'
+                markup = self.zero_markup
 
+            if markup == self.markup:
+                # avoid needless relayout
+                return
+            self.markup = markup
             self.cpu_label.set_markup(markup)
 
     class VMMem(Gtk.Box):
@@ -210,12 +246,18 @@ class DomainDecorator(PropertiesDecorator):
             self.mem_label = Gtk.Label(xalign=1)
             self.pack_start(self.mem_label, True, True, 0)
 
+            self.markup = None
+
         def update_state(self, memory=0, header=False):
             if header:
                 markup = _("<b>RAM</b>")
             else:
                 markup = f"{str(int(memory/1024))} MiB"
 
+            if markup == self.markup:
+                # avoid needless relayout
+                return
+            self.markup = markup
             self.mem_label.set_markup(markup)
 
     def memory(self):
@@ -241,10 +283,7 @@ class DomainDecorator(PropertiesDecorator):
         except exc.QubesDaemonCommunicationError:
             # no permission to access icon
             icon = "appvm-black"
-        icon_vm = Gtk.IconTheme.get_default().load_icon(
-            icon, 16, Gtk.IconLookupFlags.FORCE_SIZE
-        )
-        icon_img = Gtk.Image.new_from_pixbuf(icon_vm)
+        icon_img = Gtk.Image.new_from_pixbuf(load_icon(icon, 16, 16))
         return icon_img
 
     def netvm(self) -> Gtk.Label:
@@ -317,19 +356,4 @@ def create_icon(name) -> Gtk.Image:
     """Create an icon from string; tries for both the normal and -symbolic
     variants, because some themes only have the symbolic variant. If not
     found, outputs a blank icon."""
-
-    names = [name, f"{name}-symbolic"]
-    pixbuf = None
-    for icon_name in names:
-        try:
-            pixbuf = Gtk.IconTheme.get_default().load_icon(
-                icon_name, 16, Gtk.IconLookupFlags.FORCE_SIZE
-            )
-            break
-        except (TypeError, GLib.Error):
-            continue
-    if not pixbuf:
-        pixbuf = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, 16, 16)
-        pixbuf.fill(0x000)
-
-    return Gtk.Image.new_from_pixbuf(pixbuf)
+    return Gtk.Image.new_from_pixbuf(load_icon(name, 16, 16))
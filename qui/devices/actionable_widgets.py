@@ -38,6 +38,8 @@ import gi
 gi.require_version("Gtk", "3.0")  # isort:skip
 from gi.repository import Gtk, GdkPixbuf, GLib  # isort:skip
 
+from qubes_config.widgets.gtk_utils import ICON_CACHE
+
 from . import backend
 import time
 
@@ -46,12 +48,20 @@ def load_icon(icon_name: str, backup_name: str, size: int = 24):
     """Load icon from provided name/path, if available. If not, load backup
     icon. If icon not found in any of the above ways, load a blank icon of
     specified size.
-    Returns GdkPixbuf.Pixbuf.
+    Returns GdkPixbuf.Pixbuf; it is cached in the process-wide ICON_CACHE
+    and must not be modified.
     Size must be in pixels.
 
     To enable local testing, there is a fallback that tries to load icons from
     local directory.
     """
+    return ICON_CACHE.get(
+        (icon_name, size, size, backup_name),
+        lambda: _load_icon(icon_name, backup_name, size),
+    )
+
+
+def _load_icon(icon_name: str, backup_name: str, size: int):
     try:
         image: GdkPixbuf.Pixbuf = Gtk.IconTheme.get_default().load_icon(
             icon_name, size, Gtk.IconLookupFlags.FORCE_SIZE
@@ -419,3 +419,164 @@ class Device:
                 if deny_interface.matches(interface):
                     return False
         return True
+
+
+class DeviceRegistry:
+    """
+    Collection of devices currently available in the system. Behaves like
+    a read-only dict of full device id -> Device, with additional indexes:
+    by port, by parent port, by backend domain and by frontend domain
+    (the domain a device is attached to). Attachments must be modified
+    through the registry, so that the frontend index stays correct.
+    Assignments are kept also for devices not currently present, so that
+    they can be applied as soon as the device shows up.
+    """
+
+    def __init__(self):
+        self._devices: Dict[str, Device] = {}
+        # port -> device id -> device; ports contain the backend domain name,
+        # but to be sure it's also checked in get_by_port
+        self._by_port: Dict[str, Dict[str, Device]] = {}
+        self._by_parent: Dict[str, Dict[str, Device]] = {}
+        self._by_backend: Dict[str, Dict[str, Device]] = {}
+        self._by_frontend: Dict[str, Dict[str, Device]] = {}
+        # device id -> VMs that have the device assigned
+        self._assignments: Dict[str, Set[VM]] = {}
+
+    def __contains__(self, dev_id) -> bool:
+        return dev_id in self._devices
+
+    def __getitem__(self, dev_id: str) -> Device:
+        return self._devices[dev_id]
+
+    def __iter__(self):
+        return iter(self._devices)
+
+    def __len__(self):
+        return len(self._devices)
+
+    def get(self, dev_id: str, default=None) -> Optional[Device]:
+        return self._devices.get(dev_id, default)
+
+    def keys(self):
+        return self._devices.keys()
+
+    def values(self):
+        return self._devices.values()
+
+    def items(self):
+        return self._devices.items()
+
+    @staticmethod
+    def _index_add(index: Dict[str, Dict[str, Device]], key: str, device: Device):
+        index.setdefault(key, {})[device.id_string] = device
+
+    @staticmethod
+    def _index_remove(index: Dict[str, Dict[str, Device]], key: str, device: Device):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket.pop(device.id_string, None)
+        if not bucket:
+            del index[key]
+
+    def add(self, device: Device) -> Device:
+        """Add a device (replacing any device with the same id) and apply
+        already known assignments to it."""
+        if device.id_string in self._devices:
+            self.remove(device.id_string)
+        self._devices[device.id_string] = device
+        self._index_add(self._by_port, device.port, device)
+        if device.parent:
+            self._index_add(self._by_parent, device.parent, device)
+        self._index_add(self._by_backend, str(device.backend_domain), device)
+        for vm in device.attachments:
+            self._index_add(self._by_frontend, str(vm), device)
+        device.assignments.update(self._assignments.get(device.id_string, set()))
+        return device
+
+    def remove(self, dev_id: str) -> Optional[Device]:
+        device = self._devices.pop(dev_id, None)
+        if device is None:
+            return None
+        self._index_remove(self._by_port, device.port, device)
+        if device.parent:
+            self._index_remove(self._by_parent, device.parent, device)
+        self._index_remove(self._by_backend, str(device.backend_domain), device)
+        for vm in device.attachments:
+            self._index_remove(self._by_frontend, str(vm), device)
+        return device
+
+    def find_by_port(self, port: str) -> List[Device]:
+        """All devices connected to the provided port."""
+        return list(self._by_port.get(str(port), {}).values())
+
+    def get_by_port(
+        self, port: str, backend_name: Optional[str] = None
+    ) -> Optional[Device]:
+        """First device connected to the provided port (of the provided
+        backend domain, if any)."""
+        for device in self._by_port.get(str(port), {}).values():
+            if backend_name is None or str(device.backend_domain) == backend_name:
+                return device
+        return None
+
+    def children(self, parent_port: str) -> List[Device]:
+        """Devices whose parent is connected to the provided port."""
+        return list(self._by_parent.get(str(parent_port), {}).values())
+
+    def exposed_by(self, vm_name: str) -> List[Device]:
+        """Devices exposed by the provided backend domain."""
+        return list(self._by_backend.get(str(vm_name), {}).values())
+
+    def attached_to(self, vm_name: str) -> List[Device]:
+        """Devices attached to the provided frontend domain."""
+        return list(self._by_frontend.get(str(vm_name), {}).values())
+
+    def add_attachment(self, dev_id: str, vm: VM):
+        device = self._devices.get(dev_id)
+        if device is None:
+            return
+        device.attachments.add(vm)
+        self._index_add(self._by_frontend, str(vm), device)
+
+    def remove_attachment(self, dev_id: str, vm: VM):
+        device = self._devices.get(dev_id)
+        if device is None:
+            return
+        device.attachments.discard(vm)
+        self._index_remove(self._by_frontend, str(vm), device)
+
+    def remove_frontend(self, vm: VM):
+        """Mark the provided domain as no longer having anything attached."""
+        for device in self._by_frontend.pop(str(vm), {}).values():
+            device.attachments.discard(vm)
+
+    def add_assignment(self, dev_id: str, vm: VM):
+        self._assignments.setdefault(dev_id, set()).add(vm)
+        if dev_id in self._devices:
+            self._devices[dev_id].assignments.add(vm)
+
+    def remove_assignment(self, dev_id: str, vm: VM) -> bool:
+        """Returns False if the assignment was not known."""
+        assigned = self._assignments.get(dev_id, set())
+        known = vm in assigned
+        assigned.discard(vm)
+        if not assigned:
+            self._assignments.pop(dev_id, None)
+        if dev_id in self._devices:
+            self._devices[dev_id].assignments.discard(vm)
+        return known
+
+    def remove_domain(self, vm_name: str):
+        """Forget all assignments and attachments of a removed domain."""
+        for dev_id in list(self._assignments):
+            self.remove_assignment(dev_id, vm_name)
+        self.remove_frontend(vm_name)
+
+    def assigned_domains(self, dev_ids) -> Set[VM]:
+        """Domains that have any of the provided devices assigned."""
+        result: Set[VM] = set()
+        for dev_id in dev_ids:
+            result.update(self._assignments.get(dev_id, set()))
+        return result
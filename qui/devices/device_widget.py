@@ -25,6 +25,7 @@ from ..tray.gtk3_xwayland_menu_dismisser import (
 
 from typing import Set, List, Dict, Optional
 import asyncio
+import functools
 import sys
 import time
 
@@ -37,6 +38,7 @@ import qubesadmin.tests
 import qubesadmin.tests.mock_app
 
 import qui
+import qui.event_hub
 import qui.utils
 
 import gi
@@ -57,6 +59,7 @@ from qui.devices import backend
 from qui.devices import actionable_widgets
 
 from qubes_config.widgets.gtk_utils import is_theme_light
+from qubes_config.widgets.profiler import setup_profiling
 
 import gettext
 
@@ -95,6 +98,42 @@ class DeviceMenu(Gtk.Menu):
         self.show_all()
 
 
+class DeviceMenuItem(Gtk.MenuItem):
+    """Menu item for a single device. Its submenu, with actions for every
+    qube, is only built when the item is first selected (and rebuilt after
+    being marked as outdated)."""
+
+    def __init__(self, tray):
+        super().__init__()
+        self.tray = tray
+        self.submenu_outdated = True
+        # until submenu is built, use an empty one, so that the item
+        # is already rendered as having a submenu
+        self.set_submenu(Gtk.Menu())
+        # monotonic time at which "NEW" label should disappear
+        self.new_until: Optional[float] = None
+
+    def do_select(self):  # pylint: disable=arguments-differ
+        try:
+            self._build_submenu()
+        finally:
+            Gtk.MenuItem.do_select(self)
+
+    def _build_submenu(self):
+        if not self.submenu_outdated:
+            return
+        self.submenu_outdated = False
+        device_menu = DeviceMenu(
+            self.get_child(), self.tray.sorted_vms, self.tray.sorted_dispvm_templates
+        )
+        device_menu.set_reserve_toggle_size(False)
+        old_menu = self.get_submenu()
+        self.set_submenu(device_menu)
+        # a detached menu is not freed until it's destroyed
+        if old_menu:
+            old_menu.destroy()
+
+
 class DevicesTray(Gtk.Application):
     """Tray application for handling devices."""
 
@@ -103,8 +142,9 @@ class DevicesTray(Gtk.Application):
         self.fullscreen_window_hack = get_fullscreen_window_hack()
         self.name: str = app_name
 
-        # maps: port to connected device (e.g., sys-usb:sda -> block device)
-        self.devices: Dict[str, backend.Device] = {}
+        # maps: full device id to connected device, with additional indexes
+        # by port, parent port, backend and frontend
+        self.devices: backend.DeviceRegistry = backend.DeviceRegistry()
         self.vms: Set[backend.VM] = set()
         self.dispvm_templates: Set[backend.VM] = set()
         self.parent_ports_to_hide = []
@@ -118,6 +158,23 @@ class DevicesTray(Gtk.Application):
         self.dispatcher: qubesadmin.events.EventsDispatcher = dispatcher
         self.qapp: qubesadmin.Qubes = qapp
 
+        # persistent tray menu, patched by device events and re-laid out
+        # only when needed
+        self.tray_menu = Gtk.Menu()
+        self.tray_menu.set_reserve_toggle_size(False)
+        self.fullscreen_window_hack.show_for_widget(self.tray_menu)
+        self.theme: Optional[str] = None
+        self.css_provider: Optional[Gtk.CssProvider] = None
+        # full device id -> menu item
+        self.menu_items: Dict[str, DeviceMenuItem] = {}
+        # device group -> header item, dormant USB qube -> item to start it
+        self.header_items: Dict[str, Gtk.MenuItem] = {}
+        self.usbvm_items: Dict[backend.VM, Gtk.MenuItem] = {}
+        self.outdated_menu_items: Set[str] = set()
+        self.menu_layout_outdated = True
+        self._sorted_vms: Optional[List[backend.VM]] = None
+        self._sorted_dispvm_templates: Optional[List[backend.VM]] = None
+
         self.set_application_id(self.name)
         self.register()  # register Gtk Application
 
@@ -202,6 +259,32 @@ class DevicesTray(Gtk.Application):
             "<b>Qubes Devices</b>\nView and manage devices."
         )
 
+    @property
+    def sorted_vms(self) -> List[backend.VM]:
+        if self._sorted_vms is None:
+            self._sorted_vms = sorted(self.vms)
+        return self._sorted_vms
+
+    @property
+    def sorted_dispvm_templates(self) -> List[backend.VM]:
+        if self._sorted_dispvm_templates is None:
+            self._sorted_dispvm_templates = sorted(self.dispvm_templates)
+        return self._sorted_dispvm_templates
+
+    def device_changed(self, dev_id: str):
+        """Mark menu item of the provided device as needing a rebuild."""
+        self.outdated_menu_items.add(dev_id)
+
+    def menu_changed(self):
+        """Mark the whole menu as outdated: list of qubes, features or device
+        visibility changed. Device items themselves are reused, only their
+        submenus are rebuilt."""
+        self._sorted_vms = None
+        self._sorted_dispvm_templates = None
+        self.menu_layout_outdated = True
+        for item in self.menu_items.values():
+            item.submenu_outdated = True
+
     def _update_queue(self, vm, device, device_class):
         """Handle certain operations that should not be done too often."""
         # update children
@@ -213,7 +296,10 @@ class DevicesTray(Gtk.Application):
             asyncio.create_task(self.update_assignments(device_class))
 
     async def update_assignments(self, dev_class):
-        """Scan vm list for new assignments"""
+        """Check for attachments of new devices. Assignments are already
+        known to the device registry, so only domains that have the new
+        devices assigned (and thus might have auto-attached them) are
+        queried; other attachments arrive with device-attach events."""
         await asyncio.sleep(0.3)
 
         if not self.dev_update_queue:
@@ -221,17 +307,14 @@ class DevicesTray(Gtk.Application):
         devs = self.dev_update_queue.copy()
         self.dev_update_queue.clear()
 
-        for domain in self.qapp.domains:
+        for wrapped_vm in self.devices.assigned_domains(devs):
             try:
+                domain = wrapped_vm.vm_object
                 for device in domain.devices[dev_class].get_attached_devices():
                     dev = backend.Device.id_from_device(device)
-                    if dev in devs and dev in self.devices:
-                        self.devices[dev].attachments.add(backend.VM(domain))
-
-                for device in domain.devices[dev_class].get_assigned_devices():
-                    dev = backend.Device.id_from_device(device)
-                    if dev in devs and dev in self.devices:
-                        self.devices[dev].assignments.add(backend.VM(domain))
+                    if dev in devs:
+                        self.devices.add_attachment(dev, wrapped_vm)
+                        self.device_changed(dev)
             except qubesadmin.exc.QubesException:
                 # we have no permission to access VM's devices
                 continue
@@ -274,17 +357,18 @@ class DevicesTray(Gtk.Application):
         dev_id = backend.Device.id_from_device(device)
         dev = backend.Device(device, self)
         dev.connection_timestamp = time.monotonic()
-        self.devices[dev_id] = dev
+        self.devices.add(dev)
+        self.device_changed(dev_id)
+        self.menu_layout_outdated = True
 
         if dev.parent:
-            for potential_parent in self.devices.values():
-                if potential_parent.port == dev.parent:
-                    # hide parents of webcams
-                    if dev.device_class == "webcam":
-                        self.cameras_to_hide.append(dev.parent)
-                        potential_parent.hide_this_device = True
-                    potential_parent.has_children = True
-                    break
+            parent = self.devices.get_by_port(dev.parent)
+            if parent:
+                # hide parents of webcams
+                if dev.device_class == "webcam":
+                    self.cameras_to_hide.append(dev.parent)
+                    parent.hide_this_device = True
+                parent.has_children = True
 
         # connect with mic
         mic_feature = vm.features.get(backend.FEATURE_ATTACH_WITH_MIC, "").split(" ")
@@ -303,15 +387,8 @@ class DevicesTray(Gtk.Application):
         self._update_queue(vm, dev_id, dev.device_class)
 
     def device_removed(self, vm, _event, port):
-        for potential_dev_id, potential_dev in self.devices.items():
-            if (
-                potential_dev.backend_domain.name != vm.name
-                or potential_dev.port != str(port)
-            ):
-                continue
-            dev, dev_id = potential_dev, potential_dev_id
-            break
-        else:
+        dev = self.devices.get_by_port(str(port), vm.name)
+        if dev is None:
             # we never knew the device anyway
             return
 
@@ -323,17 +400,18 @@ class DevicesTray(Gtk.Application):
             Gio.NotificationPriority.NORMAL,
             notification_id=dev.notification_id,
         )
-        if dev in microphone.devices_to_attach_with_me:
+        if microphone and dev in microphone.devices_to_attach_with_me:
             microphone.devices_to_attach_with_me.remove(dev)
         if dev.port in self.parent_ports_to_hide:
             self.parent_ports_to_hide.remove(dev.port)
         if dev.parent in self.cameras_to_hide:
-            for potential_parent in self.devices.values():
-                if potential_parent.port == dev.parent:
-                    potential_parent.hide_this_device = False
-                    break
+            parent = self.devices.get_by_port(dev.parent)
+            if parent:
+                parent.hide_this_device = False
             self.cameras_to_hide.remove(dev.parent)
-        del self.devices[dev_id]
+        self.devices.remove(dev.id_string)
+        self.device_changed(dev.id_string)
+        self.menu_layout_outdated = True
 
     def initialize_dev_data(self):
         self.dev_types = self.qapp.list_deviceclass()
@@ -346,8 +424,7 @@ class DevicesTray(Gtk.Application):
             for devclass in self.dev_types:
                 try:
                     for device in domain.devices[devclass]:
-                        dev_id = backend.Device.id_from_device(device)
-                        self.devices[dev_id] = backend.Device(device, self)
+                        self.devices.add(backend.Device(device, self))
                 except qubesadmin.exc.QubesException:
                     # we have no permission to access VM's devices
                     continue
@@ -355,9 +432,8 @@ class DevicesTray(Gtk.Application):
         # list children devices
         for device in self.devices.values():
             if device.parent:
-                for potential_parent in self.devices.values():
-                    if potential_parent.port == device.parent:
-                        potential_parent.has_children = True
+                for potential_parent in self.devices.find_by_port(device.parent):
+                    potential_parent.has_children = True
 
         # list existing device attachments and assignments
         for domain in self.qapp.domains:
@@ -365,16 +441,16 @@ class DevicesTray(Gtk.Application):
                 try:
                     for device in domain.devices[devclass].get_attached_devices():
                         dev = backend.Device.id_from_device(device)
-                        if dev in self.devices:
-                            # occassionally ghost UnknownDevices appear when a
-                            # device was removed but not detached from a VM
-                            # FUTURE: is this still true after api changes?
-                            self.devices[dev].attachments.add(backend.VM(domain))
+                        # occassionally ghost UnknownDevices appear when a
+                        # device was removed but not detached from a VM
+                        # FUTURE: is this still true after api changes?
+                        # (registry ignores attachments of unknown devices)
+                        self.devices.add_attachment(dev, backend.VM(domain))
 
                     for device in domain.devices[devclass].get_assigned_devices():
                         dev = backend.Device.id_from_device(device)
-                        if dev in self.devices:
-                            self.devices[dev].assignments.add(backend.VM(domain))
+                        # remembered also for devices not present now
+                        self.devices.add_assignment(dev, backend.VM(domain))
                 except qubesadmin.exc.QubesException:
                     # we have no permission to access VM's devices
                     continue
@@ -387,23 +463,19 @@ class DevicesTray(Gtk.Application):
 
     def device_assigned(self, vm, _event, device, **_kwargs):
         dev_id = backend.Device.id_from_device(device)
-        if dev_id not in self.devices:
-            return
-        self.devices[dev_id].assignments.add(backend.VM(vm))
+        self.devices.add_assignment(dev_id, backend.VM(vm))
+        self.device_changed(dev_id)
 
     def device_unassigned(self, vm, _event, device, **_kwargs):
         dev_id = backend.Device.id_from_device(device)
-        if dev_id not in self.devices:
-            return
-        try:
-            self.devices[dev_id].assignments.remove(backend.VM(vm))
-        except KeyError:
-            # it's ok, somehow we got an unassign for a device we didn't store as
-            # assigned. Cheers!
-            return
+        # it's ok if somehow we got an unassign for a device we didn't store as
+        # assigned. Cheers!
+        self.devices.remove_assignment(dev_id, backend.VM(vm))
+        self.device_changed(dev_id)
 
     def pci_action(self, vm, _event, **_kwargs):
         # We assume PCI controllers could be assigned only when qube is shutdown
+        self.menu_changed()
         wrapped_vm = backend.VM(vm)
         if wrapped_vm.is_usbvm:
             if wrapped_vm not in self.dormant_usbvms:
@@ -415,6 +487,7 @@ class DevicesTray(Gtk.Application):
         # In a perfect world, core should trigger `device-unassign:pci` event
         # for PCI devices attached to an HVM before actually removing it and
         # this code should not be necessary. But we are not certain :/
+        self.menu_changed()
         for wrapped_vm in self.dormant_usbvms:
             if wrapped_vm.name == vm:
                 self.dormant_usbvms.discard(wrapped_vm)
@@ -425,7 +498,10 @@ class DevicesTray(Gtk.Application):
                 self.dispvm_templates.discard(wrapped_vm)
                 break
 
+        self.devices.remove_domain(vm)
+
     def update_single_feature(self, _vm, _event, feature, value=None, oldvalue=None):
+        self.menu_changed()
         if not value:
             new = set()
         else:
@@ -479,11 +555,8 @@ class DevicesTray(Gtk.Application):
                     # the feature is malformed, ignore it
                     res_dict = {}
 
-        for device in self.devices.values():
-            if (
-                device.device_class == "webcam"
-                and device.backend_domain.name == vm.name
-            ):
+        for device in self.devices.exposed_by(vm.name):
+            if device.device_class == "webcam":
                 resolution = res_dict.get(device.id_string, None)
                 if resolution:
                     device.options["format"] = resolution
@@ -491,6 +564,7 @@ class DevicesTray(Gtk.Application):
                     del device.options["format"]
 
     def vm_unpaused(self, vm, _event, **_kwargs):
+        self.menu_changed()
         wrapped_vm = backend.VM(vm)
         try:
             attachable = wrapped_vm.is_attachable
@@ -505,6 +579,7 @@ class DevicesTray(Gtk.Application):
     ):  # pylint: disable=unused-argument
         if bool(value) == bool(oldvalue):
             return
+        self.menu_changed()
         wrapped_vm = backend.VM(vm)
         if not value:
             self.vms.discard(wrapped_vm)
@@ -525,6 +600,7 @@ class DevicesTray(Gtk.Application):
         Initialize all feature-related states
         :return:
         """
+        self.menu_changed()
         domains = self.qapp.domains
 
         microphone = self.devices.get("mic:dom0:mic:dom0:mic::m000000", None)
@@ -595,10 +671,9 @@ class DevicesTray(Gtk.Application):
             for port in self.parent_ports_to_hide:
                 self.hide_child_devices(port, state)
 
-        for device in self.devices.values():
-            if str(device.parent) == parent_port:
-                device.hide_this_device = not state
-                self.hide_child_devices(str(device.port), state)
+        for device in self.devices.children(parent_port):
+            device.hide_this_device = not state
+            self.hide_child_devices(str(device.port), state)
 
     def device_attached(self, vm, _event, device, **_kwargs):
         try:
@@ -610,11 +685,13 @@ class DevicesTray(Gtk.Application):
 
         dev_id = backend.Device.id_from_device(device)
         if dev_id not in self.devices:
-            self.devices[dev_id] = backend.Device(device, self)
+            self.devices.add(backend.Device(device, self))
+            self.menu_layout_outdated = True
 
         vm_wrapped = backend.VM(vm)
 
-        self.devices[dev_id].attachments.add(vm_wrapped)
+        self.devices.add_attachment(dev_id, vm_wrapped)
+        self.device_changed(dev_id)
 
     def device_detached(self, vm, _event, port, **_kwargs):
         try:
@@ -627,11 +704,12 @@ class DevicesTray(Gtk.Application):
         port = str(port)
         vm_wrapped = backend.VM(vm)
 
-        for device in self.devices.values():
-            if device.port == port:
-                device.attachments.discard(vm_wrapped)
+        for device in self.devices.find_by_port(port):
+            self.devices.remove_attachment(device.id_string, vm_wrapped)
+            self.device_changed(device.id_string)
 
     def vm_start(self, vm, _event, **_kwargs):
+        self.menu_changed()
         wrapped_vm = backend.VM(vm)
         try:
             internal = vm.features.get("internal", False)
@@ -648,13 +726,14 @@ class DevicesTray(Gtk.Application):
             try:
                 for device in vm.devices[devclass].get_attached_devices():
                     dev_id = backend.Device.id_from_device(device)
-                    if dev_id in self.devices:
-                        self.devices[dev_id].attachments.add(wrapped_vm)
+                    self.devices.add_attachment(dev_id, wrapped_vm)
+                    self.device_changed(dev_id)
             except qubesadmin.exc.QubesDaemonAccessError:
                 # we don't have access to devices
                 return
 
     def vm_shutdown(self, vm, _event, **_kwargs):
+        self.menu_changed()
         wrapped_vm = backend.VM(vm)
         if wrapped_vm in self.active_usbvms:
             self.active_usbvms.discard(wrapped_vm)
@@ -662,17 +741,15 @@ class DevicesTray(Gtk.Application):
 
         self.vms.discard(wrapped_vm)
 
-        devs_to_remove = []
-        for dev in self.devices.values():
-            if dev.backend_domain == wrapped_vm:
-                devs_to_remove.append(dev.port)
-                continue
-            dev.attachments.discard(wrapped_vm)
-        for dev_port in devs_to_remove:
-            self.device_removed(vm, None, port=dev_port)
+        for dev in self.devices.attached_to(wrapped_vm.name):
+            self.device_changed(dev.id_string)
+        self.devices.remove_frontend(wrapped_vm)
+        for dev in self.devices.exposed_by(wrapped_vm.name):
+            self.device_removed(vm, None, port=dev.port)
 
     def vm_dispvm_template_change(self, vm, _event, **_kwargs):
         """Is template for dispvms property changed"""
+        self.menu_changed()
         wrapped_vm = backend.VM(vm)
         try:
             internal = vm.features.get("internal")
@@ -686,41 +763,96 @@ class DevicesTray(Gtk.Application):
 
     def vm_denied_changed(self, vm, _event, **_kwargs):
         """devices_denied property changed"""
+        self.menu_changed()
         for wrapped_vm in self.vms:
             if wrapped_vm.name == vm.name:
                 wrapped_vm.update_denied_devices()
                 return
 
-    @staticmethod
-    def load_css(widget) -> str:
+    def load_css(self, widget) -> str:
         """Load appropriate css. This should be called whenever menu is shown,
-        because it needs a realized widget.
+        because it needs a realized widget; css is only (re)loaded if the
+        light/dark variant changed since the last call.
         Returns light/dark variant used currently as 'light' or 'dark' string.
         """
         theme = "light" if is_theme_light(widget) else "dark"
+        if theme == self.theme:
+            return theme
+
         screen = Gdk.Screen.get_default()
         provider = Gtk.CssProvider()
         css_file_ref = importlib.resources.files("qui") / f"qubes-devices-{theme}.css"
         with importlib.resources.as_file(css_file_ref) as css_file:
             provider.load_from_path(str(css_file))
 
+        if self.css_provider:
+            Gtk.StyleContext.remove_provider_for_screen(screen, self.css_provider)
         Gtk.StyleContext.add_provider_for_screen(
             screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
         )
+        self.css_provider = provider
+        self.theme = theme
+
+        # icons in existing items are for the other variant
+        for items in (self.menu_items, self.header_items, self.usbvm_items):
+            for item in items.values():
+                self._destroy_item(item)
+            items.clear()
+        self.menu_layout_outdated = True
 
         return theme
 
-    def show_menu(self, _unused, _event):
-        """Show menu at mouse pointer."""
-        tray_menu = Gtk.Menu()
-        self.fullscreen_window_hack.show_for_widget(tray_menu)
-        theme = self.load_css(tray_menu)
-        tray_menu.set_reserve_toggle_size(False)
+    @staticmethod
+    def _destroy_item(item: Gtk.MenuItem):
+        """Destroy a menu item that is not going to be used anymore, together
+        with its submenu; just removing it from the menu would leak both."""
+        submenu = item.get_submenu()
+        if submenu:
+            submenu.destroy()
+        item.destroy()
+
+    def _create_device_item(self, dev: backend.Device, theme: str) -> DeviceMenuItem:
+        device_widget = actionable_widgets.MainDeviceWidget(dev, theme)
+        device_item = actionable_widgets.generate_wrapper_widget(
+            functools.partial(DeviceMenuItem, self), "activate", device_widget
+        )
+        device_item.set_reserve_indicator(False)
+        if dev.connection_timestamp:
+            # keep in sync with "NEW" label in MainDeviceWidget
+            device_item.new_until = dev.connection_timestamp + 120
+        return device_item
+
+    def update_menu(self, theme: str):
+        """Bring the persistent menu up to date: rebuild items of changed
+        devices and, if devices were added, removed or hidden, lay the menu
+        out again. Unchanged items (and their submenus) are reused."""
+        now = time.monotonic()
+        for dev_id, item in self.menu_items.items():
+            if item.new_until and now >= item.new_until:
+                # the "NEW" label has expired
+                self.outdated_menu_items.add(dev_id)
+
+        for dev_id in self.outdated_menu_items:
+            item = self.menu_items.pop(dev_id, None)
+            if item:
+                self._destroy_item(item)
+                self.menu_layout_outdated = True
+        self.outdated_menu_items.clear()
+
+        if not self.menu_layout_outdated:
+            return
+        self.menu_layout_outdated = False
+
+        for dev_id in [
+            dev_id for dev_id in self.menu_items if dev_id not in self.devices
+        ]:
+            self._destroy_item(self.menu_items.pop(dev_id))
+
+        for child in self.tray_menu.get_children():
+            self.tray_menu.remove(child)
 
         # create menu items
         menu_items = []
-        sorted_vms = sorted(self.vms)
-        sorted_dispvms = sorted(self.dispvm_templates)
         sorted_devices = sorted(
             [dev for dev in self.devices.values() if not dev.hide_this_device],
             key=lambda x: x.sorting_key,
@@ -729,38 +861,46 @@ class DevicesTray(Gtk.Application):
         for i, dev in enumerate(sorted_devices):
             if i == 0 or dev.device_group != sorted_devices[i - 1].device_group:
                 # add a header
-                menu_item = actionable_widgets.generate_wrapper_widget(
-                    Gtk.MenuItem,
-                    "activate",
-                    actionable_widgets.InfoHeader(dev.device_group),
-                )
-                menu_items.append(menu_item)
-
-            device_widget = actionable_widgets.MainDeviceWidget(dev, theme)
-            device_item = actionable_widgets.generate_wrapper_widget(
-                Gtk.MenuItem, "activate", device_widget
-            )
-            device_item.set_reserve_indicator(False)
-
-            device_menu = DeviceMenu(device_widget, sorted_vms, sorted_dispvms)
-            device_menu.set_reserve_toggle_size(False)
-            device_item.set_submenu(device_menu)
+                if dev.device_group not in self.header_items:
+                    self.header_items[dev.device_group] = (
+                        actionable_widgets.generate_wrapper_widget(
+                            Gtk.MenuItem,
+                            "activate",
+                            actionable_widgets.InfoHeader(dev.device_group),
+                        )
+                    )
+                menu_items.append(self.header_items[dev.device_group])
 
-            menu_items.append(device_item)
+            if dev.id_string not in self.menu_items:
+                self.menu_items[dev.id_string] = self._create_device_item(dev, theme)
+            menu_items.append(self.menu_items[dev.id_string])
 
         for wrapped_vm in self.dormant_usbvms:
-            usbvm_item = actionable_widgets.generate_wrapper_widget(
-                Gtk.MenuItem,
-                "activate",
-                actionable_widgets.StartUSBVM(wrapped_vm, theme),
-            )
-            menu_items.append(usbvm_item)
+            if wrapped_vm not in self.usbvm_items:
+                self.usbvm_items[wrapped_vm] = (
+                    actionable_widgets.generate_wrapper_widget(
+                        Gtk.MenuItem,
+                        "activate",
+                        actionable_widgets.StartUSBVM(wrapped_vm, theme),
+                    )
+                )
+            menu_items.append(self.usbvm_items[wrapped_vm])
+
+        # drop headers and USB qube items that are not shown anymore
+        for items in (self.header_items, self.usbvm_items):
+            for key in [key for key, item in items.items() if item not in menu_items]:
+                self._destroy_item(items.pop(key))
 
         for item in menu_items:
-            tray_menu.add(item)
+            self.tray_menu.add(item)
 
-        tray_menu.show_all()
-        tray_menu.popup_at_pointer(None)  # use current event
+        self.tray_menu.show_all()
+
+    def show_menu(self, _unused, _event):
+        """Show menu at mouse pointer."""
+        theme = self.load_css(self.tray_menu)
+        self.update_menu(theme)
+        self.tray_menu.popup_at_pointer(None)  # use current event
 
     def emit_notification(
         self, title, message, priority, error=False, notification_id=None
@@ -776,9 +916,10 @@ class DevicesTray(Gtk.Application):
 
 
 def main():
+    setup_profiling()
     qapp = qubesadmin.Qubes()
     # qapp = qubesadmin.tests.mock_app.MockQubesComplete()
-    dispatcher = qubesadmin.events.EventsDispatcher(qapp)
+    dispatcher = qui.event_hub.HubEventsDispatcher(qapp)
     # dispatcher = qubesadmin.tests.mock_app.MockDispatcher(qapp)
     app = DevicesTray("org.qubes.qui.tray.Devices", qapp, dispatcher)
 
@@ -0,0 +1,429 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+"""
+Per-session event hub for qui widgets.
+
+Without the hub, every widget opens its own admin.Events (and, for the
+domains widget, admin.vm.Stats) connection to qubesd. The hub keeps a single
+upstream connection per API method, together with a snapshot of qube
+properties, and fans the events out over a local UNIX socket.
+
+Widgets use HubEventsDispatcher as a drop-in replacement for
+qubesadmin.events.EventsDispatcher; if the hub is not running, it connects
+to qubesd directly, as before.
+
+Protocol: a client sends a JSON line {"api_method": ..., "events": [...]}
+(and later {"events": [...]} lines to extend the subscription); the hub then
+sends events in the same format qubesd uses, so that the regular
+qubesadmin parser can be used. A {"snapshot": true} line makes the hub
+reply with a single JSON line containing the property snapshot; the snapshot
+is never sent in the event stream, as qubesadmin cannot read large events.
+After reconnecting to qubesd, the hub sends connection-established to the
+widgets only once its snapshot is fresh again.
+"""
+
+# pylint: disable=import-error
+import asyncio
+import concurrent.futures
+import fnmatch
+import json
+import logging
+import os
+import socket
+import sys
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import qubesadmin
+import qubesadmin.events
+from qubesadmin import exc
+
+import qui.utils
+from qubes_config.widgets.profiler import setup_profiling
+
+logger = logging.getLogger("qui-event-hub")
+
+API_METHODS = ("admin.Events", "admin.vm.Stats")
+
+# events needed by qubesadmin to keep its own cache (including the cached
+# power state of qubes) valid; they are always forwarded, regardless of the
+# subscription
+ALWAYS_FORWARDED = (
+    "connection-established",
+    "domain-add",
+    "domain-delete",
+    "domain-pre-start",
+    "domain-start",
+    "domain-start-failed",
+    "domain-shutdown",
+    "domain-paused",
+    "domain-unpaused",
+    "property-set:*",
+    "property-reset:*",
+    "property-del:*",
+)
+
+# clients that do not read their events are dropped instead of making the
+# hub buffer events for them indefinitely
+MAX_CLIENT_BUFFER = 4 * 1024 * 1024
+
+# events that change the property snapshot; they are replayed on top of
+# a snapshot that was being fetched while they arrived
+SNAPSHOT_EVENTS = ("property-set:*", "property-reset:*", "domain-delete")
+
+
+class HubAlreadyRunning(Exception):
+    """Another event hub is already serving the socket."""
+
+
+def get_socket_path() -> Optional[str]:
+    """Path of the hub socket for the current user session, or None if
+    there is no private runtime directory to put it in."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "qui-event-hub.sock")
+    return None
+
+
+def encode_event(subject: str, event: str, kwargs: Dict[str, Any]) -> bytes:
+    """Encode an event in the format used by qubesd event streams."""
+    parts = [b"1", subject.encode(), event.encode()]
+    for key, value in kwargs.items():
+        parts.append(str(key).encode())
+        parts.append(str(value).encode())
+    return b"\0".join(parts) + b"\0\0"
+
+
+class HubClient:
+    """A widget connected to the hub."""
+
+    def __init__(self, writer: asyncio.StreamWriter, api_method: str):
+        self.writer = writer
+        self.api_method = api_method
+        self.patterns: Set[str] = set(ALWAYS_FORWARDED)
+
+    def wants(self, event: str) -> bool:
+        return any(fnmatch.fnmatch(event, pattern) for pattern in self.patterns)
+
+    def send(self, data: bytes) -> bool:
+        """Queue data for the client; returns False if the client should be
+        dropped."""
+        if self.writer.is_closing():
+            return False
+        if self.writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            logger.warning("Dropping client that does not read its events")
+            self.writer.close()
+            return False
+        self.writer.write(data)
+        return True
+
+
+class UpstreamDispatcher(qubesadmin.events.EventsDispatcher):
+    """Dispatcher connected to qubesd that passes every event it receives
+    to the hub."""
+
+    def __init__(self, hub: "EventHub", api_method: str):
+        super().__init__(hub.qapp, api_method=api_method)
+        self.hub = hub
+        self.api_method = api_method
+
+    def handle(self, subject, event, **kwargs):
+        super().handle(subject, event, **kwargs)
+        subject = str(subject) if subject else ""
+        if self.api_method != "admin.Events":
+            self.hub.broadcast(self.api_method, subject, event, kwargs)
+        elif event == "connection-established":
+            # events might have been lost while disconnected; the snapshot
+            # must be fresh before this is forwarded to the widgets
+            self.hub.reconnected(subject, kwargs)
+        else:
+            self.hub.record_event(subject, event, kwargs)
+            self.hub.broadcast(self.api_method, subject, event, kwargs)
+
+
+class EventHub:
+    """Keeps one connection to qubesd per API method and forwards the events
+    to all connected widgets."""
+
+    def __init__(self, qapp, socket_path: str, snapshot_qapp=None):
+        """
+        :param qapp: Qubes object used by the event loop
+        :param socket_path: path of the socket to serve widgets on
+        :param snapshot_qapp: separate Qubes object used to fetch the
+        property snapshot in a worker thread; created when first needed
+        if not provided
+        """
+        self.qapp = qapp
+        self.snapshot_qapp = snapshot_qapp
+        self.socket_path = socket_path
+        self.clients: Set[HubClient] = set()
+        self.dispatchers = {
+            api_method: UpstreamDispatcher(self, api_method)
+            for api_method in API_METHODS
+        }
+        self.property_cache = qui.utils.VMPropertyCache(
+            qapp, self.dispatchers["admin.Events"]
+        )
+        self.server: Optional[asyncio.AbstractServer] = None
+        # a single worker, so that snapshot_qapp is never used concurrently
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="qui-event-hub"
+        )
+        self.refresh_task: Optional[asyncio.Future] = None
+        # number of snapshot refreshes in progress, and snapshot events
+        # received while they were
+        self.refreshing = 0
+        self.recorded_events: List[Tuple[str, str, Dict[str, Any]]] = []
+
+    def fetch_snapshot(self) -> Dict[str, Any]:
+        """Fetch properties and storage info of all qubes from qubesd. Runs
+        in a worker thread, so it uses its own Qubes object."""
+        if self.snapshot_qapp is None:
+            self.snapshot_qapp = qubesadmin.Qubes()
+        self.snapshot_qapp.domains.clear_cache()
+        cache = qui.utils.VMPropertyCache(self.snapshot_qapp)
+        cache.refresh_all(storage=True)
+        return cache.export_snapshot()
+
+    async def refresh_snapshot(self):
+        """Replace the property snapshot with a fresh one, without blocking
+        the event loop."""
+        self.refreshing += 1
+        try:
+            snapshot = await asyncio.get_event_loop().run_in_executor(
+                self.executor, self.fetch_snapshot
+            )
+        except exc.QubesException as ex:
+            logger.warning("Failed to refresh property snapshot: %s", ex)
+        else:
+            self.property_cache.load_snapshot(snapshot)
+            # changes that happened during the fetch might be missing
+            for subject, event, kwargs in self.recorded_events:
+                self.replay_event(subject, event, kwargs)
+        finally:
+            self.refreshing -= 1
+            if not self.refreshing:
+                self.recorded_events.clear()
+
+    def record_event(self, subject: str, event: str, kwargs: Dict[str, Any]):
+        """Remember an event that changes the snapshot, if a snapshot is
+        being fetched."""
+        if self.refreshing and any(
+            fnmatch.fnmatch(event, pattern) for pattern in SNAPSHOT_EVENTS
+        ):
+            self.recorded_events.append((subject, event, kwargs))
+
+    def replay_event(self, subject: str, event: str, kwargs: Dict[str, Any]):
+        if event == "domain-delete":
+            self.property_cache.invalidate(kwargs.get("vm"))
+        else:
+            self.property_cache.property_changed(subject, event, **kwargs)
+
+    def reconnected(self, subject: str, kwargs: Dict[str, Any]):
+        """Refresh the snapshot after (re)connecting to qubesd, and only
+        then forward connection-established to the widgets, which will
+        request the new snapshot."""
+
+        async def refresh_and_broadcast():
+            await self.refresh_snapshot()
+            self.broadcast("admin.Events", subject, "connection-established", kwargs)
+
+        self.refresh_task = asyncio.ensure_future(refresh_and_broadcast())
+
+    async def wait_for_snapshot(self):
+        """Wait for the snapshot refresh in progress, if any."""
+        if self.refresh_task is not None and not self.refresh_task.done():
+            await asyncio.shield(self.refresh_task)
+
+    def get_snapshot_json(self) -> str:
+        return json.dumps(self.property_cache.export_snapshot())
+
+    def broadcast(self, api_method: str, subject: str, event: str, kwargs):
+        """Forward an event to all clients subscribed to it."""
+        data = None
+        for client in list(self.clients):
+            if client.api_method != api_method or not client.wants(event):
+                continue
+            if data is None:
+                data = encode_event(subject, event, kwargs)
+            if not client.send(data):
+                self.clients.discard(client)
+
+    async def handle_client(self, reader, writer):
+        """Serve a single client connection."""
+        client = None
+        try:
+            request = json.loads(await reader.readline())
+            if request.get("snapshot"):
+                await self.wait_for_snapshot()
+                writer.write(self.get_snapshot_json().encode() + b"\n")
+                await writer.drain()
+                return
+            if request.get("api_method") not in API_METHODS:
+                return
+            client = HubClient(writer, request["api_method"])
+            client.patterns.update(request.get("events", []))
+            if client.api_method == "admin.Events":
+                # mimic qubesd, which starts every event stream with this;
+                # the client requests the snapshot when it gets it
+                await self.wait_for_snapshot()
+                client.send(encode_event("", "connection-established", {}))
+            self.clients.add(client)
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                client.patterns.update(json.loads(line).get("events", []))
+        except (OSError, ValueError, AttributeError) as ex:
+            logger.debug("Client connection failed: %s", ex)
+        finally:
+            if client:
+                self.clients.discard(client)
+            writer.close()
+
+    def _remove_stale_socket(self):
+        """Remove socket left behind by a hub that is no longer running;
+        raise HubAlreadyRunning if a hub still answers on it."""
+        if not os.path.exists(self.socket_path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(self.socket_path)
+            except ConnectionRefusedError:
+                pass
+            else:
+                raise HubAlreadyRunning(self.socket_path)
+        os.unlink(self.socket_path)
+
+    async def start(self):
+        self._remove_stale_socket()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # create the socket with the right permissions right away, instead
+        # of leaving it open to others until it is chmod-ed
+        old_umask = os.umask(0o177)
+        try:
+            sock.bind(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        finally:
+            os.umask(old_umask)
+        self.server = await asyncio.start_unix_server(self.handle_client, sock=sock)
+
+    def stop(self):
+        if not self.server:
+            return
+        self.server.close()
+        self.server = None
+        self.executor.shutdown(wait=False)
+        for client in self.clients:
+            client.writer.close()
+        self.clients.clear()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def run(self):
+        """Start serving and listen for qubesd events forever."""
+        await self.start()
+        try:
+            await asyncio.gather(
+                *(
+                    dispatcher.listen_for_events()
+                    for dispatcher in self.dispatchers.values()
+                )
+            )
+        finally:
+            self.stop()
+
+
+class HubEventsDispatcher(qubesadmin.events.EventsDispatcher):
+    """Drop-in replacement for qubesadmin.events.EventsDispatcher that gets
+    its events from the session event hub, or from qubesd directly if the
+    hub is not available."""
+
+    def __init__(self, app, api_method="admin.Events", enable_cache=True):
+        super().__init__(app, api_method=api_method, enable_cache=enable_cache)
+        self.api_method = api_method
+        self.socket_path: Optional[str] = get_socket_path()
+        self._hub_writer: Optional[asyncio.StreamWriter] = None
+
+    def add_handler(self, event, handler):
+        subscribe = event not in self.handlers
+        super().add_handler(event, handler)
+        if subscribe and self._hub_writer and not self._hub_writer.is_closing():
+            self._hub_writer.write(json.dumps({"events": [event]}).encode() + b"\n")
+
+    async def _get_events_reader(self, vm=None):
+        if vm is None and self.socket_path:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError:
+                pass
+            else:
+                request = {"api_method": self.api_method, "events": list(self.handlers)}
+                writer.write(json.dumps(request).encode() + b"\n")
+                self._hub_writer = writer
+
+                def cleanup_func():
+                    self._hub_writer = None
+                    writer.close()
+
+                return reader, cleanup_func
+        return await super()._get_events_reader(vm)
+
+    def get_snapshot(self) -> Optional[Dict[str, Any]]:
+        """Get the current property snapshot from the hub, without waiting
+        for the event stream; returns None if the hub is not running."""
+        if not self.socket_path:
+            return None
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(5)
+                sock.connect(self.socket_path)
+                sock.sendall(json.dumps({"snapshot": True}).encode() + b"\n")
+                with sock.makefile("rb") as stream:
+                    return json.loads(stream.readline())
+        except (OSError, ValueError):
+            return None
+
+
+def main():
+    """main function"""
+    setup_profiling()
+    logging.basicConfig(level=logging.INFO)
+    socket_path = get_socket_path()
+    if not socket_path:
+        logger.error("XDG_RUNTIME_DIR is not set, not starting the event hub")
+        return 1
+    qapp = qubesadmin.Qubes()
+    hub = EventHub(qapp, socket_path)
+
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(hub.run())
+    except HubAlreadyRunning:
+        logger.error("Event hub is already running on %s", socket_path)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
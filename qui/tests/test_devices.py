@@ -0,0 +1,332 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=redefined-outer-name
+# pylint: disable=protected-access
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from qubesadmin.tests.mock_app import (
+    MockDevice,
+    MockDispatcher,
+    MockQube,
+    MockQubesComplete,
+)
+
+from qui.devices.backend import DeviceRegistry
+from qui.devices.device_widget import DevicesTray
+
+
+def make_device(dev_id, port, backend_vm, parent="", attachments=()):
+    # only the attributes used by the registry
+    return SimpleNamespace(
+        id_string=dev_id,
+        port=port,
+        parent=parent,
+        backend_domain=backend_vm,
+        attachments=set(attachments),
+        assignments=set(),
+    )
+
+
+def ids(devices):
+    return {device.id_string for device in devices}
+
+
+def test_registry_add_remove():
+    registry = DeviceRegistry()
+    hub = make_device("usb:sys-usb:2-1:hub", "sys-usb:2-1", "sys-usb")
+    mouse = make_device(
+        "usb:sys-usb:2-1.1:mouse",
+        "sys-usb:2-1.1",
+        "sys-usb",
+        parent="sys-usb:2-1",
+        attachments=["test-vm"],
+    )
+    disk = make_device("block:dom0:sda:disk", "dom0:sda", "dom0")
+    for device in (hub, mouse, disk):
+        assert registry.add(device) is device
+
+    # behaves like a dict of device id -> device
+    assert len(registry) == 3
+    assert set(registry) == {hub.id_string, mouse.id_string, disk.id_string}
+    assert mouse.id_string in registry
+    assert registry[mouse.id_string] is mouse
+    assert registry.get("usb:sys-usb:2-2:missing") is None
+    assert dict(registry.items()) == {
+        hub.id_string: hub,
+        mouse.id_string: mouse,
+        disk.id_string: disk,
+    }
+
+    assert registry.find_by_port("sys-usb:2-1") == [hub]
+    assert registry.get_by_port("sys-usb:2-1") is hub
+    assert registry.get_by_port("sys-usb:2-1", "sys-usb") is hub
+    assert registry.get_by_port("sys-usb:2-1", "dom0") is None
+    assert registry.get_by_port("sys-usb:2-2") is None
+    assert registry.children("sys-usb:2-1") == [mouse]
+    assert not registry.children("sys-usb:2-1.1")
+    assert ids(registry.exposed_by("sys-usb")) == {hub.id_string, mouse.id_string}
+    assert registry.exposed_by("dom0") == [disk]
+    assert registry.attached_to("test-vm") == [mouse]
+
+    # a device with the same id replaces the old one, with its indexes
+    new_mouse = make_device(
+        mouse.id_string, "sys-usb:2-3", "sys-usb", attachments=["test-red"]
+    )
+    registry.add(new_mouse)
+    assert len(registry) == 3
+    assert registry[mouse.id_string] is new_mouse
+    assert not registry.find_by_port("sys-usb:2-1.1")
+    assert registry.get_by_port("sys-usb:2-3") is new_mouse
+    assert not registry.children("sys-usb:2-1")
+    assert not registry.attached_to("test-vm")
+    assert registry.attached_to("test-red") == [new_mouse]
+
+    assert registry.remove(new_mouse.id_string) is new_mouse
+    assert registry.remove(new_mouse.id_string) is None
+    assert new_mouse.id_string not in registry
+    assert registry.get_by_port("sys-usb:2-3") is None
+    assert registry.exposed_by("sys-usb") == [hub]
+    assert not registry.attached_to("test-red")
+    # empty index entries are dropped
+    assert "sys-usb:2-3" not in registry._by_port
+
+
+def test_registry_attachments():
+    registry = DeviceRegistry()
+    hub = registry.add(make_device("usb:sys-usb:2-1:hub", "sys-usb:2-1", "sys-usb"))
+    disk = registry.add(make_device("block:dom0:sda:disk", "dom0:sda", "dom0"))
+
+    registry.add_attachment(hub.id_string, "test-vm")
+    registry.add_attachment(disk.id_string, "test-vm")
+    # unknown devices are ignored
+    registry.add_attachment("usb:sys-usb:2-2:missing", "test-vm")
+    assert hub.attachments == {"test-vm"}
+    assert ids(registry.attached_to("test-vm")) == {hub.id_string, disk.id_string}
+
+    registry.remove_attachment(hub.id_string, "test-vm")
+    assert not hub.attachments
+    assert registry.attached_to("test-vm") == [disk]
+
+    registry.add_attachment(hub.id_string, "test-red")
+    registry.remove_frontend("test-red")
+    assert not hub.attachments
+    assert not registry.attached_to("test-red")
+    assert registry.attached_to("test-vm") == [disk]
+
+
+def test_registry_assignments():
+    registry = DeviceRegistry()
+    hub = registry.add(make_device("usb:sys-usb:2-1:hub", "sys-usb:2-1", "sys-usb"))
+
+    registry.add_assignment(hub.id_string, "test-vm")
+    assert hub.assignments == {"test-vm"}
+
+    # assignments of absent devices are applied when they show up
+    registry.add_assignment("usb:sys-usb:2-2:mouse", "test-red")
+    registry.add_assignment("usb:sys-usb:2-2:mouse", "test-vm")
+    mouse = registry.add(make_device("usb:sys-usb:2-2:mouse", "sys-usb:2-2", "sys-usb"))
+    assert mouse.assignments == {"test-red", "test-vm"}
+    assert registry.assigned_domains([hub.id_string]) == {"test-vm"}
+    assert registry.assigned_domains([hub.id_string, mouse.id_string]) == {
+        "test-red",
+        "test-vm",
+    }
+
+    # and survive removal of the device
+    registry.remove(mouse.id_string)
+    assert registry.assigned_domains([mouse.id_string]) == {"test-red", "test-vm"}
+
+    assert registry.remove_assignment(mouse.id_string, "test-red")
+    assert not registry.remove_assignment(mouse.id_string, "test-red")
+    assert registry.assigned_domains([mouse.id_string]) == {"test-vm"}
+
+    # removed domains lose their assignments and attachments
+    registry.add_attachment(hub.id_string, "test-vm")
+    registry.remove_domain("test-vm")
+    assert not hub.assignments
+    assert not hub.attachments
+    assert registry.assigned_domains([hub.id_string, mouse.id_string]) == set()
+
+
+@pytest.fixture
+def devices_tray():
+    qapp = MockQubesComplete()
+    qapp._qubes["test-attached"] = MockQube(
+        name="test-attached", qapp=qapp, label="red", running=True
+    )
+    qapp._devices.append(
+        MockDevice(
+            qapp,
+            dev_class="usb",
+            product="Anvil",
+            vendor="ACME",
+            backend_vm="sys-usb",
+            device_id="3:4:b011010",
+            port="2-22",
+        )
+    )
+    qapp._devices.append(
+        MockDevice(
+            qapp,
+            dev_class="usb",
+            product="Hammer",
+            vendor="ACME",
+            backend_vm="sys-usb",
+            device_id="1:2:u011010",
+            port="2-23",
+        )
+    )
+    qapp._devices.append(
+        MockDevice(
+            qapp,
+            dev_class="block",
+            product="Ouroboros",
+            vendor="ACME",
+            backend_vm="sys-usb",
+            device_id="444:888:b123422",
+            port="sda",
+        )
+    )
+    qapp.update_vm_calls()
+
+    # every test needs its own application id
+    tray = DevicesTray(
+        f"org.qubes.qui.tray.Devices.test{uuid.uuid4().hex}",
+        qapp,
+        MockDispatcher(qapp),
+    )
+    with mock.patch.object(tray, "emit_notification"), mock.patch.object(
+        tray, "_update_queue"
+    ):
+        yield tray
+
+
+def find_device(tray, product):
+    for device in tray.devices.values():
+        if product in device.description:
+            return device
+    raise AssertionError(f"device {product} not found")
+
+
+def test_menu_updated_in_place(devices_tray):
+    tray = devices_tray
+    anvil = find_device(tray, "Anvil")
+    hammer = find_device(tray, "Hammer")
+    disk = find_device(tray, "Ouroboros")
+
+    tray.update_menu("light")
+    items = dict(tray.menu_items)
+    assert {anvil.id_string, hammer.id_string, disk.id_string} <= set(items)
+    children = tray.tray_menu.get_children()
+    for item in items.values():
+        # submenus are only built when an item is selected
+        assert item.submenu_outdated
+        assert item in children
+
+    # nothing changed, so the menu is left as is
+    tray.update_menu("light")
+    assert tray.menu_items == items
+    assert tray.tray_menu.get_children() == children
+
+    # attaching a device rebuilds only its own item
+    vm = tray.qapp.domains["test-attached"]
+    tray.device_attached(vm, "device-attach:usb", device=hammer._dev)
+    tray.update_menu("light")
+    assert tray.menu_items[hammer.id_string] is not items[hammer.id_string]
+    assert tray.menu_items[hammer.id_string] in tray.tray_menu.get_children()
+    assert tray.menu_items[anvil.id_string] is items[anvil.id_string]
+    assert tray.menu_items[disk.id_string] is items[disk.id_string]
+    items = dict(tray.menu_items)
+
+    # a removed device loses its item, other items are reused
+    backend_vm = tray.qapp.domains["sys-usb"]
+    tray.device_removed(backend_vm, "device-removed:usb", port=anvil.port)
+    assert anvil.id_string not in tray.devices
+    tray.update_menu("light")
+    assert anvil.id_string not in tray.menu_items
+    assert items[anvil.id_string] not in tray.tray_menu.get_children()
+    assert tray.menu_items[hammer.id_string] is items[hammer.id_string]
+    assert tray.menu_items[disk.id_string] is items[disk.id_string]
+
+    # and an added one gets a new item in the same menu
+    tray.device_added(backend_vm, "device-added:usb", device=anvil._dev)
+    tray.update_menu("light")
+    new_item = tray.menu_items[anvil.id_string]
+    assert new_item is not items[anvil.id_string]
+    assert new_item in tray.tray_menu.get_children()
+    assert new_item.new_until
+    assert tray.menu_items[hammer.id_string] is items[hammer.id_string]
+    assert tray.menu_items[disk.id_string] is items[disk.id_string]
+
+    # changes to the list of qubes keep items, only submenus are outdated
+    hammer_item = tray.menu_items[hammer.id_string]
+    hammer_item.submenu_outdated = False
+    tray.vm_start(vm, "domain-start")
+    tray.update_menu("light")
+    assert tray.menu_items[hammer.id_string] is hammer_item
+    assert hammer_item.submenu_outdated
+
+
+def watch_destroy(*widgets):
+    destroyed = []
+    for widget in widgets:
+        widget.connect("destroy", destroyed.append)
+    return destroyed
+
+
+def test_menu_items_destroyed(devices_tray):
+    tray = devices_tray
+    anvil = find_device(tray, "Anvil")
+    hammer = find_device(tray, "Hammer")
+
+    tray.update_menu("light")
+    headers = dict(tray.header_items)
+    assert headers
+
+    # a rebuilt submenu replaces, and destroys, the previous one
+    hammer_item = tray.menu_items[hammer.id_string]
+    placeholder = hammer_item.get_submenu()
+    destroyed = watch_destroy(placeholder)
+    hammer_item._build_submenu()
+    assert destroyed == [placeholder]
+
+    # items of changed devices are destroyed together with their submenus
+    submenu = hammer_item.get_submenu()
+    destroyed = watch_destroy(hammer_item, submenu)
+    tray.device_changed(hammer.id_string)
+    tray.update_menu("light")
+    assert set(destroyed) == {hammer_item, submenu}
+
+    # and so are items of removed devices, while headers are reused
+    anvil_item = tray.menu_items[anvil.id_string]
+    destroyed = watch_destroy(anvil_item)
+    tray.device_removed(
+        tray.qapp.domains["sys-usb"], "device-removed:usb", port=anvil.port
+    )
+    tray.update_menu("light")
+    assert destroyed == [anvil_item]
+    assert tray.header_items == headers
+    for header in headers.values():
+        assert header in tray.tray_menu.get_children()
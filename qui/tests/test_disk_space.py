@@ -0,0 +1,321 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=redefined-outer-name
+import asyncio
+import time
+from unittest import mock
+
+import pytest
+from qubesadmin.tests.mock_app import MockDispatcher, MockQube, MockQubesComplete
+
+from qui.tray.disk_space import (
+    HISTORY_SIZE,
+    POLL_INTERVAL,
+    DiskSpace,
+    UsageHistory,
+    UsageRingBuffer,
+    VMUsage,
+    VMUsageData,
+)
+
+GB = 1024**3
+
+
+def test_ring_buffer_wrap_around():
+    buffer = UsageRingBuffer(size=3)
+    assert len(buffer) == 0
+    assert buffer.samples() == []
+    assert buffer.last_timestamp == 0.0
+    assert buffer.span == 0.0
+
+    for i in range(5):
+        buffer.append(float(i), i / 4, i / 8)
+
+    # only the newest samples are kept, oldest first
+    assert len(buffer) == 3
+    assert buffer.samples() == [(2.0, 0.5, 0.25), (3.0, 0.75, 0.375), (4.0, 1.0, 0.5)]
+    assert buffer.samples(last=2) == [(3.0, 0.75, 0.375), (4.0, 1.0, 0.5)]
+    assert buffer.last_timestamp == 4.0
+    assert buffer.span == 2.0
+
+    # serialization keeps the order of a wrapped buffer
+    assert UsageRingBuffer.from_dict(buffer.to_dict(), size=3).samples() == (
+        buffer.samples()
+    )
+    # and a smaller buffer keeps only the newest samples
+    assert UsageRingBuffer.from_dict(buffer.to_dict(), size=2).samples() == (
+        buffer.samples(last=2)
+    )
+
+
+def test_ring_buffer_fill_rate():
+    buffer = UsageRingBuffer()
+    # data grows by 1% and metadata by 0.5% per minute
+    for minute in range(61):
+        buffer.append(minute * 60.0, 0.25 + minute / 100, 0.1 + minute / 200)
+
+    usage_rate, metadata_rate = buffer.fill_rate()
+    assert usage_rate == pytest.approx(0.01 / 60, rel=1e-3)
+    assert metadata_rate == pytest.approx(0.005 / 60, rel=1e-3)
+
+    # data is 85% full, and fills up before metadata (40% full)
+    assert buffer.time_to_full() == pytest.approx(15 * 60, rel=1e-2)
+
+
+def test_ring_buffer_fill_rate_metadata():
+    buffer = UsageRingBuffer()
+    for minute in range(61):
+        buffer.append(minute * 60.0, 0.5, 0.2 + minute / 100)
+
+    assert buffer.fill_rate()[0] == 0.0
+    # metadata is 80% full, growing by 1% per minute
+    assert buffer.time_to_full() == pytest.approx(20 * 60, rel=1e-2)
+
+
+def test_ring_buffer_fill_rate_flat_and_decreasing():
+    flat = UsageRingBuffer()
+    decreasing = UsageRingBuffer()
+    for minute in range(61):
+        flat.append(minute * 60.0, 0.5, 0.5)
+        decreasing.append(minute * 60.0, 0.9 - minute / 100, 0.5)
+
+    assert flat.fill_rate() == (0.0, 0.0)
+    assert flat.time_to_full() is None
+
+    assert decreasing.fill_rate()[0] < 0
+    assert decreasing.time_to_full() is None
+
+
+def test_ring_buffer_fill_rate_window():
+    buffer = UsageRingBuffer()
+    assert buffer.time_to_full() is None
+
+    # too few samples to tell
+    buffer.append(0.0, 0.1)
+    buffer.append(600.0, 0.5)
+    assert buffer.fill_rate() == (0.0, 0.0)
+
+    # fast growth over an hour ago is not taken into account
+    for minute in range(11, 121):
+        buffer.append(minute * 60.0, 0.5)
+    assert buffer.time_to_full() is None
+
+    # and neither are samples from too short a period
+    for second in range(1, 4):
+        buffer.append(7200.0 + second, 0.5 + second / 10)
+    assert buffer.fill_rate(window=60) == (0.0, 0.0)
+
+
+def test_usage_history_save_load(tmp_path):
+    path = str(tmp_path / "history.json")
+    pool_key = UsageHistory.pool_key("pool1")
+    volume_key = UsageHistory.volume_key("test-vm", "private")
+    old_key = UsageHistory.pool_key("old-pool")
+
+    history = UsageHistory(path)
+    now = time.time()
+    for i in range(5):
+        history.record(pool_key, now - (5 - i) * 60, i / 4, i / 8)
+    history.record(volume_key, now, 0.5)
+    history.record(old_key, now - 2 * HISTORY_SIZE * POLL_INTERVAL, 0.5)
+    history.save()
+
+    loaded = UsageHistory(path)
+    loaded.load()
+    # samples too old to be in a buffer are dropped
+    assert set(loaded.buffers) == {pool_key, volume_key}
+    assert loaded.get(pool_key).samples() == history.get(pool_key).samples()
+    assert loaded.get(volume_key).samples() == history.get(volume_key).samples()
+
+    loaded.remove_vm("test-vm")
+    assert set(loaded.buffers) == {pool_key}
+
+    # corrupted history is ignored
+    with open(path, "w", encoding="utf-8") as file:
+        file.write('{"pool:pool1": {"usage": "')
+    corrupted = UsageHistory(path)
+    corrupted.load()
+    assert not corrupted.buffers
+
+
+@pytest.fixture
+def disk_space_app():
+    qapp = MockQubesComplete()
+    MockQube(name="test-running", qapp=qapp, label="red", running=True)
+    qapp.update_vm_calls()
+    qapp.expected_calls[("dom0", "admin.pool.List", None, None)] = b"0\x00test-pool\n"
+    qapp.expected_calls[("dom0", "admin.pool.Info", "test-pool", None)] = (
+        f"0\x00driver=lvm_thin\nrevisions_to_keep=2\n"
+        f"size={100 * GB}\nusage={97 * GB}\n".encode()
+    )
+    qapp.expected_calls[("dom0", "admin.pool.UsageDetails", "test-pool", None)] = (
+        f"0\x00data_size={100 * GB}\ndata_usage={97 * GB}\n"
+        f"metadata_size={GB}\nmetadata_usage={GB // 10}\n".encode()
+    )
+
+    # do not touch the usage history of the user running the tests
+    with mock.patch.object(UsageHistory, "load"), mock.patch.object(
+        UsageHistory, "save"
+    ):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        app = DiskSpace(qapp, MockDispatcher(qapp))
+        yield app, loop
+        app.poll_executor.shutdown(wait=True)
+        loop.close()
+
+
+def run_pending(loop):
+    pending = asyncio.all_tasks(loop)
+    if pending:
+        loop.run_until_complete(asyncio.gather(*pending))
+
+
+async def wait_until(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met in time")
+
+
+def test_refresh_usage(disk_space_app):
+    app, loop = disk_space_app
+    vm = app.qubes_app.domains["test-vm"]
+    usage_data = app.vm_data.add_vm(vm)
+
+    with mock.patch.object(
+        VMUsage, "fetch_usage", return_value={"private": (10 * GB, 19 * GB // 2)}
+    ):
+        loop.run_until_complete(app.refresh_usage())
+
+    assert "test-pool" in [pool.name for pool in app.pool_data.pools]
+    assert app.pool_data.get_warning()
+    assert usage_data.problem_volumes == {"private": 0.95}
+    assert app.vm_data.problematic_vms == [usage_data]
+    assert vm in app.vms_warned
+
+    # only provided qubes are refreshed, pools are left alone
+    with mock.patch.object(
+        VMUsage, "fetch_usage", return_value={"private": (10 * GB, GB)}
+    ), mock.patch.object(VMUsageData, "find_running") as mock_find, mock.patch(
+        "qui.tray.disk_space.PoolUsageData.fetch_pools"
+    ) as mock_pools:
+        loop.run_until_complete(app.refresh_usage([usage_data]))
+    mock_find.assert_not_called()
+    mock_pools.assert_not_called()
+    assert not usage_data.problem_volumes
+    assert not app.vms_warned
+
+
+def test_refresh_usage_qube_stopped(disk_space_app):
+    app, loop = disk_space_app
+    vm = app.qubes_app.domains["test-vm"]
+    usage_data = app.vm_data.add_vm(vm)
+
+    def fetch_usage():
+        # qube shuts down while its usage is being fetched
+        loop.call_soon_threadsafe(app.domain_stopped, vm, "domain-shutdown")
+        return {"private": (10 * GB, 19 * GB // 2)}
+
+    with mock.patch.object(VMUsage, "fetch_usage", side_effect=fetch_usage):
+        loop.run_until_complete(app.refresh_usage([usage_data]))
+
+    assert vm.name not in app.vm_data.running_vms
+    assert not usage_data.problem_volumes
+    assert not app.vms_warned
+
+
+def test_running_qubes_events(disk_space_app):
+    app, loop = disk_space_app
+    vm = app.qubes_app.domains["test-vm"]
+
+    with mock.patch.object(
+        VMUsage, "fetch_usage", return_value={"private": (10 * GB, 19 * GB // 2)}
+    ) as mock_fetch:
+        app.domain_started(vm, "domain-start")
+        run_pending(loop)
+        # a started qube is checked right away, without a full refresh
+        assert mock_fetch.call_count == 1
+        assert list(app.vm_data.running_vms) == [vm.name]
+        assert app.vm_data.running_vms[vm.name].problem_volumes
+        assert vm in app.vms_warned
+
+        # starting again does not create another entry
+        app.domain_started(vm, "domain-start")
+        run_pending(loop)
+        assert list(app.vm_data.running_vms) == [vm.name]
+
+    app.domain_stopped(vm, "domain-shutdown")
+    assert not app.vm_data.running_vms
+    assert not app.vm_data.problematic_vms
+    assert not app.vms_warned
+
+    assert app.history.get(UsageHistory.volume_key(vm.name, "private"))
+    app.domain_deleted(None, "domain-delete", vm=vm.name)
+    assert not app.history.get(UsageHistory.volume_key(vm.name, "private"))
+
+    # events might have been lost, running qubes are scanned again
+    app.vm_data.add_vm(vm)
+    app.running_scan_needed = False
+    app.reconnected(None, "connection-established")
+    assert not app.vm_data.running_vms
+    assert app.running_scan_needed
+    assert app.poll_wakeup.is_set()
+
+
+def test_poll_usage(disk_space_app):
+    app, loop = disk_space_app
+    expected = {vm.name for vm in VMUsageData.find_running(app.qubes_app)}
+    assert "test-running" in expected
+
+    async def run_test(mock_find, mock_fetch):
+        task = asyncio.ensure_future(app.poll_usage())
+
+        # running qubes are listed once, then all are checked together
+        # with the pools
+        await wait_until(lambda: app.pool_data.pools)
+        assert mock_find.call_count == 1
+        assert set(app.vm_data.running_vms) == expected
+        assert mock_fetch.call_count == len(expected)
+
+        # the next refresh relies on events to know which qubes run
+        app.poll_wakeup.set()
+        await wait_until(lambda: mock_fetch.call_count == 2 * len(expected))
+        assert mock_find.call_count == 1
+
+        # unless connection to qubesd was lost
+        app.reconnected(None, "connection-established")
+        await wait_until(lambda: mock_find.call_count == 2)
+        await wait_until(lambda: mock_fetch.call_count == 3 * len(expected))
+        assert set(app.vm_data.running_vms) == expected
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with mock.patch.object(
+        VMUsageData, "find_running", wraps=VMUsageData.find_running
+    ) as mock_find, mock.patch.object(
+        VMUsage, "fetch_usage", return_value={}
+    ) as mock_fetch:
+        loop.run_until_complete(run_test(mock_find, mock_fetch))
@@ -0,0 +1,294 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+# pylint: disable=redefined-outer-name
+# pylint: disable=protected-access
+import asyncio
+import uuid
+from unittest import mock
+
+import pytest
+from qubesadmin.tests.mock_app import MockDispatcher, MockQube, MockQubesComplete
+
+from qui.tray.domains import (
+    STATS_FLUSH_RATE,
+    DomainTray,
+    PausedMenu,
+    StartedMenu,
+)
+from qui.utils import VMPropertyCache
+
+GB = 1024**3
+
+
+@pytest.fixture
+def domain_tray():
+    qapp = MockQubesComplete()
+    for name in ("test-aaa", "test-zzz"):
+        qapp._qubes[name] = MockQube(
+            name=name, qapp=qapp, label="red", template="fedora-36", running=True
+        )
+    qapp.update_vm_calls()
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    with mock.patch.object(
+        VMPropertyCache, "fetch_storage", return_value=(GB, 2 * GB)
+    ) as mock_storage:
+        # every test needs its own application id
+        tray = DomainTray(
+            f"org.qubes.qui.tray.Domains.test{uuid.uuid4().hex}",
+            qapp,
+            MockDispatcher(qapp),
+            MockDispatcher(qapp),
+        )
+        tray.initialize_menu()
+        # normally set when the menu is shown
+        tray.shift_pressed = False
+        yield tray, loop, mock_storage
+        tray.storage_executor.shutdown(wait=True)
+        loop.close()
+
+
+async def wait_until(condition):
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met in time")
+
+
+def test_initialize_menu(domain_tray):
+    tray, _loop, mock_storage = domain_tray
+    vm = tray.qapp.domains["test-aaa"]
+
+    # storage info is left to poll_storage, only properties are fetched
+    mock_storage.assert_not_called()
+    assert tray.property_cache.get_property(vm, "template") == "fedora-36"
+    assert tray.property_cache.get_storage(vm) == (0, 0)
+
+
+def test_poll_storage(domain_tray):
+    tray, loop, mock_storage = domain_tray
+    mapped = False
+
+    async def run_test(mock_refresh):
+        nonlocal mapped
+        task = asyncio.ensure_future(tray.poll_storage())
+
+        # nothing is fetched while the menu is closed
+        await asyncio.sleep(0.1)
+        mock_storage.assert_not_called()
+        mock_refresh.assert_not_called()
+
+        # opening the menu wakes polling up; all visible qubes are fetched
+        # and applied in a single idle callback
+        mapped = True
+        tray._menu_mapped()
+        await wait_until(lambda: mock_refresh.call_count == 1)
+        storage = mock_refresh.call_args[0][0]
+        expected = [
+            vm
+            for vm, item in tray.menu_items.items()
+            if item.is_visible() and vm.klass != "AdminVM"
+        ]
+        assert "test-aaa" in [vm.name for vm in expected]
+        assert set(storage) == set(expected)
+        assert mock_storage.call_count == len(expected)
+
+        # after the menu was closed, polling stops
+        mapped = False
+        tray.storage_poll_wakeup.set()
+        await asyncio.sleep(0.1)
+        assert mock_refresh.call_count == 1
+        assert mock_storage.call_count == len(expected)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with mock.patch.object(
+        tray.tray_menu, "get_mapped", side_effect=lambda: mapped
+    ), mock.patch.object(tray, "refresh_tooltips", return_value=False) as mock_refresh:
+        loop.run_until_complete(run_test(mock_refresh))
+
+    # results are stored and a failed fetch is skipped
+    vm = tray.qapp.domains["test-aaa"]
+    other_vm = tray.qapp.domains["test-zzz"]
+    assert not tray.refresh_tooltips({vm: (3 * GB, 4 * GB), other_vm: OSError()})
+    assert tray.property_cache.get_storage(vm) == (3 * GB, 4 * GB)
+    assert tray.property_cache.get_storage(other_vm) == (0, 0)
+
+
+def test_stats_coalescing(domain_tray):
+    tray, _loop, _mock_storage = domain_tray
+    vm = tray.qapp.domains["test-aaa"]
+    item = tray.menu_items[vm]
+    mapped = True
+
+    with mock.patch.object(
+        tray.tray_menu, "get_mapped", side_effect=lambda: mapped
+    ), mock.patch(
+        "qui.tray.domains.GLib.timeout_add", side_effect=[1, 2, 3]
+    ) as mock_timeout, mock.patch(
+        "qui.tray.domains.GLib.source_remove"
+    ) as mock_remove, mock.patch.object(
+        item, "update_stats"
+    ) as mock_update:
+        for i in range(5):
+            tray.update_stats(vm, "vm-stats", memory_kb=1000 * i, cpu_usage=i)
+        # stats of qubes not in the menu are ignored
+        tray.update_stats("test-missing", "vm-stats", memory_kb=1, cpu_usage=1)
+
+        # a single flush is scheduled, and only the latest sample is shown
+        mock_timeout.assert_called_once_with(1000 // STATS_FLUSH_RATE, tray.flush_stats)
+        mock_update.assert_not_called()
+        assert not tray.flush_stats()
+        mock_update.assert_called_once_with(4000, 4)
+        assert not tray.pending_stats
+
+        # after a flush, next samples schedule another one
+        tray.update_stats(vm, "vm-stats", memory_kb=10, cpu_usage=1)
+        assert mock_timeout.call_count == 2
+        mock_update.reset_mock()
+
+        # while the menu is closed, samples are only collected
+        mapped = False
+        tray.update_stats(vm, "vm-stats", memory_kb=20, cpu_usage=2)
+        tray.update_stats(vm, "vm-stats", memory_kb=30, cpu_usage=3)
+        assert mock_timeout.call_count == 2
+        mock_update.assert_not_called()
+
+        # and rendered once it's opened, replacing the flush scheduled
+        # before it was closed
+        mapped = True
+        tray._menu_mapped()
+        mock_update.assert_called_once_with(30, 3)
+        mock_remove.assert_called_once_with(2)
+
+        # so there is still at most one flush scheduled at a time
+        tray.update_stats(vm, "vm-stats", memory_kb=40, cpu_usage=4)
+        tray.update_stats(vm, "vm-stats", memory_kb=50, cpu_usage=5)
+        assert mock_timeout.call_count == 3
+        assert tray.stats_flush_source == 3
+
+    # a removed qube does not leave pending stats behind
+    tray.remove_domain_item(None, "domain-delete", vm)
+    assert not tray.pending_stats
+
+
+def menu_names(tray):
+    return [
+        item.vm.name
+        for item in tray.tray_menu.get_children()
+        if getattr(item, "vm", None) is not None
+    ]
+
+
+def test_sorted_insertion(domain_tray):
+    tray, _loop, _mock_storage = domain_tray
+    qapp = tray.qapp
+    expected = sorted(
+        vm.name for vm in qapp.domains if vm.klass not in ("AdminVM", "RemoteVM")
+    )
+    assert tray.sorted_names == expected
+    assert tray.admin_vm_count == 1
+    assert menu_names(tray) == ["dom0"] + expected
+    assert {"test-aaa", "test-zzz"} <= tray.template_dependents["fedora-36"]
+
+    # new qubes are inserted in the right place
+    qapp._qubes["test-mmm"] = MockQube(
+        name="test-mmm", qapp=qapp, label="red", template="fedora-36"
+    )
+    qapp.update_vm_calls()
+    qapp.domains.clear_cache()
+    tray.add_domain_item(None, "domain-add", vm="test-mmm")
+    expected = sorted(expected + ["test-mmm"])
+    assert tray.sorted_names == expected
+    assert menu_names(tray) == ["dom0"] + expected
+    assert "test-mmm" in tray.template_dependents["fedora-36"]
+
+    # adding it again changes nothing
+    tray.add_domain_item(None, "domain-add", vm="test-mmm")
+    assert menu_names(tray) == ["dom0"] + expected
+
+    # template changes move the qube between dependents
+    vm = qapp.domains["test-mmm"]
+    tray.property_change(
+        vm,
+        "property-set:template",
+        name="template",
+        newvalue="fedora-35",
+        oldvalue="fedora-36",
+    )
+    assert "test-mmm" not in tray.template_dependents["fedora-36"]
+    assert "test-mmm" in tray.template_dependents["fedora-35"]
+
+    tray.remove_domain_item(None, "domain-delete", vm)
+    expected.remove("test-mmm")
+    assert tray.sorted_names == expected
+    assert menu_names(tray) == ["dom0"] + expected
+    assert "test-mmm" not in tray.template_dependents["fedora-35"]
+    assert "test-mmm" not in tray.vm_templates
+
+    # removing an AdminVM does not touch other qubes
+    tray.remove_domain_item(None, "domain-delete", qapp.domains["dom0"])
+    assert tray.admin_vm_count == 0
+    assert tray.sorted_names == expected
+    assert menu_names(tray) == expected
+
+
+def test_submenu_built_lazily(domain_tray):
+    tray, _loop, _mock_storage = domain_tray
+    item = tray.menu_items[tray.qapp.domains["test-aaa"]]
+
+    # until the item is selected, only an empty placeholder is set
+    assert not item.submenus
+    assert item.submenu_outdated
+    assert not item.get_submenu().get_children()
+
+    with mock.patch("qui.tray.domains.PausedMenu", wraps=PausedMenu) as mock_paused:
+        item.update_state("Paused")
+        assert not item.submenus
+        item._build_submenu()
+        paused_menu = item.get_submenu()
+        assert mock_paused.call_count == 1
+        assert not item.submenu_outdated
+
+        # nothing changed, nothing to do
+        item._build_submenu()
+        assert item.get_submenu() is paused_menu
+
+        item.update_state("Running")
+        item._build_submenu()
+        started_menu = item.get_submenu()
+        assert isinstance(started_menu, StartedMenu)
+
+        # menus are reused when going back to a known state
+        item.update_state("Paused")
+        item._build_submenu()
+        assert item.get_submenu() is paused_menu
+        item.update_state("Running")
+        item._build_submenu()
+        assert item.get_submenu() is started_menu
+        assert mock_paused.call_count == 1
+
+    assert set(item.submenus) == {("Paused",), ("Running",)}
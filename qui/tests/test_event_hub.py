@@ -0,0 +1,287 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+import asyncio
+import json
+import os
+import socket
+import stat
+import threading
+from unittest import mock
+
+import pytest
+from qubesadmin.tests.mock_app import MockQubesComplete
+
+from qui.event_hub import (
+    EventHub,
+    HubAlreadyRunning,
+    HubEventsDispatcher,
+    encode_event,
+    get_socket_path,
+)
+from qui.utils import VMPropertyCache
+
+
+def test_encode_event():
+    assert encode_event("", "connection-established", {}) == (
+        b"1\0\0connection-established\0\0"
+    )
+    assert encode_event("vm1", "domain-start", {"start_guid": "True"}) == (
+        b"1\0vm1\0domain-start\0start_guid\0True\0\0"
+    )
+
+
+def test_property_cache_snapshot():
+    qapp = MockQubesComplete()
+    cache = VMPropertyCache(qapp)
+    cache.refresh_all(storage=True)
+
+    # the snapshot must survive being sent over the hub socket
+    snapshot = json.loads(json.dumps(cache.export_snapshot()))
+
+    other_cache = VMPropertyCache(qapp)
+    assert other_cache.load_snapshot(snapshot)
+    assert not other_cache.load_snapshot(None)
+
+    for vm in qapp.domains:
+        if vm.klass == "AdminVM":
+            continue
+        assert other_cache.get_property(vm, "template") == cache.get_property(
+            vm, "template"
+        )
+        assert other_cache.get_storage(vm) == cache.get_storage(vm)
+    assert other_cache.misses == 0
+
+
+async def read_event(reader):
+    # the same way qubesadmin reads events, with the default buffer limit
+    header = await reader.readuntil(b"\0")
+    assert header == b"1\0"
+    subject = (await reader.readuntil(b"\0"))[:-1].decode()
+    event = (await reader.readuntil(b"\0"))[:-1].decode()
+    kwargs = {}
+    while True:
+        key = (await reader.readuntil(b"\0"))[:-1].decode()
+        if not key:
+            break
+        kwargs[key] = (await reader.readuntil(b"\0"))[:-1].decode()
+    return subject, event, kwargs
+
+
+async def connect_client(hub, events):
+    reader, writer = await asyncio.open_unix_connection(hub.socket_path)
+    writer.write(
+        json.dumps({"api_method": "admin.Events", "events": events}).encode() + b"\n"
+    )
+    return reader, writer
+
+
+async def get_snapshot(hub):
+    dispatcher = HubEventsDispatcher(MockQubesComplete())
+    dispatcher.socket_path = hub.socket_path
+    return await asyncio.get_event_loop().run_in_executor(None, dispatcher.get_snapshot)
+
+
+def test_event_hub_forwarding(tmp_path):
+    qapp = MockQubesComplete()
+    hub = EventHub(
+        qapp, socket_path=str(tmp_path / "hub.sock"), snapshot_qapp=MockQubesComplete()
+    )
+
+    async def run_test():
+        await hub.start()
+        await hub.refresh_snapshot()
+        assert hub.property_cache.export_snapshot()["properties"]
+
+        reader, writer = await connect_client(hub, ["domain-start"])
+
+        # every stream starts with connection-established, without the
+        # snapshot
+        assert await read_event(reader) == ("", "connection-established", {})
+
+        hub.broadcast("admin.Events", "test-blue", "domain-feature-set:x", {})
+        hub.broadcast("admin.vm.Stats", "test-blue", "vm-stats", {})
+        hub.broadcast("admin.Events", "test-blue", "domain-start", {"a": "b"})
+        hub.broadcast("admin.Events", "test-red", "property-set:netvm", {})
+
+        # not subscribed events are not forwarded
+        assert await read_event(reader) == ("test-blue", "domain-start", {"a": "b"})
+        assert await read_event(reader) == ("test-red", "property-set:netvm", {})
+
+        # snapshot is requested separately
+        assert await get_snapshot(hub) == json.loads(hub.get_snapshot_json())
+
+        writer.close()
+        hub.stop()
+
+    asyncio.run(run_test())
+
+
+def test_event_hub_large_snapshot(tmp_path):
+    hub = EventHub(
+        MockQubesComplete(),
+        socket_path=str(tmp_path / "hub.sock"),
+        snapshot_qapp=MockQubesComplete(),
+    )
+    snapshot = {
+        "properties": {
+            f"test-vm-{i}": {"template": "fedora-36", "netvm": "sys-firewall"}
+            for i in range(2000)
+        },
+        "storage": {f"test-vm-{i}": [2**30, 2**31] for i in range(2000)},
+    }
+    assert len(json.dumps(snapshot)) > 64 * 1024
+
+    async def run_test():
+        await hub.start()
+        with mock.patch.object(hub, "fetch_snapshot", return_value=snapshot):
+            await hub.refresh_snapshot()
+
+        # a snapshot bigger than the reader limit does not break the stream
+        reader, writer = await connect_client(hub, [])
+        assert await read_event(reader) == ("", "connection-established", {})
+        hub.broadcast("admin.Events", "test-blue", "domain-start", {})
+        assert await read_event(reader) == ("test-blue", "domain-start", {})
+
+        assert await get_snapshot(hub) == snapshot
+
+        writer.close()
+        hub.stop()
+
+    asyncio.run(run_test())
+
+
+def test_event_hub_reconnect(tmp_path):
+    hub = EventHub(
+        MockQubesComplete(),
+        socket_path=str(tmp_path / "hub.sock"),
+        snapshot_qapp=MockQubesComplete(),
+    )
+    upstream = hub.dispatchers["admin.Events"]
+    fetch_started = threading.Event()
+    release_fetch = threading.Event()
+
+    def slow_fetch():
+        fetch_started.set()
+        release_fetch.wait(5)
+        return {
+            "properties": {"test-vm": {"template": "fedora-35", "netvm": None}},
+            "storage": {},
+        }
+
+    async def run_test():
+        await hub.start()
+        reader, writer = await connect_client(hub, [])
+        assert await read_event(reader) == ("", "connection-established", {})
+
+        with mock.patch.object(hub, "fetch_snapshot", side_effect=slow_fetch):
+            upstream.handle("", "connection-established")
+            await asyncio.get_event_loop().run_in_executor(None, fetch_started.wait, 5)
+
+            # the event loop is not blocked by the refresh: events are still
+            # forwarded while the snapshot is being fetched
+            upstream.handle(
+                "test-vm",
+                "property-set:template",
+                name="template",
+                newvalue="fedora-36",
+                oldvalue="fedora-35",
+            )
+            upstream.handle("test-vm", "domain-start")
+            assert await read_event(reader) == (
+                "test-vm",
+                "property-set:template",
+                {"name": "template", "newvalue": "fedora-36", "oldvalue": "fedora-35"},
+            )
+            assert await read_event(reader) == ("test-vm", "domain-start", {})
+
+            # connection-established is only sent once the snapshot is ready
+            release_fetch.set()
+            assert await read_event(reader) == ("", "connection-established", {})
+
+        # with changes that happened during the fetch applied
+        snapshot = await get_snapshot(hub)
+        assert snapshot["properties"]["test-vm"]["template"] == "fedora-36"
+        assert not hub.refreshing
+        assert not hub.recorded_events
+
+        writer.close()
+        hub.stop()
+
+    asyncio.run(run_test())
+
+
+def test_hub_dispatcher_fallback(tmp_path):
+    dispatcher = HubEventsDispatcher(MockQubesComplete())
+    dispatcher.socket_path = str(tmp_path / "no-hub.sock")
+    assert dispatcher.get_snapshot() is None
+
+
+def test_property_cache_reconnected():
+    qapp = MockQubesComplete()
+    dispatcher = HubEventsDispatcher(qapp)
+    cache = VMPropertyCache(qapp, dispatcher)
+    vm = qapp.domains["test-vm"]
+    cache.set_storage(vm, 1, 2)
+
+    # after reconnecting, the snapshot is requested from the hub
+    snapshot = {"properties": {"test-vm": {"template": "fedora-35"}}, "storage": {}}
+    with mock.patch.object(dispatcher, "get_snapshot", return_value=snapshot):
+        dispatcher.handle(None, "connection-established")
+    assert cache.get_property(vm, "template") == "fedora-35"
+    assert cache.get_storage(vm) == (0, 0)
+
+
+def test_socket_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert get_socket_path() == str(tmp_path / "qui-event-hub.sock")
+
+    # no predictable fallback in a shared directory
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert get_socket_path() is None
+    dispatcher = HubEventsDispatcher(MockQubesComplete())
+    assert dispatcher.socket_path is None
+    assert dispatcher.get_snapshot() is None
+
+
+def test_event_hub_socket(tmp_path):
+    socket_path = str(tmp_path / "hub.sock")
+    hub = EventHub(MockQubesComplete(), socket_path=socket_path)
+    other_hub = EventHub(MockQubesComplete(), socket_path=socket_path)
+
+    async def run_test():
+        await hub.start()
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+        # a running hub is not replaced
+        with pytest.raises(HubAlreadyRunning):
+            await other_hub.start()
+        other_hub.stop()
+        assert os.path.exists(socket_path)
+
+        hub.stop()
+        assert not os.path.exists(socket_path)
+
+        # but a socket left behind by a dead one is
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(socket_path)
+        await other_hub.start()
+        other_hub.stop()
+
+    asyncio.run(run_test())
@@ -0,0 +1,69 @@
+# -*- encoding: utf8 -*-
+#
+# The Qubes OS Project, http://www.qubes-os.org
+#
+# Copyright (C) 2026 Marta Marczykowska-Górecka
+#                               <marmarta@invisiblethingslab.com>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation; either version 2.1 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License along
+# with this program; if not, see <http://www.gnu.org/licenses/>.
+# pylint: disable=missing-function-docstring
+# pylint: disable=missing-module-docstring
+from unittest import mock
+
+from qubesadmin.tests.mock_app import MockQubesComplete
+
+from qui.utils import VMPropertyCache
+
+
+def test_property_cache_reset_twice():
+    qapp = MockQubesComplete()
+    cache = VMPropertyCache(qapp)
+    cache.refresh_all()
+    vm = qapp.domains["test-vm"]
+
+    cache.property_changed(vm, "property-set:netvm", name="netvm", newvalue="sys-net")
+    assert cache.get_property(vm, "netvm") == "sys-net"
+
+    # a second reset before the property is fetched again must not fail
+    cache.property_changed(vm, "property-reset:netvm", name="netvm")
+    cache.property_changed(vm, "property-reset:netvm", name="netvm")
+
+    misses = cache.misses
+    cache.get_property(vm, "netvm")
+    assert cache.misses == misses + 1
+
+
+def test_property_cache_storage():
+    qapp = MockQubesComplete()
+    cache = VMPropertyCache(qapp)
+    vm = qapp.domains["test-vm"]
+
+    with mock.patch.object(
+        VMPropertyCache, "fetch_storage", return_value=(1, 2)
+    ) as mock_storage:
+        # storage info is only fetched when asked for
+        cache.refresh_all()
+        mock_storage.assert_not_called()
+        assert cache.get_property(vm, "template")
+
+        # and a miss does not block on qubesd
+        assert cache.get_storage(vm) == (0, 0)
+        mock_storage.assert_not_called()
+
+        cache.refresh_all([vm], storage=True)
+        assert mock_storage.call_count == 1
+        assert cache.get_storage(vm) == (1, 2)
+
+    cache.set_storage(vm, 3, 4)
+    assert cache.get_storage(vm) == (3, 4)
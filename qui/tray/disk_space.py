@@ -5,19 +5,41 @@ from .gtk3_xwayland_menu_dismisser import (
     get_fullscreen_window_hack,
 )  # isort:skip
 
+import array
+import asyncio
+import base64
+import concurrent.futures
+import json
+import os
 import sys
 import subprocess
-from typing import List
+import time
+from typing import Dict, List, Optional, Tuple
 
 import gi
-
-gi.require_version("Gtk", "3.0")  # isort:skip
-from gi.repository import Gtk, GObject, Gio, GLib  # isort:skip
-from qubesadmin import Qubes
+import qubesadmin
+import qubesadmin.events
 from qubesadmin.utils import size_to_human
 from qubesadmin import exc
 from qubesadmin.storage import Pool
 
+import qui.event_hub
+import qui.utils
+from qubes_config.widgets.gtk_utils import load_icon
+from qubes_config.widgets.profiler import setup_profiling
+
+gi.require_version("Gtk", "3.0")  # isort:skip
+from gi.repository import Gtk, Gio, GLib  # isort:skip
+
+try:
+    from gi.events import GLibEventLoopPolicy
+
+    asyncio.set_event_loop_policy(GLibEventLoopPolicy())
+except ImportError:
+    import gbulb
+
+    gbulb.install()
+
 import gettext
 
 t = gettext.translation("desktop-linux-manager", fallback=True)
@@ -27,46 +49,341 @@ _ = t.gettext
 WARN_LEVEL = 0.9
 URGENT_WARN_LEVEL = 0.95
 
+# how often (in seconds) pool and volume usage is re-fetched
+POLL_INTERVAL = 120
+# maximum number of concurrent qubesd calls used to fetch usage info
+POLL_WORKERS = 8
+
+# number of usage samples kept per pool/volume; with samples taken every
+# POLL_INTERVAL seconds, that's 12 hours of history
+HISTORY_SIZE = 360
+# how far back (in seconds) samples are used to compute fill rate
+RATE_WINDOW = 3600
+# warn if pool/volume is predicted to fill up in less than that (in seconds)
+PREDICTION_WARN_TIME = 6 * 3600
+HISTORY_FILE = os.path.join(GLib.get_user_cache_dir(), "qubes-disk-space.json")
+SPARKLINE_CHARS = "\u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
+
+
+class UsageRingBuffer:
+    """Fixed-size ring buffer of (timestamp, usage, metadata usage)
+    samples, with usage expressed as fraction of total size. Samples
+    are kept in flat arrays, so that the buffer is cheap to keep around
+    and to serialize."""
+
+    def __init__(self, size: int = HISTORY_SIZE):
+        self.size = size
+        self.timestamps = array.array("d", [0.0] * size)
+        self.usage = array.array("f", [0.0] * size)
+        self.metadata_usage = array.array("f", [0.0] * size)
+        # index of the oldest sample
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp: float, usage: float, metadata_usage: float = 0.0):
+        index = (self.start + self.count) % self.size
+        self.timestamps[index] = timestamp
+        self.usage[index] = usage
+        self.metadata_usage[index] = metadata_usage
+        if self.count < self.size:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.size
+
+    def _indices(self, last: Optional[int] = None):
+        count = self.count if last is None else min(last, self.count)
+        for i in range(self.count - count, self.count):
+            yield (self.start + i) % self.size
+
+    def samples(self, last: Optional[int] = None) -> List[Tuple[float, float, float]]:
+        """Return (up to last) samples, from the oldest one."""
+        return [
+            (self.timestamps[i], self.usage[i], self.metadata_usage[i])
+            for i in self._indices(last)
+        ]
+
+    @property
+    def last_timestamp(self) -> float:
+        if not self.count:
+            return 0.0
+        return self.timestamps[(self.start + self.count - 1) % self.size]
+
+    @property
+    def span(self) -> float:
+        """Number of seconds between the oldest and the newest sample."""
+        if not self.count:
+            return 0.0
+        return self.last_timestamp - self.timestamps[self.start]
+
+    def fill_rate(self, window: float = RATE_WINDOW) -> Tuple[float, float]:
+        """Return (usage, metadata usage) growth per second, computed with
+        least squares over samples from the last window seconds."""
+        since = self.last_timestamp - window
+        points = [sample for sample in self.samples() if sample[0] >= since]
+        if len(points) < 3 or points[-1][0] - points[0][0] < window / 6:
+            return 0.0, 0.0
+        mean_t = sum(p[0] for p in points) / len(points)
+        variance = sum((p[0] - mean_t) ** 2 for p in points)
+        if not variance:
+            return 0.0, 0.0
+        rates = []
+        for field in (1, 2):
+            mean_value = sum(p[field] for p in points) / len(points)
+            covariance = sum((p[0] - mean_t) * (p[field] - mean_value) for p in points)
+            rates.append(covariance / variance)
+        return rates[0], rates[1]
+
+    def time_to_full(self, window: float = RATE_WINDOW) -> Optional[float]:
+        """Return predicted number of seconds until either data or metadata
+        is full, or None if usage is not growing."""
+        if not self.count:
+            return None
+        last = (self.start + self.count - 1) % self.size
+        result = None
+        for rate, current in zip(
+            self.fill_rate(window), (self.usage[last], self.metadata_usage[last])
+        ):
+            if rate <= 0:
+                continue
+            remaining = max(0.0, 1 - current) / rate
+            if result is None or remaining < result:
+                result = remaining
+        return result
+
+    def sparkline(self, length: int = 24) -> str:
+        """Render usage of last samples as a string of block characters."""
+        samples = self.samples()
+        if not samples:
+            return ""
+        # each character represents the maximum of a group of samples
+        step = max(1, -(-len(samples) // length))
+        result = ""
+        for i in range(0, len(samples), step):
+            value = max(sample[1] for sample in samples[i : i + step])
+            value = min(max(value, 0.0), 1.0)
+            result += SPARKLINE_CHARS[
+                min(int(value * len(SPARKLINE_CHARS)), len(SPARKLINE_CHARS) - 1)
+            ]
+        return result
+
+    def to_dict(self) -> Dict[str, str]:
+        data = {}
+        for name in ("timestamps", "usage", "metadata_usage"):
+            source = getattr(self, name)
+            values = array.array(source.typecode, (source[i] for i in self._indices()))
+            data[name] = base64.b64encode(values.tobytes()).decode()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, str], size: int = HISTORY_SIZE):
+        buffer = cls(size)
+        arrays = []
+        for name in ("timestamps", "usage", "metadata_usage"):
+            values = array.array(getattr(buffer, name).typecode)
+            values.frombytes(base64.b64decode(data[name]))
+            arrays.append(values)
+        for sample in list(zip(*arrays))[-size:]:
+            buffer.append(*sample)
+        return buffer
+
+
+class UsageHistory:
+    """Collection of UsageRingBuffers for pools and volumes, persisted
+    across widget restarts."""
+
+    def __init__(self, path: Optional[str] = HISTORY_FILE):
+        self.path = path
+        self.buffers: Dict[str, UsageRingBuffer] = {}
+
+    @staticmethod
+    def pool_key(pool_name: str) -> str:
+        return f"pool:{pool_name}"
+
+    @staticmethod
+    def volume_key(vm_name: str, volume_name: str) -> str:
+        return f"volume:{vm_name}:{volume_name}"
+
+    def get(self, key: str) -> Optional[UsageRingBuffer]:
+        return self.buffers.get(key)
+
+    def record(
+        self, key: str, timestamp: float, usage: float, metadata_usage: float = 0.0
+    ) -> UsageRingBuffer:
+        if key not in self.buffers:
+            self.buffers[key] = UsageRingBuffer()
+        self.buffers[key].append(timestamp, usage, metadata_usage)
+        return self.buffers[key]
+
+    def time_to_full(self, key: str) -> Optional[float]:
+        buffer = self.buffers.get(key)
+        return buffer.time_to_full() if buffer else None
+
+    def remove_vm(self, vm_name: str):
+        prefix = self.volume_key(vm_name, "")
+        for key in [key for key in self.buffers if key.startswith(prefix)]:
+            del self.buffers[key]
+
+    def load(self):
+        """Load history saved by a previous run; samples older than
+        the buffer could hold are dropped."""
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+            oldest = time.time() - HISTORY_SIZE * POLL_INTERVAL
+            for key, buffer_data in data.items():
+                buffer = UsageRingBuffer.from_dict(buffer_data)
+                if buffer.last_timestamp >= oldest:
+                    self.buffers[key] = buffer
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # no history yet, or it's corrupted; start anew
+            self.buffers.clear()
+
+    def save(self):
+        if not self.path:
+            return
+        data = {key: buffer.to_dict() for key, buffer in self.buffers.items()}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+                json.dump(data, file)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            # history is a nice-to-have, don't bother the user
+            pass
+
+
+def format_time_left(seconds: float) -> str:
+    if seconds < 3600:
+        return _("{} minutes").format(max(1, int(seconds // 60)))
+    if seconds < 2 * 86400:
+        return _("{} hours").format(int(seconds // 3600))
+    return _("{} days").format(int(seconds // 86400))
+
 
 class VMUsage:
-    def __init__(self, vm):
+    def __init__(self, vm, check=True, history: Optional[UsageHistory] = None):
         self.vm = vm
+        self.history = history
         self.problem_volumes = {}
+        # volume name -> (size, usage), as of the last check
+        self.volume_data: Dict[str, Tuple[int, int]] = {}
+        # volume name -> predicted number of seconds until it's full
+        self.time_to_full: Dict[str, float] = {}
+        # determined on first fetch, qubes do not change their class
+        self.volumes_to_check: Optional[List[str]] = None
 
-        self.check_usage()
+        if check:
+            self.check_usage()
 
     def check_usage(self):
-        self.problem_volumes = {}
-        volumes_to_check = ["private"]
-        if not hasattr(self.vm, "template"):
-            volumes_to_check.append("root")
-        for volume_name in volumes_to_check:
+        self.apply_usage(self.fetch_usage())
+
+    def fetch_usage(self) -> Dict[str, Tuple[int, int]]:
+        """Get size and usage of watched volumes from qubesd. Does not
+        touch already collected data, so it can be called from worker
+        threads."""
+        if self.volumes_to_check is None:
+            volumes_to_check = ["private"]
+            if not hasattr(self.vm, "template"):
+                volumes_to_check.append("root")
+            self.volumes_to_check = volumes_to_check
+        result = {}
+        for volume_name in self.volumes_to_check:
             try:
                 if volume_name in self.vm.volumes:
-                    size = self.vm.volumes[volume_name].size
-                    usage = self.vm.volumes[volume_name].usage
-                    if size > 0 and usage / size > WARN_LEVEL:
-                        self.problem_volumes[volume_name] = usage / size
+                    volume = self.vm.volumes[volume_name]
+                    result[volume_name] = (volume.size, volume.usage)
             except exc.QubesDaemonAccessError:
                 continue
+        return result
+
+    def apply_usage(
+        self,
+        volume_data: Dict[str, Tuple[int, int]],
+        timestamp: Optional[float] = None,
+    ) -> bool:
+        """Store data returned by fetch_usage, and record it in usage
+        history; returns True if anything changed."""
+        timestamp = timestamp or time.time()
+        problem_volumes = {}
+        self.time_to_full = {}
+        for volume_name, (size, usage) in volume_data.items():
+            if size <= 0:
+                continue
+            time_to_full = None
+            if self.history is not None:
+                key = UsageHistory.volume_key(self.vm.name, volume_name)
+                time_to_full = self.history.record(
+                    key, timestamp, usage / size
+                ).time_to_full()
+            if time_to_full is not None:
+                self.time_to_full[volume_name] = time_to_full
+            if usage / size > WARN_LEVEL or (
+                time_to_full is not None and time_to_full < PREDICTION_WARN_TIME
+            ):
+                problem_volumes[volume_name] = usage / size
+
+        if volume_data == self.volume_data and problem_volumes == self.problem_volumes:
+            return False
+        self.volume_data = volume_data
+        self.problem_volumes = problem_volumes
+        return True
 
 
 class VMUsageData:
-    def __init__(self, qubes_app):
+    def __init__(
+        self, qubes_app, populate=True, history: Optional[UsageHistory] = None
+    ):
         self.qubes_app = qubes_app
-        self.problematic_vms = []
+        self.history = history
+        # running qube name -> VMUsage; kept up to date with domain-start
+        # and domain-shutdown events
+        self.running_vms: Dict[str, VMUsage] = {}
 
-        self.__populate_vms()
+        if populate:
+            self.__populate_vms()
 
     def __populate_vms(self):
-        for vm in self.qubes_app.domains:
+        for vm in self.find_running(self.qubes_app):
+            self.running_vms[vm.name] = VMUsage(vm, history=self.history)
+
+    @staticmethod
+    def find_running(qubes_app) -> list:
+        """List all running qubes. It's the only place where all qubes are
+        checked, and it's needed only on startup and after reconnecting
+        to qubesd."""
+        result = []
+        for vm in qubes_app.domains:
             try:
                 if vm.is_running():
-                    usage_data = VMUsage(vm)
-                    if usage_data.problem_volumes:
-                        self.problematic_vms.append(usage_data)
+                    result.append(vm)
             except (exc.QubesPropertyAccessError, exc.QubesVMNotFoundError):
                 continue
+        return result
+
+    @property
+    def problematic_vms(self) -> List[VMUsage]:
+        return [
+            usage_data
+            for usage_data in self.running_vms.values()
+            if usage_data.problem_volumes
+        ]
+
+    def add_vm(self, vm) -> VMUsage:
+        """Start watching a qube; usage data is fetched on next refresh."""
+        if vm.name not in self.running_vms:
+            self.running_vms[vm.name] = VMUsage(vm, check=False, history=self.history)
+        return self.running_vms[vm.name]
+
+    def remove_vm(self, vm_name: str) -> bool:
+        """Stop watching a qube; returns True if it had any warnings."""
+        usage_data = self.running_vms.pop(vm_name, None)
+        return bool(usage_data and usage_data.problem_volumes)
 
     def get_vms_widgets(self):
         for vm_usage in self.problematic_vms:
@@ -81,10 +398,7 @@ class VMUsageData:
             icon = getattr(vm, "icon", vm.label.icon)
         except exc.QubesPropertyAccessError:
             icon = "appvm-black"
-        icon_vm = Gtk.IconTheme.get_default().load_icon(
-            icon, 16, Gtk.IconLookupFlags.FORCE_SIZE
-        )
-        icon_img = Gtk.Image.new_from_pixbuf(icon_vm)
+        icon_img = Gtk.Image.new_from_pixbuf(load_icon(icon, 16, 16))
 
         # description widget
         label_widget = Gtk.Label(xalign=0)
@@ -93,9 +407,12 @@ class VMUsageData:
 
         for volume_name, usage in vm_usage.problem_volumes.items():
             # pylint: disable=consider-using-f-string
-            label_contents.append(
-                _("volume <b>{}</b> is {:.1%} full").format(volume_name, usage)
-            )
+            text = _("volume <b>{}</b> is {:.1%} full").format(volume_name, usage)
+            if volume_name in vm_usage.time_to_full:
+                text += _(" (full in ~{})").format(
+                    format_time_left(vm_usage.time_to_full[volume_name])
+                )
+            label_contents.append(text)
 
         label_text = f"<b>{vm.name}</b>: " + ", ".join(label_contents)
         label_widget.set_markup(label_text)
@@ -180,6 +497,23 @@ class PoolWrapper:
         else:
             self.metadata_perc = 0
 
+        # filled in by PoolUsageData, if usage history is available
+        self.history: Optional[UsageRingBuffer] = None
+        self.time_to_full: Optional[float] = None
+
+    @property
+    def state(self) -> tuple:
+        """Everything that is shown about the pool, for change detection."""
+        return (
+            self.name,
+            self.has_error,
+            self.size,
+            self.usage,
+            self.metadata_size,
+            self.metadata_usage,
+            "included_in" in self.config,
+        )
+
     def _get_attribute(self, attribute_name, default):
         try:
             return getattr(self.pool, attribute_name, default)
@@ -189,23 +523,60 @@ class PoolWrapper:
 
 
 class PoolUsageData:
-    def __init__(self, qubes_app):
+    def __init__(
+        self,
+        qubes_app,
+        pools: Optional[List[PoolWrapper]] = None,
+        history: Optional[UsageHistory] = None,
+    ):
         self.qubes_app = qubes_app
+        self.history = history
 
         self.pools: List[PoolWrapper] = []
         self.total_size = 0
         self.used_size = 0
         self.warning_message = []
 
-        self.__populate_pools()
+        if pools is None:
+            pools = self.fetch_pools(self.qubes_app)
+        self.__populate_pools(pools)
 
-    def __populate_pools(self):
+    @staticmethod
+    def fetch_pools(qubes_app) -> List[PoolWrapper]:
+        """Get data of all pools from qubesd, to be passed to update()."""
         try:
-            pools = sorted(self.qubes_app.pools.values())
+            pools = sorted(qubes_app.pools.values())
         except exc.QubesDaemonAccessError:
             pools = []
-        for pool in pools:
-            wrapped_pool = PoolWrapper(pool)
+        return [PoolWrapper(pool) for pool in pools]
+
+    def update(
+        self, pools: List[PoolWrapper], timestamp: Optional[float] = None
+    ) -> bool:
+        """Replace pool data with data returned by fetch_pools, and record
+        it in usage history; returns True if anything changed."""
+        if self.history is not None:
+            timestamp = timestamp or time.time()
+            for pool in pools:
+                if pool.has_error or not pool.size or "included_in" in pool.config:
+                    continue
+                self.history.record(
+                    UsageHistory.pool_key(pool.name),
+                    timestamp,
+                    pool.usage_perc,
+                    pool.metadata_perc,
+                )
+
+        old_state = [p.state for p in self.pools], self.warning_message
+        self.pools = []
+        self.total_size = 0
+        self.used_size = 0
+        self.warning_message = []
+        self.__populate_pools(pools)
+        return old_state != ([p.state for p in self.pools], self.warning_message)
+
+    def __populate_pools(self, pools: List[PoolWrapper]):
+        for wrapped_pool in pools:
             self.pools.append(wrapped_pool)
 
             if wrapped_pool.has_error:
@@ -220,6 +591,13 @@ class PoolUsageData:
             self.total_size += wrapped_pool.size
             self.used_size += wrapped_pool.usage
 
+            if self.history is not None:
+                wrapped_pool.history = self.history.get(
+                    UsageHistory.pool_key(wrapped_pool.name)
+                )
+                if wrapped_pool.history:
+                    wrapped_pool.time_to_full = wrapped_pool.history.time_to_full()
+
             if wrapped_pool.usage_perc >= URGENT_WARN_LEVEL:
                 self.warning_message.append(
                     _("\n{:.1%} space left in pool {}").format(
@@ -236,6 +614,17 @@ class PoolUsageData:
                     ).format(wrapped_pool.name, wrapped_pool.metadata_perc)
                 )
 
+            if (
+                wrapped_pool.time_to_full is not None
+                and wrapped_pool.time_to_full < PREDICTION_WARN_TIME
+            ):
+                self.warning_message.append(
+                    _("\nPool {} is predicted to fill up in ~{}").format(
+                        wrapped_pool.name,
+                        format_time_left(wrapped_pool.time_to_full),
+                    )
+                )
+
     def get_pools_widgets(self):
         for p in self.pools:
             yield self.__create_box(p)
@@ -253,6 +642,7 @@ class PoolUsageData:
         name_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         percentage_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         usage_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        history_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
 
         pool_name = Gtk.Label(xalign=0)
 
@@ -272,14 +662,14 @@ class PoolUsageData:
         name_box.pack_start(pool_name, True, True, 0)
 
         if not pool.size or "included_in" in pool.config:
-            return name_box, percentage_box, usage_box
+            return name_box, percentage_box, usage_box, history_box
 
         if pool.has_error:
             error_desc = Gtk.Label(xalign=0)
             error_desc.set_markup("Error accessing pool data")
             error_desc.set_margin_left(40)
             name_box.pack_start(error_desc, True, True, 0)
-            return name_box, percentage_box, usage_box
+            return name_box, percentage_box, usage_box, history_box
 
         data_name = Gtk.Label(xalign=0)
         data_name.set_markup("data")
@@ -320,7 +710,34 @@ class PoolUsageData:
         usage_box.pack_start(numeric_label, True, True, 0)
         usage_box.pack_start(Gtk.Label(), True, True, 0)
 
-        return name_box, percentage_box, usage_box
+        if pool.history:
+            # usage history, already in memory, so no qubesd calls needed
+            sparkline = Gtk.Label(xalign=0)
+            sparkline.set_text(pool.history.sparkline())
+            sparkline.set_tooltip_text(
+                _("Pool usage over the last {}").format(
+                    format_time_left(pool.history.span)
+                )
+            )
+
+            usage_rate, metadata_rate = pool.history.fill_rate()
+            rate = max(usage_rate, metadata_rate)
+            # pylint: disable=consider-using-f-string
+            trend_text = "{:+.2%}/h".format(rate * 3600)
+            if pool.time_to_full is not None:
+                trend_text += _(", full in ~{}").format(
+                    format_time_left(pool.time_to_full)
+                )
+                if pool.time_to_full < PREDICTION_WARN_TIME:
+                    trend_text = f"<span color='red'>{trend_text}</span>"
+            trend = Gtk.Label(xalign=0)
+            trend.set_markup(f"<span color='grey'><i>{trend_text}</i></span>")
+
+            history_box.pack_start(Gtk.Label(), True, True, 0)
+            history_box.pack_start(sparkline, True, True, 0)
+            history_box.pack_start(trend, True, True, 0)
+
+        return name_box, percentage_box, usage_box, history_box
 
 
 def colored_percentage(value):
@@ -350,14 +767,27 @@ def emit_notification(gtk_app, title, text, vm=None):
 
 
 class DiskSpace(Gtk.Application):
-    def __init__(self, **properties):
+    def __init__(self, qapp, dispatcher, **properties):
         super().__init__(**properties)
 
         self.fullscreen_window_hack = get_fullscreen_window_hack()
         self.pool_warned = False
         self.vms_warned = set()
 
-        self.qubes_app = Qubes()
+        self.qubes_app = qapp
+        self.dispatcher = dispatcher
+
+        # persistent usage snapshot, refreshed by poll_usage task; menu and
+        # icon are built from it without any qubesd calls
+        self.history = UsageHistory()
+        self.history.load()
+        self.pool_data = PoolUsageData(self.qubes_app, pools=[], history=self.history)
+        self.vm_data = VMUsageData(self.qubes_app, populate=False, history=self.history)
+        self.poll_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=POLL_WORKERS
+        )
+        self.poll_wakeup = asyncio.Event()
+        self.running_scan_needed = True
 
         self.set_application_id("org.qubes.qui.tray.DiskSpace")
         self.register()
@@ -370,17 +800,110 @@ class DiskSpace(Gtk.Application):
 
         self.icon = Gtk.StatusIcon()
         self.icon.connect("button-press-event", self.make_menu)
-        self.refresh_icon()
+        self.set_icon_state()
+
+        self.connect_events()
+
+    def connect_events(self):
+        self.dispatcher.add_handler("domain-start", self.domain_started)
+        self.dispatcher.add_handler("domain-shutdown", self.domain_stopped)
+        self.dispatcher.add_handler("domain-delete", self.domain_deleted)
+        self.dispatcher.add_handler("connection-established", self.reconnected)
+
+    def domain_started(self, vm, _event, **_kwargs):
+        usage_data = self.vm_data.add_vm(vm)
+        asyncio.ensure_future(self.refresh_usage([usage_data]))
+
+    def domain_stopped(self, vm, _event, **_kwargs):
+        self._forget_vm(str(vm))
+
+    def domain_deleted(self, _submitter, _event, vm, **_kwargs):
+        self._forget_vm(str(vm))
+        self.history.remove_vm(str(vm))
+
+    def _forget_vm(self, vm_name):
+        self.vms_warned = {vm for vm in self.vms_warned if vm.name != vm_name}
+        if self.vm_data.remove_vm(vm_name):
+            self.refresh_icon()
+
+    def reconnected(self, _subject, _event, **_kwargs):
+        # events might have been lost while disconnected
+        self.vm_data.running_vms.clear()
+        self.running_scan_needed = True
+        self.poll_wakeup.set()
+
+    async def poll_usage(self):
+        """Refresh pool and running qubes' volume usage every POLL_INTERVAL
+        seconds. Admin calls are run concurrently in a bounded thread pool;
+        the list of running qubes is only fetched on startup and after
+        reconnecting, afterwards it's maintained by events."""
+        loop = asyncio.get_event_loop()
+        while True:
+            self.poll_wakeup.clear()
+            if self.running_scan_needed:
+                self.running_scan_needed = False
+                try:
+                    running = await loop.run_in_executor(
+                        self.poll_executor,
+                        VMUsageData.find_running,
+                        self.qubes_app,
+                    )
+                except exc.QubesException:
+                    running = []
+                for vm in running:
+                    self.vm_data.add_vm(vm)
+
+            await self.refresh_usage()
+
+            try:
+                await asyncio.wait_for(self.poll_wakeup.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def refresh_usage(self, vm_usages: Optional[List[VMUsage]] = None):
+        """Fetch usage of provided qubes or, if none are provided, of all
+        pools and running qubes, and update icon if anything changed."""
+        loop = asyncio.get_event_loop()
+        fetch_pools = vm_usages is None
+        if vm_usages is None:
+            vm_usages = list(self.vm_data.running_vms.values())
+
+        futures = [
+            loop.run_in_executor(self.poll_executor, usage_data.fetch_usage)
+            for usage_data in vm_usages
+        ]
+        if fetch_pools:
+            futures.append(
+                loop.run_in_executor(
+                    self.poll_executor, PoolUsageData.fetch_pools, self.qubes_app
+                )
+            )
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+        changed = False
+        if fetch_pools:
+            pools = results.pop()
+            if not isinstance(pools, BaseException):
+                changed = self.pool_data.update(pools)
 
-        GObject.timeout_add_seconds(120, self.refresh_icon)
+        for usage_data, result in zip(vm_usages, results):
+            if isinstance(result, BaseException):
+                # connection problems or qube removed in the meantime
+                continue
+            if self.vm_data.running_vms.get(usage_data.vm.name) is not usage_data:
+                # qube shut down in the meantime
+                continue
+            changed = usage_data.apply_usage(result) or changed
 
-        Gtk.main()
+        if fetch_pools:
+            self.history.save()
+
+        if changed:
+            self.refresh_icon()
 
     def refresh_icon(self):
-        pool_data = PoolUsageData(self.qubes_app)
-        vm_data = VMUsageData(self.qubes_app)
-        pool_warning = pool_data.get_warning()
-        vm_warning = vm_data.problematic_vms
+        pool_warning = self.pool_data.get_warning()
+        vm_warning = self.vm_data.problematic_vms
 
         # set icon
         self.set_icon_state(pool_warning=pool_warning, vm_warning=vm_warning)
@@ -418,8 +941,6 @@ class DiskSpace(Gtk.Application):
         else:
             self.vms_warned = set()
 
-        return True  # needed for Gtk to correctly loop the function
-
     def set_icon_state(self, pool_warning=None, vm_warning=None):
         if pool_warning or vm_warning:
             self.icon.set_from_icon_name("qui-disk-space-warn")
@@ -440,8 +961,8 @@ class DiskSpace(Gtk.Application):
             )
 
     def make_menu(self, _unused, _event):
-        pool_data = PoolUsageData(self.qubes_app)
-        vm_data = VMUsageData(self.qubes_app)
+        pool_data = self.pool_data
+        vm_data = self.vm_data
 
         menu = Gtk.Menu()
         self.fullscreen_window_hack.show_for_widget(menu)
@@ -452,10 +973,11 @@ class DiskSpace(Gtk.Application):
 
         grid = Gtk.Grid()
         col_no = 0
-        for label1, label2, label3 in pool_data.get_pools_widgets():
+        for label1, label2, label3, label4 in pool_data.get_pools_widgets():
             grid.attach(label1, 0, col_no, 1, 1)
             grid.attach(label2, 1, col_no, 1, 1)
             grid.attach(label3, 2, col_no, 1, 1)
+            grid.attach(label4, 3, col_no, 1, 1)
             col_no += 1
 
         grid.set_column_spacing(20)
@@ -527,8 +1049,20 @@ class DiskSpace(Gtk.Application):
 
 
 def main():
-    app = DiskSpace()
-    app.run()
+    setup_profiling()
+    qapp = qubesadmin.Qubes()
+    dispatcher = qui.event_hub.HubEventsDispatcher(qapp)
+    app = DiskSpace(qapp, dispatcher)
+
+    loop = asyncio.get_event_loop()
+    tasks = [
+        asyncio.ensure_future(dispatcher.listen_for_events()),
+        asyncio.ensure_future(app.poll_usage()),
+    ]
+
+    return qui.utils.run_asyncio_and_show_errors(
+        loop, tasks, "Qubes Disk Space Monitor"
+    )
 
 
 if __name__ == "__main__":
@@ -9,6 +9,8 @@ from .gtk3_xwayland_menu_dismisser import (
 )  # isort:skip
 
 import asyncio
+import bisect
+import concurrent.futures
 import os
 import sys
 import traceback
@@ -20,10 +22,13 @@ import qubesadmin.events
 from qubesadmin import exc
 
 import qui.decorators
+import qui.event_hub
 import qui.utils
+from qubes_config.widgets.gtk_utils import load_icon
+from qubes_config.widgets.profiler import setup_profiling
 
 gi.require_version("Gtk", "3.0")  # isort:skip
-from gi.repository import Gdk, Gio, Gtk, GLib, GdkPixbuf  # isort:skip
+from gi.repository import Gdk, Gio, Gtk, GLib  # isort:skip
 
 try:
     from gi.events import GLibEventLoopPolicy
@@ -50,6 +55,15 @@ STATE_DICTIONARY = {
     "domain-shutdown-failed": "Running",
 }
 
+# how often (in seconds) storage info in tooltips is refreshed while the menu is
+# open; while the menu is closed, refreshing is paused
+STORAGE_POLL_INTERVAL = 10
+# maximum number of concurrent qubesd calls used to fetch storage info
+STORAGE_POLL_WORKERS = 8
+# how many times per second memory/CPU stats are rendered while the menu is
+# open; while it's closed, only the latest sample per qube is kept
+STATS_FLUSH_RATE = 2
+
 
 class IconCache:
     def __init__(self):
@@ -65,22 +79,10 @@ class IconCache:
             "debug": "bug-play",
             "logs": "scroll-text",
         }
-        self.icons = {}
 
     def get_icon(self, icon_name):
-        if icon_name in self.icons:
-            icon = self.icons[icon_name]
-        else:
-            try:
-                icon = Gtk.IconTheme.get_default().load_icon(
-                    self.icon_files[icon_name], 16, Gtk.IconLookupFlags.FORCE_SIZE
-                )
-                self.icons[icon_name] = icon
-            except (TypeError, GLib.Error):
-                icon = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, 16, 16)
-                icon.fill(0)
-                self.icons[icon_name] = icon
-        return icon
+        # pixbufs are cached process-wide by load_icon
+        return load_icon(self.icon_files[icon_name], 16, 16)
 
 
 def show_error(title, text):
@@ -544,6 +546,33 @@ class InternalInfoItem(Gtk.MenuItem):
         self.set_sensitive(False)
 
 
+def get_existing_logs(vm):
+    """List (name, path) of log files of a given qube that exist."""
+    logs = [
+        (
+            _("Console Log"),
+            "/var/log/xen/console/guest-" + vm.name + ".log",
+        ),
+        (
+            _("QEMU Console Log"),
+            "/var/log/xen/console/guest-" + vm.name + "-dm.log",
+        ),
+    ]
+    return [(name, path) for name, path in logs if os.path.isfile(path)]
+
+
+def update_dynamic_labels(menu, shift_pressed):
+    """Update labels of submenu items that depend on Shift key state."""
+
+    def do_emit(child):
+        if isinstance(child, RunTerminalItem):
+            child.set_as_root(shift_pressed)
+        if isinstance(child, (RestartItem, ShutdownItem)):
+            child.set_force(shift_pressed)
+
+    menu.foreach(do_emit)
+
+
 class StartedMenu(Gtk.Menu):
     """The sub-menu for a started domain"""
 
@@ -610,20 +639,8 @@ class DebugMenu(Gtk.Menu):
 
         self.add(PreferencesItem(self.vm, icon_cache))
 
-        logs = [
-            (
-                _("Console Log"),
-                "/var/log/xen/console/guest-" + vm.name + ".log",
-            ),
-            (
-                _("QEMU Console Log"),
-                "/var/log/xen/console/guest-" + vm.name + "-dm.log",
-            ),
-        ]
-
-        for name, path in logs:
-            if os.path.isfile(path):
-                self.add(LogItem(name, path, icon_cache=icon_cache))
+        for name, path in get_existing_logs(vm):
+            self.add(LogItem(name, path, icon_cache=icon_cache))
 
         self.add(KillItem(self.vm, icon_cache))
 
@@ -646,20 +663,8 @@ class InternalMenu(Gtk.Menu):
 
         self.add(InternalInfoItem(is_preload=is_preload))
 
-        logs = [
-            (
-                _("Console Log"),
-                "/var/log/xen/console/guest-" + vm.name + ".log",
-            ),
-            (
-                _("QEMU Console Log"),
-                "/var/log/xen/console/guest-" + vm.name + "-dm.log",
-            ),
-        ]
-
-        for name, path in logs:
-            if os.path.isfile(path):
-                self.add(LogItem(name, path, icon_cache=icon_cache))
+        for name, path in get_existing_logs(vm):
+            self.add(LogItem(name, path, icon_cache=icon_cache))
 
         if working_correctly:
             self.add(ShutdownItem(self.vm, icon_cache))
@@ -709,7 +714,14 @@ class DomainMenuItem(Gtk.MenuItem):
         self.vm = vm
         self.app = app
         self.icon_cache = icon_cache
-        self.decorator = qui.decorators.DomainDecorator(vm)
+        # submenus are built lazily, when the item is first selected, and
+        # then reused; see _build_submenu
+        self.submenus = {}
+        self.submenu_state = None
+        self.submenu_outdated = False
+        self.decorator = qui.decorators.DomainDecorator(
+            vm, property_cache=app.property_cache
+        )
 
         # Main horizontal box
         self.hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
@@ -757,26 +769,67 @@ class DomainMenuItem(Gtk.MenuItem):
                     self.update_state(state)
 
     def _set_submenu(self, state):
+        self.submenu_state = state
+        self.submenu_outdated = True
+        current_submenu = self.get_submenu()
+        if current_submenu is None:
+            # empty placeholder, so that the submenu indicator is shown
+            self.set_submenu(Gtk.Menu())
+        elif current_submenu.get_mapped():
+            # the submenu is open right now, it must be updated immediately
+            self._build_submenu()
+
+    def do_select(self):  # pylint: disable=arguments-differ
+        try:
+            self._build_submenu()
+        finally:
+            Gtk.MenuItem.do_select(self)
+
+    def _build_submenu(self):
+        if not self.submenu_outdated:
+            return
+        self.submenu_outdated = False
+        state = self.submenu_state
+
         if self.vm.features.get("internal", False):
             is_preload = getattr(self.vm, "is_preload", False)
-            submenu = InternalMenu(
-                self.vm,
-                self.icon_cache,
-                working_correctly=(state == "Running"),
-                is_preload=is_preload,
-            )
-        elif state == "Running":
-            submenu = StartedMenu(self.vm, self.app, self.icon_cache)
-        elif state == "Paused":
-            submenu = PausedMenu(self.vm, self.icon_cache)
+            logs = tuple(get_existing_logs(self.vm))
+            key = ("internal", state == "Running", is_preload, logs)
+        elif state in ("Running", "Paused"):
+            key = (state,)
+        else:
+            key = ("debug", tuple(get_existing_logs(self.vm)))
+
+        submenu = self.submenus.get(key)
+        if submenu is None:
+            if key[0] == "internal":
+                submenu = InternalMenu(
+                    self.vm,
+                    self.icon_cache,
+                    working_correctly=(state == "Running"),
+                    is_preload=key[2],
+                )
+            elif state == "Running":
+                submenu = StartedMenu(self.vm, self.app, self.icon_cache)
+            elif state == "Paused":
+                submenu = PausedMenu(self.vm, self.icon_cache)
+            else:
+                submenu = DebugMenu(self.vm, self.icon_cache)
+            submenu.connect("key-press-event", self.app.key_event)
+            submenu.connect("key-release-event", self.app.key_event)
+            self.submenus[key] = submenu
         else:
-            submenu = DebugMenu(self.vm, self.icon_cache)
-        submenu.connect("key-press-event", self.app.key_event)
-        submenu.connect("key-release-event", self.app.key_event)
+            # only patch the parts that could have changed since last use
+            update_dynamic_labels(submenu, self.app.shift_pressed)
+            if isinstance(submenu, StartedMenu):
+                submenu.debug_console_update()
+
+        current_submenu = self.get_submenu()
+        if current_submenu is submenu:
+            return
         # This is a workaround for a bug in Gtk which occurs when a
         # submenu is replaced while it is open.
         # see https://gitlab.gnome.org/GNOME/gtk/issues/885
-        current_submenu = self.get_submenu()
         if current_submenu:
             current_submenu.grab_remove()
         self.set_submenu(submenu)
@@ -865,16 +918,33 @@ class DomainTray(Gtk.Application):
         self.tray_menu.connect("key-release-event", self.key_event)
 
         self.icon_cache = IconCache()
+        self.property_cache = qui.utils.VMPropertyCache(qapp, dispatcher)
 
         self.menu_items = {}
+        # names of non-AdminVM qubes, in the order they are in the menu
+        self.sorted_names = []
+        # number of AdminVM items, placed between the header and other qubes
+        self.admin_vm_count = 0
+        # template name -> names of qubes based on it, and the reverse
+        self.template_dependents = {}
+        self.vm_templates = {}
 
         self.unpause_all_action = Gio.SimpleAction.new("do-unpause-all", None)
         self.unpause_all_action.connect("activate", self.do_unpause_all)
         self.add_action(self.unpause_all_action)
         self.pause_notification_out = False
 
-        # add refreshing tooltips with storage info
-        GLib.timeout_add_seconds(120, self.refresh_tooltips)
+        # storage info in tooltips is refreshed by poll_storage task
+        self.storage_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=STORAGE_POLL_WORKERS
+        )
+        self.storage_poll_wakeup = asyncio.Event()
+        self.tray_menu.connect("map", self._menu_mapped)
+
+        # latest vm-stats sample per qube, not yet rendered
+        self.pending_stats = {}
+        # GLib source id of the scheduled flush_stats call, if any
+        self.stats_flush_source = None
 
         self.register_events()
         self.set_application_id(app_name)
@@ -921,6 +991,7 @@ class DomainTray(Gtk.Application):
             "domain-feature-delete:updates-available", self.feature_change
         )
         self.dispatcher.add_handler("property-set:netvm", self.property_change)
+        self.dispatcher.add_handler("property-set:template", self.property_change)
         self.dispatcher.add_handler("property-set:label", self.property_change)
 
         self.dispatcher.add_handler("property-set:debug", self.debug_change)
@@ -1057,9 +1128,8 @@ class DomainTray(Gtk.Application):
 
     def add_domain_item(self, _submitter, event, vm, **_kwargs):
         """Add a DomainMenuItem to menu; if event is None, this was fired
-        manually (mot due to domain-add event, and it is assumed the menu items
-        are created in alphabetical order. Otherwise, this method will
-        attempt to sort menu items correctly."""
+        manually (not due to domain-add event). Menu items are kept sorted
+        alphabetically, with the position found by bisecting sorted_names."""
         # check if it already exists
         try:
             vm = self.qapp.domains[str(vm)]
@@ -1084,33 +1154,41 @@ class DomainTray(Gtk.Application):
                 state = "Halted"
 
         domain_item = DomainMenuItem(vm, self, self.icon_cache, state=state)
-        if not event:  # menu item creation at widget start; we can assume
-            # menu items are created in alphabetical order
-            self.tray_menu.add(domain_item)
+        # the first item is the header, followed by AdminVM(s) and then all
+        # other qubes in alphabetical order
+        if vm.klass == "AdminVM":
+            position = 1 + self.admin_vm_count
+            self.admin_vm_count += 1
         else:
-            position = 0
-            for i in self.tray_menu:  # pylint: disable=not-an-iterable
-                if not hasattr(i, "vm"):  # we reached the end
-                    break
-                if not i.vm:  # header should be skipper
-                    position += 1
-                    continue
-                if i.vm.klass == "AdminVM":
-                    # AdminVM(s) should be skipped
-                    position += 1
-                    continue
-                if i.vm.name > vm.name:
-                    # we reached correct alphabetical placement for the VM
-                    break
-                position += 1
-            self.tray_menu.insert(domain_item, position)
+            index = bisect.bisect(self.sorted_names, vm.name)
+            self.sorted_names.insert(index, vm.name)
+            position = 1 + self.admin_vm_count + index
+            self._add_template_dependent(vm)
+        self.tray_menu.insert(domain_item, position)
         self.menu_items[vm] = domain_item
 
-    def property_change(self, vm, event, *_args, **_kwargs):
+    def _add_template_dependent(self, vm):
+        template = self.property_cache.get_property(vm, "template")
+        self.vm_templates[vm.name] = template
+        if template:
+            self.template_dependents.setdefault(template, set()).add(vm.name)
+
+    def _remove_template_dependent(self, vm_name):
+        template = self.vm_templates.pop(vm_name, None)
+        if template in self.template_dependents:
+            self.template_dependents[template].discard(vm_name)
+
+    def property_change(self, vm, event, *args, **kwargs):
         if vm not in self.menu_items:
             return
+        # make sure the snapshot is fresh, regardless of handler order
+        self.property_cache.property_changed(vm, event, *args, **kwargs)
         if event == "property-set:netvm":
             self.menu_items[vm].name.update_tooltip(netvm_changed=True)
+        elif event == "property-set:template":
+            self._remove_template_dependent(str(vm))
+            self._add_template_dependent(vm)
+            self.menu_items[vm].name.update_tooltip()
         elif event == "property-set:label":
             self.menu_items[vm].set_label_icon()
 
@@ -1119,13 +1197,65 @@ class DomainTray(Gtk.Application):
             return
         self.menu_items[vm].name.update_updateable()
 
-    def refresh_tooltips(self):
-        for item in self.menu_items.values():
-            if item.vm and item.is_visible():
-                try:
-                    item.name.update_tooltip(storage_changed=True)
-                except Exception:  # pylint: disable=broad-except
-                    pass
+    def _menu_mapped(self, *_args):
+        # wake up storage polling, it's paused while the menu is closed
+        self.storage_poll_wakeup.set()
+        # render stats collected while the menu was closed; a flush still
+        # scheduled from before is not needed anymore
+        if self.stats_flush_source is not None:
+            GLib.source_remove(self.stats_flush_source)
+        self.flush_stats()
+
+    async def poll_storage(self):
+        """Refresh storage info shown in tooltips of visible qubes. Admin
+        calls are run concurrently in a bounded thread pool, and results
+        are applied in a single idle callback. Polling happens every
+        STORAGE_POLL_INTERVAL seconds while the menu is open and is paused
+        while it is closed."""
+        loop = asyncio.get_event_loop()
+        while True:
+            self.storage_poll_wakeup.clear()
+            if not self.tray_menu.get_mapped():
+                await self.storage_poll_wakeup.wait()
+                continue
+
+            vms = [
+                item.vm
+                for item in self.menu_items.values()
+                if item.vm and item.is_visible() and item.vm.klass != "AdminVM"
+            ]
+            results = await asyncio.gather(
+                *[
+                    loop.run_in_executor(
+                        self.storage_executor,
+                        qui.utils.VMPropertyCache.fetch_storage,
+                        vm,
+                    )
+                    for vm in vms
+                ],
+                return_exceptions=True,
+            )
+            GLib.idle_add(self.refresh_tooltips, dict(zip(vms, results)))
+
+            try:
+                await asyncio.wait_for(
+                    self.storage_poll_wakeup.wait(), STORAGE_POLL_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def refresh_tooltips(self, storage):
+        """Apply storage info fetched by poll_storage to tooltips."""
+        for vm, result in storage.items():
+            if isinstance(result, BaseException) or vm not in self.menu_items:
+                # qube removed in the meantime or connection problems
+                continue
+            self.property_cache.set_storage(vm, *result)
+            try:
+                self.menu_items[vm].name.update_tooltip(storage_changed=True)
+            except Exception:  # pylint: disable=broad-except
+                pass
+        return False
 
     def remove_domain_item(self, _submitter, _event, vm, **_kwargs):
         if vm not in self.menu_items:
@@ -1134,12 +1264,30 @@ class DomainTray(Gtk.Application):
         self.tray_menu.remove(vm_widget)
         del self.menu_items[vm]
 
+        vm_name = str(vm)
+        self.pending_stats.pop(vm_name, None)
+        index = bisect.bisect_left(self.sorted_names, vm_name)
+        if index < len(self.sorted_names) and self.sorted_names[index] == vm_name:
+            del self.sorted_names[index]
+            self._remove_template_dependent(vm_name)
+        else:
+            self.admin_vm_count -= 1
+
     def handle_domain_shutdown(self, vm):
         try:
             if getattr(vm, "klass", None) == "TemplateVM" or getattr(
                 vm, "template_for_dispvms", False
             ):
-                for menu_item in self.menu_items.values():
+                # qubes based on this template, directly or through a
+                # disposable template
+                dependents = self.template_dependents.get(vm.name, set())
+                affected = set(dependents)
+                for dependent in dependents:
+                    affected.update(self.template_dependents.get(dependent, ()))
+                for vm_name in affected:
+                    menu_item = self.menu_items.get(vm_name)
+                    if menu_item is None:
+                        continue
                     try:
                         if not menu_item.vm.is_running():
                             # A VM based on this template can only be
@@ -1147,11 +1295,7 @@ class DomainTray(Gtk.Application):
                             continue
                     except exc.QubesPropertyAccessError:
                         continue
-                    template1 = getattr(menu_item.vm, "template", None)
-                    template2 = getattr(template1, "template", None)
-                    if vm in (template1, template2) and any(
-                        vol.is_outdated() for vol in menu_item.vm.volumes.values()
-                    ):
+                    if any(vol.is_outdated() for vol in menu_item.vm.volumes.values()):
                         menu_item.name.update_outdated(True)
         except exc.QubesVMNotFoundError:
             # attribute not available anymore as VM was removed
@@ -1204,9 +1348,29 @@ class DomainTray(Gtk.Application):
     def update_stats(self, vm, _event, **kwargs):
         if vm not in self.menu_items:
             return
-        self.menu_items[vm].update_stats(kwargs["memory_kb"], kwargs["cpu_usage"])
+        # only the latest sample is kept, and it is rendered at most
+        # STATS_FLUSH_RATE times per second, while the menu is visible
+        self.pending_stats[str(vm)] = (kwargs["memory_kb"], kwargs["cpu_usage"])
+        if self.stats_flush_source is None and self.tray_menu.get_mapped():
+            self.stats_flush_source = GLib.timeout_add(
+                1000 // STATS_FLUSH_RATE, self.flush_stats
+            )
+
+    def flush_stats(self):
+        self.stats_flush_source = None
+        pending_stats = self.pending_stats
+        self.pending_stats = {}
+        for vm_name, (memory_kb, cpu_usage) in pending_stats.items():
+            item = self.menu_items.get(vm_name)
+            if item:
+                item.update_stats(memory_kb, cpu_usage)
+        return False
 
     def initialize_menu(self):
+        # fetch tooltip properties for all qubes in one pass; storage info
+        # is fetched by poll_storage, off the main loop, once the menu is open
+        self.property_cache.refresh_all()
+
         self.tray_menu.add(DomainMenuItem(None, self, self.icon_cache))
 
         # Add AdminVMS
@@ -1288,6 +1452,7 @@ class DomainTray(Gtk.Application):
             "domain-feature-delete:updates-available", self.feature_change
         )
         self.dispatcher.remove_handler("property-set:netvm", self.property_change)
+        self.dispatcher.remove_handler("property-set:template", self.property_change)
         self.dispatcher.remove_handler("property-set:label", self.property_change)
 
         self.dispatcher.remove_handler("property-set:debug", self.debug_change)
@@ -1309,6 +1474,8 @@ class DomainTray(Gtk.Application):
         )
 
         self.stats_dispatcher.remove_handler("vm-stats", self.update_stats)
+        self.property_cache.unregister_events()
+        self.storage_executor.shutdown(wait=False, cancel_futures=True)
 
     @property
     def shift_pressed(self):
@@ -1329,14 +1496,8 @@ class DomainTray(Gtk.Application):
                 submenu = item.get_submenu()
                 if submenu is None:
                     continue
-
-                def do_emit(child):
-                    if isinstance(child, RunTerminalItem):
-                        child.set_as_root(shift_pressed)
-                    if isinstance(child, (RestartItem, ShutdownItem)):
-                        child.set_force(shift_pressed)
-
-                submenu.foreach(do_emit)
+                # cached submenus not in use are updated when reused
+                update_dynamic_labels(submenu, shift_pressed)
 
     def key_event(self, _unused, event):
         if event.keyval in [Gdk.KEY_Shift_L, Gdk.KEY_Shift_R]:
@@ -1348,9 +1509,10 @@ class DomainTray(Gtk.Application):
 
 def main():
     """main function"""
+    setup_profiling()
     qapp = qubesadmin.Qubes()
-    dispatcher = qubesadmin.events.EventsDispatcher(qapp)
-    stats_dispatcher = qubesadmin.events.EventsDispatcher(
+    dispatcher = qui.event_hub.HubEventsDispatcher(qapp)
+    stats_dispatcher = qui.event_hub.HubEventsDispatcher(
         qapp, api_method="admin.vm.Stats"
     )
     app = DomainTray("org.qubes.qui.tray.Domains", qapp, dispatcher, stats_dispatcher)
@@ -1360,6 +1522,7 @@ def main():
     tasks = [
         asyncio.ensure_future(dispatcher.listen_for_events()),
         asyncio.ensure_future(stats_dispatcher.listen_for_events()),
+        asyncio.ensure_future(app.poll_storage()),
     ]
 
     return qui.utils.run_asyncio_and_show_errors(loop, tasks, "Qubes Domains Widget")
@@ -15,8 +15,10 @@ import subprocess
 
 import qubesadmin
 import qubesadmin.events
+import qui.event_hub
 import qui.utils
 from qubesadmin import exc
+from qubes_config.widgets.profiler import setup_profiling
 from qubes_config.widgets.utils import open_url_in_disposable
 
 import gi  # isort:skip
@@ -258,8 +260,9 @@ class UpdatesTray(Gtk.Application):
 
 
 def main():
+    setup_profiling()
     qapp = qubesadmin.Qubes()
-    dispatcher = qubesadmin.events.EventsDispatcher(qapp)
+    dispatcher = qui.event_hub.HubEventsDispatcher(qapp)
     app = UpdatesTray("org.qubes.qui.tray.Updates", qapp, dispatcher)
     app.run()
 
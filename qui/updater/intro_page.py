@@ -18,13 +18,14 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
 # USA.
+import asyncio
 import subprocess
 from enum import Enum
 
 import gi
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Set, Tuple
 
 gi.require_version("Gtk", "3.0")  # isort:skip
 from gi.repository import Gtk  # isort:skip
@@ -42,8 +43,41 @@ from qui.updater.utils import (
     UpdateStatus,
     RowWrapper,
     ListWrapper,
+    LogBuffer,
     on_head_checkbox_toggled,
 )
+from qui.updater.progress_page import pipe_ebadf_silencer
+
+# features shown in (or deciding about) the update list
+UPDATE_FEATURES = (
+    "updates-available",
+    "last-updates-check",
+    "last-update",
+    "prohibit-start",
+    "skip-update",
+    "os-eol",
+    "template-name",
+)
+
+
+def fetch_update_features(vm) -> Dict[str, Any]:
+    """Get all features relevant for the update list of a given qube, so
+    that they are not asked for again while the list is drawn. The Admin
+    API has no call returning several feature values, so it's still one
+    call per feature. Features that are not set (or not readable) are
+    omitted, so the result can be used like `vm.features`."""
+    result = {}
+    for feature in UPDATE_FEATURES:
+        if feature == "template-name" and result.get("os-eol"):
+            # only needed to guess the eol date
+            continue
+        try:
+            value = vm.features.get(feature, None)
+        except exc.QubesException:
+            continue
+        if value is not None:
+            result[feature] = value
+    return result
 
 
 class IntroPage:
@@ -67,6 +101,19 @@ class IntroPage:
         self.vm_list.connect("query-tooltip", self.on_query_tooltip)
         self.list_store: Optional[ListWrapper] = None
 
+        # vm name -> features, see fetch_update_features
+        self.features_cache: Dict[str, Dict[str, Any]] = {}
+        # bumped on any change that can affect `qubes-vm-update --dry-run`
+        self.features_generation = 0
+        # (command, features generation) -> names of qubes to be updated
+        self.stale_qubes_cache: Dict[Tuple[Tuple[str, ...], int], Set[str]] = {}
+        self.refresh_task: Optional[asyncio.Task] = None
+
+        self.spinner = Gtk.Spinner()
+        self.spinner.set_no_show_all(True)
+        self.page.pack_start(self.spinner, False, False, 0)
+        self.page.reorder_child(self.spinner, 0)
+
         checkbox_column: Gtk.TreeViewColumn = self.builder.get_object("checkbox_column")
         checkbox_column.connect("clicked", self.on_header_toggled)
         header_button = checkbox_column.get_button()
@@ -96,14 +143,41 @@ class IntroPage:
             )
         )
 
+    def connect_events(self, dispatcher):
+        dispatcher.add_handler("feature-set:*", self._feature_changed)
+        dispatcher.add_handler("feature-delete:*", self._feature_changed)
+        dispatcher.add_handler("domain-add", self._domains_changed)
+        dispatcher.add_handler("domain-delete", self._domains_changed)
+
+    def _feature_changed(self, vm, _event, feature, **_kwargs):
+        if feature not in UPDATE_FEATURES and not feature.startswith("qubes-vm-update"):
+            return
+        self.features_cache.pop(str(vm), None)
+        self.features_generation += 1
+
+    def _domains_changed(self, *_args, **_kwargs):
+        self.features_generation += 1
+
+    def get_features(self, vm) -> Dict[str, Any]:
+        """Get (cached) features relevant for the update list."""
+        features = self.features_cache.get(vm.name)
+        if features is None:
+            features = fetch_update_features(vm)
+            self.features_cache[vm.name] = features
+        return features
+
     def populate_vm_list(self, qapp, settings):
         """Adds to list any updatable vms with update info."""
         self.log.debug("Populate update list")
+        self.features_cache.clear()
+        self.stale_qubes_cache.clear()
         self.list_store = ListWrapper(UpdateRowWrapper, self.vm_list.get_model())
 
         for vm in sorted(qapp.domains, key=lambda vm: vm.klass):
             if getattr(vm, "updateable", False):
-                self.list_store.append_vm(vm, state=False)
+                self.list_store.append_vm(
+                    vm, state=False, features=self.get_features(vm)
+                )
 
         self.refresh_update_list(
             settings.update_if_stale,
@@ -121,6 +195,9 @@ class IntroPage:
     ):
         """
         Refreshes "Updates Available" column if settings changed.
+
+        Once the main loop is running, `qubes-vm-update --dry-run` is run in
+        the background; its result is cached until a relevant feature changes.
         """
         self.log.debug("Refreshing update list")
         if not self.active:
@@ -133,30 +210,68 @@ class IntroPage:
             "--update-if-stale",
             str(update_if_stale),
         ]
+        filters = (hide_updated, hide_skipped, hide_prohibited)
+
+        if self.refresh_task is not None:
+            # settings changed again before the previous check finished
+            self.refresh_task.cancel()
+            self.refresh_task = None
+            self._set_refreshing(False)
 
-        to_update = self._get_stale_qubes(cmd)
+        cached = self.stale_qubes_cache.get(self._cache_key(cmd))
+        if cached is not None:
+            self._fill_update_list(cached, *filters)
+            return
 
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # initial population, the window is not shown yet
+            self._fill_update_list(self._get_stale_qubes(cmd), *filters)
+            return
+        self.refresh_task = loop.create_task(self._refresh_update_list(cmd, filters))
+
+    async def _refresh_update_list(self, cmd, filters):
+        self._set_refreshing(True)
+        try:
+            to_update = await self._get_stale_qubes_async(cmd)
+        except subprocess.CalledProcessError as err:
+            self.log.error("Cannot check which qubes need updates: %s", str(err))
+            return
+        finally:
+            if self.refresh_task is asyncio.current_task():
+                self.refresh_task = None
+                self._set_refreshing(False)
+        self._fill_update_list(to_update, *filters)
+
+    def _set_refreshing(self, refreshing: bool):
+        self.spinner.set_visible(refreshing)
+        if refreshing:
+            self.spinner.start()
+        else:
+            self.spinner.stop()
+        self.vm_list.set_sensitive(not refreshing)
+
+    def _fill_update_list(
+        self, to_update, hide_updated=False, hide_skipped=False, hide_prohibited=False
+    ):
         rows = self.list_store.get_all()
         self.list_store.clear()
         for row in rows:
+            features = self.get_features(row.vm)
 
             # Determine visibility
             visible = True
             if hide_updated and not row.vm.name in to_update:
                 visible = False
             else:
-                try:
-                    if hide_skipped and bool(row.vm.features.get("skip-update", False)):
-                        visible = False
-                    if hide_prohibited and bool(
-                        row.vm.features.get("prohibit-start", False)
-                    ):
-                        visible = False
-                except exc.QubesDaemonCommunicationError:
-                    visible = True
+                if hide_skipped and bool(features.get("skip-update", False)):
+                    visible = False
+                if hide_prohibited and bool(features.get("prohibit-start", False)):
+                    visible = False
 
             state = bool(row.vm.name in to_update) if visible else None
-            appended = self.list_store.append_vm(row.vm, state=state)
+            appended = self.list_store.append_vm(row.vm, state=state, features=features)
             if state is not None:
                 appended.selected = bool(row.vm.name in to_update)
 
@@ -209,7 +324,17 @@ class IntroPage:
         for row in self.list_store:
             row.selected = row.updates_available in self.head_checkbox.allowed
 
-    def select_rows_ignoring_conditions(self, cliargs):
+    def select_rows_ignoring_conditions(
+        self, cliargs, callback: Optional[Callable[[], None]] = None
+    ) -> bool:
+        """
+        Select rows as requested by command line arguments.
+
+        Returns True if the rows were selected right away. If
+        `qubes-vm-update --dry-run` has to be run while the main loop is
+        already running, it's run in the background instead: False is
+        returned and the callback is called once the rows are selected.
+        """
         cmd = ["qubes-vm-update", "--dry-run", "--quiet"]
 
         args = [a for a in dir(cliargs) if not a.startswith("_")]
@@ -237,42 +362,109 @@ class IntroPage:
         if cliargs.dom0:
             cmd.extend(["--targets", "dom0"])
 
-        to_update = set()
+        to_update: Set[str] = set()
         non_default_select = [
             "--" + arg for arg in cliargs.non_default_select if arg != "dom0"
         ]
         non_default = [a for a in cmd if a in non_default_select]
         if non_default or cliargs.non_interactive:
-            to_update = self._get_stale_qubes(cmd)
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # window is not shown yet, nothing to keep responsive
+                to_update = self._get_stale_qubes(cmd)
+            else:
+                if self._cache_key(cmd) not in self.stale_qubes_cache:
+                    self.refresh_task = loop.create_task(
+                        self._select_rows_ignoring_conditions(cmd, callback)
+                    )
+                    return False
+                to_update = self.stale_qubes_cache[self._cache_key(cmd)]
+
+        self._select_rows_by_name(to_update)
+        return True
 
+    async def _select_rows_ignoring_conditions(self, cmd, callback):
+        self._set_refreshing(True)
+        try:
+            to_update = await self._get_stale_qubes_async(cmd)
+        except subprocess.CalledProcessError as err:
+            self.log.error("Cannot check which qubes need updates: %s", str(err))
+            to_update = set()
+        finally:
+            if self.refresh_task is asyncio.current_task():
+                self.refresh_task = None
+            self._set_refreshing(False)
+        self._select_rows_by_name(to_update)
+        if callback:
+            callback()
+
+    def _select_rows_by_name(self, to_update):
         for row in self.list_store:
             row.selected = row.name in to_update
 
+    def _cache_key(self, cmd) -> Tuple[Tuple[str, ...], int]:
+        return tuple(cmd), self.features_generation
+
     def _get_stale_qubes(self, cmd):
+        key = self._cache_key(cmd)
+        if key in self.stale_qubes_cache:
+            return self.stale_qubes_cache[key]
         try:
             self.log.debug("Run command %s", " ".join(cmd))
             output = subprocess.check_output(cmd)
-            self.log.debug("Command returns: %s", output.decode())
-
-            output_lines = output.decode().split("\n")
-            result = set()
-            if "dom0" in output_lines[0]:
-                result.add("dom0")
-
-            second_line = output_lines[1] if len(output_lines) > 1 else ""
-            if ":" not in second_line:
-                return result
-
-            return result.union(
-                {
-                    vm_name.strip()
-                    for vm_name in second_line.split(":", maxsplit=1)[1].split(",")
-                }
-            )
         except subprocess.CalledProcessError as err:
             if err.returncode != 100:
                 raise err
-            return set()
+            result = set()
+        else:
+            result = self._parse_stale_qubes(output)
+        self.stale_qubes_cache[key] = result
+        return result
+
+    async def _get_stale_qubes_async(self, cmd):
+        key = self._cache_key(cmd)
+        if key in self.stale_qubes_cache:
+            return self.stale_qubes_cache[key]
+        self.log.debug("Run command %s", " ".join(cmd))
+        with pipe_ebadf_silencer():
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdout=asyncio.subprocess.PIPE
+            )
+            try:
+                output, _ = await proc.communicate()
+            except asyncio.CancelledError:
+                proc.kill()
+                raise
+            returncode = proc.returncode
+            del proc
+        if returncode == 100:
+            result = set()
+        elif returncode:
+            raise subprocess.CalledProcessError(returncode, cmd, output)
+        else:
+            result = self._parse_stale_qubes(output)
+        self.stale_qubes_cache[key] = result
+        return result
+
+    def _parse_stale_qubes(self, output: bytes) -> Set[str]:
+        self.log.debug("Command returns: %s", output.decode())
+
+        output_lines = output.decode().split("\n")
+        result = set()
+        if "dom0" in output_lines[0]:
+            result.add("dom0")
+
+        second_line = output_lines[1] if len(output_lines) > 1 else ""
+        if ":" not in second_line:
+            return result
+
+        return result.union(
+            {
+                vm_name.strip()
+                for vm_name in second_line.split(":", maxsplit=1)[1].split(",")
+            }
+        )
 
     @staticmethod
     def _handle_cli_dom0(dom0, to_update, cliargs):
@@ -339,19 +531,25 @@ class UpdateRowWrapper(RowWrapper):
     _UPDATE_PROGRESS = 7
     _STATUS = 8
 
-    def __init__(self, list_store, vm, to_update: bool):
-        updates_available = bool(vm.features.get("updates-available", False))
+    def __init__(
+        self, list_store, vm, to_update: bool, features: Optional[Dict] = None
+    ):
+        if features is None:
+            features = fetch_update_features(vm)
+        self.features = features
+
+        updates_available = bool(features.get("updates-available", False))
         if to_update and not updates_available:
             updates_available = None
         selected = updates_available is True
-        supported = check_support(vm)
+        supported = check_support(vm, features)
 
-        last_updates_check = vm.features.get("last-updates-check", None)
-        last_update = vm.features.get("last-update", None)
+        last_updates_check = features.get("last-updates-check", None)
+        last_update = features.get("last-update", None)
 
         icon = load_icon(vm.icon)
         name = QubeName(vm.name, str(vm.label))
-        prohibit_rationale = vm.features.get("prohibit-start", False)
+        prohibit_rationale = features.get("prohibit-start", False)
 
         raw_row = [
             selected,
@@ -369,10 +567,10 @@ class UpdateRowWrapper(RowWrapper):
 
         super().__init__(list_store, vm, raw_row)
 
-        self.buffer: str = ""
+        self.buffer: LogBuffer = LogBuffer()
 
     def append_text_view(self, text):
-        self.buffer += text
+        self.buffer.append(text)
 
     @property
     def selected(self):
@@ -400,9 +598,9 @@ class UpdateRowWrapper(RowWrapper):
 
     @updates_available.setter
     def updates_available(self, value):
-        prohibited = bool(self.vm.features.get("prohibit-start", False))
-        updates_available = bool(self.vm.features.get("updates-available", False))
-        supported = check_support(self.vm)
+        prohibited = bool(self.features.get("prohibit-start", False))
+        updates_available = bool(self.features.get("updates-available", False))
+        supported = check_support(self.vm, self.features)
 
         if value and not updates_available:
             updates_available = None
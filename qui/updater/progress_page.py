@@ -39,7 +39,7 @@ from qubes_config.widgets.gtk_utils import (
     load_icon_at_gtk_size,
 )
 from qui.updater.updater_settings import Settings
-from qui.updater.utils import UpdateStatus, RowWrapper
+from qui.updater.utils import UpdateStatus, RowWrapper, LOG_MEMORY_LIMIT
 
 
 @contextlib.contextmanager
@@ -89,6 +89,15 @@ class ProgressPage:
         self.after_update_callback = callback
         self.retcode = None
 
+        # progress reported by qubes-vm-update, folded between flushes to the
+        # list store; see handle_err_line
+        self.progress_rows = None
+        self.progress: Dict[str, float] = {}
+        self.progress_sum = 0.0
+        self.pending_progress: Dict[str, RowWrapper] = {}
+        self.pending_status: Dict[str, UpdateStatus] = {}
+        self.flush_scheduled = False
+
         self.update_details = QubeUpdateDetails(self.builder)
 
         self.stack: Gtk.Stack = self.builder.get_object("main_stack")
@@ -236,29 +245,62 @@ class ProgressPage:
                 break
             self.handle_err_line(untrusted_line, rows)
 
+    def reset_progress(self, rows: Dict[str, RowWrapper]):
+        """Start tracking progress of a new set of rows."""
+        self.progress_rows = rows
+        self.progress = {name: row.get_update_progress() for name, row in rows.items()}
+        self.progress_sum = sum(self.progress.values())
+        self.pending_progress.clear()
+        self.pending_status.clear()
+
     def handle_err_line(self, untrusted_line, rows):
+        """Parse a progress line of qubes-vm-update.
+
+        The new state is only recorded here (together with a running total);
+        the list store is updated by a single idle callback, no matter how
+        many lines were read in the meantime."""
         line = self._sanitize_line(untrusted_line)
         try:
             name, status, info = line.split()
+            if name not in rows:
+                return
+            if rows is not self.progress_rows:
+                self.reset_progress(rows)
             if status == "updating":
-                progress = int(float(info))
-                GLib.idle_add(rows[name].set_update_progress, progress)
-                total_progress = sum(
-                    row.get_update_progress() for row in rows.values()
-                ) / len(rows)
-                GLib.idle_add(self.set_total_progress, total_progress)
-
-        except ValueError:
-            return
-
-        try:
-            if status == "done":
+                self._record_progress(name, rows[name], int(float(info)))
+            elif status == "done":
                 update_status = UpdateStatus.from_name(info)
-                GLib.idle_add(rows[name].set_update_progress, 100)
-                GLib.idle_add(rows[name].set_status, update_status)
-        except KeyError:
+                self._record_progress(name, rows[name], 100)
+                self.pending_status[name] = update_status
+            else:
+                return
+        except (ValueError, KeyError):
             return
 
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            GLib.idle_add(self.flush_progress)
+
+    def _record_progress(self, name, row, progress):
+        self.progress_sum += progress - self.progress[name]
+        self.progress[name] = progress
+        self.pending_progress[name] = row
+
+    def flush_progress(self):
+        """Push progress and statuses recorded since the last call to the
+        list store, together with the total progress."""
+        self.flush_scheduled = False
+        for name, row in self.pending_progress.items():
+            if row.get_update_progress() != self.progress[name]:
+                row.set_update_progress(self.progress[name])
+            if name in self.pending_status:
+                row.set_status(self.pending_status[name])
+        self.pending_progress.clear()
+        self.pending_status.clear()
+        if self.progress:
+            self.set_total_progress(self.progress_sum / len(self.progress))
+        return False
+
     async def read_stdouts(self, proc, rows):
         curr_name_out = ""
         while True:
@@ -348,6 +390,15 @@ class QubeUpdateDetails:
         self.active_row = None
         self.builder = builder
 
+        # row whose log is in the text view, and how much of it was added
+        self.shown_row = None
+        self.shown_length = 0
+        # number of log characters not in the text view, and length of
+        # the header telling about them at the start of the text view;
+        # only touched by GLib callbacks
+        self.omitted_length = 0
+        self.header_length = 0
+
         self.qube_details: Gtk.Box = self.builder.get_object("qube_details")
         self.details_label: Gtk.Label = self.builder.get_object("details_label")
         self.qube_icon: Gtk.Image = self.builder.get_object("qube_icon")
@@ -368,7 +419,7 @@ class QubeUpdateDetails:
         if self.active_row is None:
             return
 
-        text = self.active_row.buffer
+        text = str(self.active_row.buffer)
         if not text:
             return
 
@@ -376,6 +427,7 @@ class QubeUpdateDetails:
 
     def set_active_row(self, row):
         self.active_row = row
+        self.shown_row = None
         row_activated = self.active_row is not None
         if not row_activated:
             self.details_label.set_text(l("Select a qube to see details."))
@@ -393,10 +445,58 @@ class QubeUpdateDetails:
         self.copy_button.set_visible(row_activated)
 
     def update_buffer(self):
-        if self.active_row is not None:
-            buffer_ = self.progress_textview.get_buffer()
-            GLib.idle_add(buffer_.set_text, self.active_row.buffer)
-            GLib.idle_add(self._autoscroll)
+        """Show new output of the active row. Only the part appended since
+        the last call is added to the text view; it's filled from scratch
+        only when the active row changes."""
+        if self.active_row is None:
+            return
+        log = self.active_row.buffer
+        if self.shown_row is self.active_row and len(log) == self.shown_length:
+            return
+
+        if self.shown_row is not self.active_row or len(log) < self.shown_length:
+            spilled = log.spilled_length
+            if spilled:
+                text = log.memory_text()
+            else:
+                text = str(log)
+            GLib.idle_add(self._set_text, text, spilled)
+        else:
+            GLib.idle_add(self._append_text, log[self.shown_length :])
+        self.shown_row = self.active_row
+        self.shown_length = len(log)
+        GLib.idle_add(self._autoscroll)
+
+    @staticmethod
+    def _omitted_header(omitted: int) -> str:
+        if not omitted:
+            return ""
+        return l(
+            "[{} earlier characters omitted, use the copy button to get the full log]\n"
+        ).format(omitted)
+
+    def _set_text(self, text, omitted):
+        header = self._omitted_header(omitted)
+        self.progress_textview.get_buffer().set_text(header + text)
+        self.omitted_length = omitted
+        self.header_length = len(header)
+
+    def _append_text(self, text):
+        buffer_ = self.progress_textview.get_buffer()
+        buffer_.insert(buffer_.get_end_iter(), text)
+        # the text view should not hold more than the log keeps in memory
+        excess = buffer_.get_char_count() - self.header_length - LOG_MEMORY_LIMIT
+        if excess <= 0:
+            return
+        # trim the text after the header, and update the header
+        buffer_.delete(
+            buffer_.get_start_iter(),
+            buffer_.get_iter_at_offset(self.header_length + excess),
+        )
+        self.omitted_length += excess
+        header = self._omitted_header(self.omitted_length)
+        buffer_.insert(buffer_.get_start_iter(), header)
+        self.header_length = len(header)
 
     def _autoscroll(self):
         adjustment = self.progress_scrolled_window.get_vadjustment()
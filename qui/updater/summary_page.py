@@ -19,6 +19,8 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301,
 # USA.
 import asyncio
+import itertools
+import time
 from enum import Enum
 from gettext import ngettext
 
@@ -26,9 +28,10 @@ import gi
 
 gi.require_version("Gtk", "3.0")  # isort:skip
 from gi.repository import Gtk  # isort:skip
-from typing import Optional, Any
+from typing import Optional, Any, Dict, List, Set
 
 import qubesadmin
+import qubesadmin.exc
 import qubesadmin.utils
 
 from qubes_config.widgets.gtk_utils import (
@@ -51,6 +54,8 @@ from qui.updater.utils import (
 
 from locale import gettext as l
 
+DEFAULT_RESTART_CONCURRENCY = 4
+
 
 class SummaryPage:
     """
@@ -59,9 +64,18 @@ class SummaryPage:
     Show the summary of vm updates and appms that should be restarted.
     """
 
-    def __init__(self, builder, log, next_button, cancel_button, back_by_row_selection):
+    def __init__(
+        self,
+        builder,
+        log,
+        next_button,
+        cancel_button,
+        back_by_row_selection,
+        max_concurrency: int = DEFAULT_RESTART_CONCURRENCY,
+    ):
         self.builder = builder
         self.log = log
+        self.max_concurrency = max_concurrency
         self.next_button = next_button
         self.cancel_button = cancel_button
         self.restart_task = None
@@ -289,43 +303,23 @@ class SummaryPage:
 
         # clear err and perform shutdown/start
         self.err = ""
-        await self.shutdown_domains(tmpls_to_shutdown)
-        await self.restart_vms(to_restart)
-        await self.shutdown_domains(to_shutdown)
+        scheduler = RestartScheduler(self.log, self.max_concurrency)
+        await scheduler.run(tmpls_to_shutdown + to_shutdown, to_restart)
+
+        if scheduler.failed_shutdown:
+            self.status = RestartStatus.ERROR_TMPL_DOWN
+            for qube, exc in scheduler.failed_shutdown.items():
+                self.err += f"{qube.name} cannot shutdown: {exc}\n"
+                self.log.error("Cannot shutdown %s: %s", qube.name, str(exc))
+        if scheduler.failed_start:
+            self.status = RestartStatus.ERROR_APP_DOWN
+            for qube, exc in scheduler.failed_start.items():
+                self.err += qube.name + " cannot start: " + str(exc) + "\n"
+                self.log.error("Cannot start %s: %s", qube.name, str(exc))
 
         if self.status is RestartStatus.NONE:
             self.status = RestartStatus.OK
 
-    async def shutdown_domains(self, to_shutdown):
-        """
-        Try to shut down vms and wait to finish.
-        """
-        failed = await qubesadmin.utils.shutdown(
-            domains=to_shutdown, force=True, wait=True
-        )
-
-        if not failed:
-            return to_shutdown
-
-        self.status = RestartStatus.ERROR_TMPL_DOWN
-        for qube, exc in failed.items():
-            self.err += f"{qube.name} cannot shutdown: {exc}\n"
-            self.log.error("Cannot shutdown %s: %s", qube.name, str(exc))
-        return [qube for qube in to_shutdown if qube not in failed]
-
-    async def restart_vms(self, to_restart):
-        """
-        Try to restart vms.
-        """
-        shutdowns = await self.shutdown_domains(to_restart)
-
-        # restart the qubes that were successfully shut down
-        failed = await qubesadmin.utils.start(domains=shutdowns)
-        for qube, exc in failed.items():
-            self.err += qube.name + " cannot start: " + str(exc) + "\n"
-            self.log.error("Cannot start %s: %s", qube.name, str(exc))
-            self.status = RestartStatus.ERROR_APP_DOWN
-
     async def _show_status_dialog(self, show_only_error: bool):
         if self.status == RestartStatus.OK and not show_only_error:
             await show_dialog_with_icon_async(
@@ -347,6 +341,105 @@ class SummaryPage:
             self.status = RestartStatus.ERROR_APP_START
 
 
+class RestartScheduler:
+    """
+    Shut down and start again qubes as soon as their dependencies allow,
+    instead of doing it in fixed phases.
+
+    A qube is shut down after all its network clients that are also to be
+    shut down or restarted. A restarted qube is started again after it was
+    shut down, after its template was shut down (if it was to be) and after
+    its netvm is running again (or is down, if it was only to be shut down).
+    At most `max_concurrency` qubes are shut down or started at once.
+    """
+
+    def __init__(self, log, max_concurrency: int = DEFAULT_RESTART_CONCURRENCY):
+        self.log = log
+        self.max_concurrency = max_concurrency
+        self.semaphore: Optional[asyncio.Semaphore] = None
+
+        self.vms: Dict[str, Any] = {}
+        self.template_of: Dict[str, Optional[str]] = {}
+        self.netvm_of: Dict[str, Optional[str]] = {}
+        self.clients: Dict[str, Set[str]] = {}
+        self.shutdown_tasks: Dict[str, asyncio.Task] = {}
+        self.start_tasks: Dict[str, asyncio.Task] = {}
+
+        self.failed_shutdown: Dict[Any, Exception] = {}
+        self.failed_start: Dict[Any, Exception] = {}
+        # qube name -> action ("shutdown" or "start") -> seconds
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    async def run(self, to_shutdown: List, to_restart: List):
+        """Shut down `to_shutdown` and restart `to_restart` qubes."""
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.vms = {vm.name: vm for vm in itertools.chain(to_shutdown, to_restart)}
+        for name, vm in self.vms.items():
+            self.template_of[name] = self._get_name(vm, "template")
+            self.netvm_of[name] = self._get_name(vm, "netvm")
+        self.clients = {name: set() for name in self.vms}
+        for name, netvm in self.netvm_of.items():
+            if netvm in self.clients:
+                self.clients[netvm].add(name)
+
+        loop = asyncio.get_running_loop()
+        for name in self.vms:
+            self.shutdown_tasks[name] = loop.create_task(self._shutdown(name))
+        for vm in to_restart:
+            self.start_tasks[vm.name] = loop.create_task(self._start(vm.name))
+        await asyncio.gather(*self.shutdown_tasks.values(), *self.start_tasks.values())
+
+    @staticmethod
+    def _get_name(vm, prop: str) -> Optional[str]:
+        try:
+            value = getattr(vm, prop, None)
+        except qubesadmin.exc.QubesException:
+            return None
+        return str(value) if value else None
+
+    async def _shutdown(self, name: str) -> bool:
+        clients = [self.shutdown_tasks[client] for client in self.clients[name]]
+        if clients:
+            await asyncio.wait(clients)
+        vm = self.vms[name]
+        async with self.semaphore:
+            start_time = time.monotonic()
+            failed = await qubesadmin.utils.shutdown(
+                domains=[vm], force=True, wait=True
+            )
+            self._record_time(name, "shutdown", start_time)
+        self.failed_shutdown.update(failed)
+        return not failed
+
+    async def _start(self, name: str) -> bool:
+        if not await self.shutdown_tasks[name]:
+            # do not start what was not restarted
+            return False
+        dependencies = []
+        template = self.template_of[name]
+        if template in self.shutdown_tasks:
+            dependencies.append(self.shutdown_tasks[template])
+        netvm = self.netvm_of[name]
+        if netvm in self.start_tasks:
+            dependencies.append(self.start_tasks[netvm])
+        elif netvm in self.shutdown_tasks:
+            dependencies.append(self.shutdown_tasks[netvm])
+        if dependencies:
+            await asyncio.wait(dependencies)
+        vm = self.vms[name]
+        async with self.semaphore:
+            start_time = time.monotonic()
+            failed = await qubesadmin.utils.start(domains=[vm])
+            self._record_time(name, "start", start_time)
+        self.failed_start.update(failed)
+        return not failed
+
+    def _record_time(self, name: str, action: str, start_time: float):
+        duration = time.monotonic() - start_time
+        self.timings.setdefault(name, {})[action] = duration
+        self.log.info("%s of %s took %.1fs", action, name, duration)
+
+
 class RestartRowWrapper(RowWrapper):
     COLUMN_NUM = 5
     _SELECTION = 1
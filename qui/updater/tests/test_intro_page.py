@@ -20,9 +20,9 @@
 # USA.
 import pytest
 from unittest.mock import patch
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 
-from qui.updater.tests.conftest import test_qapp_impl, expected_row
+from qui.updater.tests.conftest import test_qapp_impl, expected_row, run_coroutine
 from qui.updater.intro_page import IntroPage, UpdateRowWrapper, UpdatesAvailable
 from qui.updater.updater import parse_args
 from qui.updater.utils import ListWrapper, HeaderCheckbox
@@ -68,6 +68,105 @@ def test_populate_vm_list(
     assert len(sut.get_vms_to_update()) == 3
 
 
+def test_refresh_update_list_async(
+    real_builder, test_qapp, mock_next_button, mock_list_store
+):
+    mock_log = Mock()
+    sut = IntroPage(real_builder, mock_log, mock_next_button)
+
+    sut.list_store = ListWrapper(UpdateRowWrapper, mock_list_store)
+    for qname in ("test-standalone", "fedora-35", "fedora-36"):
+        expected_row(qname, test_qapp)
+        sut.list_store.append_vm(test_qapp.domains[qname])
+
+    class MockProc:
+        returncode = 0
+
+        async def communicate(self):
+            return (
+                b"The admin VM will not be updated.\n"
+                b"Following templates will be updated: fedora-36",
+                None,
+            )
+
+    mock_create = AsyncMock(return_value=MockProc())
+
+    async def refresh():
+        sut.refresh_update_list(7)
+        assert sut.refresh_task is not None
+        assert sut.spinner.get_visible()
+        await sut.refresh_task
+        assert not sut.spinner.get_visible()
+
+    with patch("asyncio.create_subprocess_exec", mock_create):
+        run_coroutine(refresh())
+        assert {row.name for row in sut.list_store if row.selected} == {"fedora-36"}
+        mock_create.assert_called_once()
+
+        # the same settings, nothing changed: cached
+        sut.refresh_update_list(7)
+        assert sut.refresh_task is None
+        mock_create.assert_called_once()
+
+        # a relevant feature changed
+        sut._feature_changed(
+            test_qapp.domains["fedora-35"],
+            "feature-set:updates-available",
+            feature="updates-available",
+        )
+        run_coroutine(refresh())
+        assert mock_create.call_count == 2
+
+
+def test_select_rows_ignoring_conditions_async(
+    real_builder, test_qapp, mock_next_button, mock_list_store
+):
+    mock_log = Mock()
+    sut = IntroPage(real_builder, mock_log, mock_next_button)
+
+    sut.list_store = ListWrapper(UpdateRowWrapper, mock_list_store)
+    for qname in ("test-standalone", "fedora-35", "fedora-36"):
+        expected_row(qname, test_qapp)
+        sut.list_store.append_vm(test_qapp.domains[qname])
+
+    class MockProc:
+        returncode = 0
+
+        async def communicate(self):
+            return (
+                b"The admin VM will not be updated.\n"
+                b"Following templates will be updated: fedora-36",
+                None,
+            )
+
+    mock_create = AsyncMock(return_value=MockProc())
+    callback = Mock()
+    test_qapp.expected_calls[
+        ("dom0", "admin.vm.feature.Get", "qubes-vm-update-update-if-stale", None)
+    ] = (b"0\x00" + str(7).encode())
+    cliargs = parse_args(("--templates",), test_qapp)
+
+    async def select():
+        # with the main loop running, the check must not block it
+        assert not sut.select_rows_ignoring_conditions(cliargs, callback)
+        assert sut.refresh_task is not None
+        callback.assert_not_called()
+        await sut.refresh_task
+        callback.assert_called_once()
+
+        # known result is used right away
+        assert sut.select_rows_ignoring_conditions(cliargs, callback)
+        callback.assert_called_once()
+
+    with patch("asyncio.create_subprocess_exec", mock_create), patch(
+        "subprocess.check_output"
+    ) as mock_subprocess:
+        run_coroutine(select())
+        mock_subprocess.assert_not_called()
+    mock_create.assert_called_once()
+    assert {row.name for row in sut.list_store if row.selected} == {"fedora-36"}
+
+
 # i-th expectations value is an expected number of selected VMs after clicking on the
 # colum header i times
 # -1 is a magic value for all qubes selected
@@ -160,7 +160,7 @@ def test_update_templates(
     # chose vm to show details
     sut.update_details.active_row = updateable_vms_list[0]
     for i, row in enumerate(updateable_vms_list):
-        row.buffer = f"Details {i}"
+        row.buffer.append(f"Details {i}")
 
     if interrupted:
         sut.interrupt_update()
@@ -179,6 +179,56 @@ def test_update_templates(
     mock_callback.assert_not_called()
 
 
+@patch("gi.repository.GLib.idle_add")
+def test_handle_err_line(
+    idle_add,
+    real_builder,
+    updateable_vms_list,
+    mock_next_button,
+    mock_cancel_button,
+    mock_label,
+):
+    mock_log = Mock()
+    mock_callback = Mock()
+    sut = ProgressPage(
+        real_builder,
+        mock_log,
+        mock_label,
+        mock_next_button,
+        mock_cancel_button,
+        mock_callback,
+    )
+    total_progress = []
+    sut.set_total_progress = lambda prog: total_progress.append(prog)
+
+    rows = {row.name: row for row in updateable_vms_list}
+    first, second = list(rows)[:2]
+    for row in rows.values():
+        row.set_update_progress(0)
+
+    sut.handle_err_line(f"{first} updating 10.5\n".encode(), rows)
+    sut.handle_err_line(f"{first} updating 50\n".encode(), rows)
+    sut.handle_err_line(f"{second} updating 20\n".encode(), rows)
+    sut.handle_err_line(b"garbage\n", rows)
+    sut.handle_err_line(b"unknown-qube updating 30\n", rows)
+
+    # one idle callback for all the lines, nothing touched yet
+    idle_add.assert_called_once_with(sut.flush_progress)
+    assert rows[first].get_update_progress() == 0
+
+    sut.flush_progress()
+    assert rows[first].get_update_progress() == 50
+    assert rows[second].get_update_progress() == 20
+    assert total_progress == [70 / len(rows)]
+
+    sut.handle_err_line(f"{second} done success\n".encode(), rows)
+    assert idle_add.call_count == 2
+    sut.flush_progress()
+    assert rows[second].get_update_progress() == 100
+    assert rows[second].status == UpdateStatus.Success
+    assert total_progress[-1] == 150 / len(rows)
+
+
 def test_do_update_selected(
     real_builder,
     test_qapp,
@@ -300,3 +350,37 @@ def test_set_active_row_none(real_builder):
     assert not sut.progress_scrolled_window.get_visible()
     assert not sut.progress_textview.get_visible()
     assert not sut.copy_button.get_visible()
+
+
+@patch("qui.updater.progress_page.LOG_MEMORY_LIMIT", 10)
+def test_append_text_keeps_omitted_header(real_builder):
+    sut = QubeUpdateDetails(real_builder)
+    buffer_ = sut.progress_textview.get_buffer()
+
+    def get_text():
+        return buffer_.get_text(buffer_.get_start_iter(), buffer_.get_end_iter(), False)
+
+    sut._set_text("0123456789", 0)
+    assert get_text() == "0123456789"
+
+    # the oldest text is trimmed, and the header tells about it
+    sut._append_text("abc")
+    assert get_text() == (
+        "[3 earlier characters omitted, use the copy button to get the full log]\n"
+        "3456789abc"
+    )
+
+    # the header itself is never trimmed
+    sut._append_text("defgh")
+    assert get_text() == (
+        "[8 earlier characters omitted, use the copy button to get the full log]\n"
+        "89abcdefgh"
+    )
+
+    # log already partially spilled when shown
+    sut._set_text("xyz", 100)
+    sut._append_text("0123456789")
+    assert get_text() == (
+        "[103 earlier characters omitted, use the copy button to get the full log]\n"
+        "0123456789"
+    )
@@ -36,6 +36,7 @@ from qui.updater.summary_page import (
     AppVMType,
     RestartStatus,
     RestartRowWrapper,
+    RestartScheduler,
 )
 from qui.updater.utils import HeaderCheckbox, UpdateStatus, ListWrapper
 
@@ -436,3 +437,51 @@ def test_perform_restart(
     #     + expected_shutdown_calls
     #     + expected_start_calls
     # )
+
+
+def test_restart_scheduler_order():
+    class MockVM:
+        def __init__(self, name, template=None, netvm=None):
+            self.name = name
+            self.template = template
+            self.netvm = netvm
+
+    template = MockVM("fedora-36")
+    sys_net = MockVM("sys-net", template="fedora-36")
+    sys_firewall = MockVM("sys-firewall", template="fedora-36", netvm="sys-net")
+    test_vm = MockVM("test-vm", template="fedora-36", netvm="sys-firewall")
+
+    actions = []
+
+    async def shutdown(domains, force, wait):
+        assert force and wait
+        actions.append(("shutdown", domains[0].name))
+        return {}
+
+    async def start(domains):
+        actions.append(("start", domains[0].name))
+        if domains[0].name == "sys-firewall":
+            return {domains[0]: Exception("no memory")}
+        return {}
+
+    sut = RestartScheduler(Mock(), max_concurrency=2)
+    with patch("qubesadmin.utils.shutdown", shutdown), patch(
+        "qubesadmin.utils.start", start
+    ):
+        run_coroutine(sut.run([template, test_vm], [sys_net, sys_firewall]))
+
+    def index(action, name):
+        return actions.index((action, name))
+
+    # clients go down before their netvm
+    assert index("shutdown", "test-vm") < index("shutdown", "sys-firewall")
+    assert index("shutdown", "sys-firewall") < index("shutdown", "sys-net")
+    # qubes start after their template is down and their netvm is up again
+    assert index("shutdown", "fedora-36") < index("start", "sys-net")
+    assert index("start", "sys-net") < index("start", "sys-firewall")
+    assert ("start", "test-vm") not in actions
+
+    assert not sut.failed_shutdown
+    assert list(sut.failed_start) == [sys_firewall]
+    assert set(sut.timings) == {"fedora-36", "sys-net", "sys-firewall", "test-vm"}
+    assert set(sut.timings["sys-net"]) == {"shutdown", "start"}
@@ -498,3 +498,12 @@ def test_dialog(
         icon_name="qubes-check-yes",
     )
     summary_dialog_async.assert_not_awaited()
+
+
+def test_max_restart_concurrency(test_qapp):
+    assert parse_args((), test_qapp).max_restart_concurrency == 4
+    args = parse_args(("--max-restart-concurrency", "2"), test_qapp)
+    assert args.max_restart_concurrency == 2
+    for value in ("0", "-1", "many"):
+        with pytest.raises(SystemExit):
+            parse_args(("--max-restart-concurrency", value), test_qapp)
@@ -18,6 +18,7 @@
 # You should have received a copy of the GNU Lesser General Public License along
 # with this program; if not, see <http://www.gnu.org/licenses/>.
 from qui.utils import check_support
+from qui.updater.utils import LogBuffer
 from qubesadmin.tests.mock_app import MockQubes, MockQube
 
 
@@ -51,3 +52,24 @@ def test_check_support():
     assert not check_support(debian_minimal)
     assert not check_support(normal_debian)
     assert check_support(nothing_special)
+
+
+def test_log_buffer():
+    log = LogBuffer(max_memory=100, chunk_size=10)
+    expected = ""
+    for i in range(50):
+        line = f"line {i}\n"
+        log.append(line)
+        expected += line
+
+        assert len(log) == len(expected)
+        assert log[len(expected) - len(line) :] == line
+        assert log[0:] == expected
+
+    assert str(log) == expected
+    # older output was moved out of memory
+    assert log.spilled_length > 0
+    assert len(log.memory_text()) <= 100
+    assert log.spilled_length + len(log.memory_text()) == len(expected)
+    assert log.memory_text() == expected[log.spilled_length :]
+    assert log[len(expected) :] == ""
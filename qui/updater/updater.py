@@ -17,9 +17,10 @@ from qubes_config.widgets.gtk_utils import (
     show_dialog_with_icon_async,
     RESPONSES_OK,
 )
+from qubes_config.widgets.profiler import setup_profiling
 from qui.updater.progress_page import ProgressPage
 from qui.updater.updater_settings import Settings, OverriddenSettings
-from qui.updater.summary_page import SummaryPage
+from qui.updater.summary_page import SummaryPage, DEFAULT_RESTART_CONCURRENCY
 from qui.updater.intro_page import IntroPage
 import qui.updater.utils
 
@@ -140,6 +141,7 @@ class QubesUpdater(Gtk.Application):
         self.header_label: Gtk.Label = self.builder.get_object("header_label")
 
         self.intro_page = IntroPage(self.builder, self.log, self.next_button)
+        self.intro_page.connect_events(self.dispatcher)
         self.progress_page = ProgressPage(
             self.builder,
             self.log,
@@ -158,6 +160,7 @@ class QubesUpdater(Gtk.Application):
             self.next_button,
             self.cancel_button,
             self.progress_page.back_by_row_selection,
+            max_concurrency=self.cliargs.max_restart_concurrency,
         )
 
         self.button_settings: Gtk.Button = self.builder.get_object("button_settings")
@@ -227,11 +230,11 @@ class QubesUpdater(Gtk.Application):
 
         if skip_intro_if_args(self.cliargs):
             self.log.info("Skipping intro page.")
-            self.intro_page.select_rows_ignoring_conditions(cliargs=self.cliargs)
-            if len(self.intro_page.get_vms_to_update()) == 0:
-                self.do_nothing = True
-                # `main()` change it to 0 unless `--signal-no-updates` is set
-                self.retcode = 100
+            if not self.intro_page.select_rows_ignoring_conditions(
+                cliargs=self.cliargs, callback=self._rows_selected_in_background
+            ):
+                return
+            if self._check_nothing_to_do():
                 return
             self.start_update = True
         else:
@@ -243,6 +246,26 @@ class QubesUpdater(Gtk.Application):
                 self.intro_page.head_checkbox.state = self.intro_page.head_checkbox.ALL
                 self.intro_page.select_rows()
             self.log.info("Show intro page.")
+        self._show_main_window()
+
+    def _check_nothing_to_do(self) -> bool:
+        if len(self.intro_page.get_vms_to_update()) == 0:
+            self.do_nothing = True
+            # `main()` change it to 0 unless `--signal-no-updates` is set
+            self.retcode = 100
+            return True
+        return False
+
+    def _rows_selected_in_background(self):
+        """Skip intro page once qubes to update are known, if that happened
+        after the main loop started."""
+        if self._check_nothing_to_do():
+            self.finish_if_nothing_to_do()
+            return
+        self._show_main_window()
+        self.next_clicked(None, skip_intro=True)
+
+    def _show_main_window(self):
         self.main_window.show_all()
         width = self.intro_page.vm_list.get_preferred_width().natural_width
         # Wide enough for details section to show update progress.
@@ -423,6 +446,17 @@ class QubesUpdater(Gtk.Application):
                 self.exit_future.set_result(None)
 
 
+def positive_int(value: str) -> int:
+    """argparse type for options that must be at least 1"""
+    try:
+        result = int(value)
+    except ValueError:
+        result = 0
+    if result < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer: {value!r}")
+    return result
+
+
 def parse_args(args, app):
     parser = argparse.ArgumentParser()
     try:
@@ -450,6 +484,14 @@ def parse_args(args, app):
         "(default: number of cpus)",
         type=int,
     )
+    parser.add_argument(
+        "--max-restart-concurrency",
+        action="store",
+        help="Maximum number of qubes shut down or started simultaneously "
+        "when applying updates (default: %(default)d)",
+        type=positive_int,
+        default=DEFAULT_RESTART_CONCURRENCY,
+    )
     parser.add_argument(
         "--signal-no-updates",
         action="store_true",
@@ -575,6 +617,7 @@ def skip_intro_if_args(args):
 
 
 def main(args=None):
+    setup_profiling()
     qapp = Qubes()
     cliargs = parse_args(args, qapp)
     loop = asyncio.get_event_loop()
@@ -20,10 +20,12 @@
 # USA.
 import ast
 import functools
+import itertools
+import tempfile
 import gi
 
 from enum import Enum
-from typing import List, Optional
+from typing import IO, List, Optional
 
 gi.require_version("Gtk", "3.0")  # isort:skip
 from gi.repository import Gtk
@@ -225,6 +227,102 @@ class UpdateStatus(Enum):
         return names[name]
 
 
+# how many characters of a single qube's update log are kept in memory; older
+# output is moved to a temporary file
+LOG_MEMORY_LIMIT = 1024 * 1024
+LOG_CHUNK_SIZE = 64 * 1024
+
+
+class LogBuffer:
+    """
+    Append-only text log with bounded memory usage.
+
+    Appended text is collected in chunks, so appending never copies the
+    whole log. When the in-memory part grows over max_memory characters,
+    the oldest chunks are moved to an anonymous temporary file. The full
+    log is still available through str().
+    """
+
+    def __init__(
+        self, max_memory: int = LOG_MEMORY_LIMIT, chunk_size: int = LOG_CHUNK_SIZE
+    ):
+        self.max_memory = max_memory
+        self.chunk_size = min(chunk_size, max_memory)
+        # complete chunks, oldest first
+        self._chunks: List[str] = []
+        # pieces of the chunk being filled
+        self._pieces: List[str] = []
+        self._pieces_length = 0
+        self._memory_length = 0
+        self._spill_file: Optional[IO[str]] = None
+        self.spilled_length = 0
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return self._read_spilled() + self.memory_text()
+
+    def __getitem__(self, item):
+        # log[start:] is the only slice that can be computed cheaply
+        if isinstance(item, slice) and item.stop is None and item.step is None:
+            return self.get_tail(item.start or 0)
+        return str(self)[item]
+
+    def append(self, text: str):
+        if not text:
+            return
+        self._pieces.append(text)
+        self._pieces_length += len(text)
+        self._memory_length += len(text)
+        self.length += len(text)
+
+        if self._pieces_length >= self.chunk_size:
+            self._chunks.append("".join(self._pieces))
+            self._pieces = []
+            self._pieces_length = 0
+
+        while self._memory_length > self.max_memory and self._chunks:
+            self._spill(self._chunks.pop(0))
+
+    def _spill(self, chunk: str):
+        if self._spill_file is None:
+            # pylint: disable=consider-using-with
+            self._spill_file = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self._spill_file.seek(0, 2)
+        self._spill_file.write(chunk)
+        self.spilled_length += len(chunk)
+        self._memory_length -= len(chunk)
+
+    def _read_spilled(self) -> str:
+        if self._spill_file is None:
+            return ""
+        self._spill_file.seek(0)
+        return self._spill_file.read()
+
+    def memory_text(self) -> str:
+        """The part of the log that is kept in memory."""
+        return "".join(itertools.chain(self._chunks, self._pieces))
+
+    def get_tail(self, start: int) -> str:
+        """Text appended after the first `start` characters; only the
+        needed pieces are touched, so getting a recently appended line
+        is cheap regardless of log size."""
+        needed = self.length - max(start, 0)
+        if needed <= 0:
+            return ""
+        result = []
+        for piece in itertools.chain(reversed(self._pieces), reversed(self._chunks)):
+            if needed <= 0:
+                break
+            result.append(piece[max(len(piece) - needed, 0) :])
+            needed -= len(piece)
+        if needed > 0:
+            result.append(self._read_spilled()[-needed:])
+        return "".join(reversed(result))
+
+
 class RowWrapper:
     def __init__(self, list_store, vm, raw_row: list):
         super().__init__()
@@ -311,12 +409,12 @@ class ListWrapper:
     def __len__(self) -> int:
         return len(self.list_store_wrapped)
 
-    def append_vm(self, vm, state: Optional[bool] = False):
+    def append_vm(self, vm, state: Optional[bool] = False, **kwargs):
         if state is not None:
-            qube_row = self.row_type(self.list_store_raw, vm, state)
+            qube_row = self.row_type(self.list_store_raw, vm, state, **kwargs)
             self.list_store_wrapped.append(qube_row)
         else:
-            qube_row = self.row_type(None, vm, state)
+            qube_row = self.row_type(None, vm, state, **kwargs)
             self.hidden_rows.append(qube_row)
         return qube_row
 
@@ -25,6 +25,7 @@ import json
 import sys
 import traceback
 from html import escape
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 from qubesadmin import exc
 
@@ -106,19 +107,22 @@ def check_update(vm) -> bool:
     return False
 
 
-def check_support(vm) -> bool:
+def check_support(vm, features=None) -> bool:
     """Return true if the given template/standalone vm is still supported, by
-    default returns true"""
+    default returns true. Features can be provided as an already fetched
+    dict, otherwise they are read from the vm."""
+    if features is None:
+        features = vm.features
     try:
         # first, we skip VMs with `skip-update` feature set to true
-        if bool(vm.features.get("skip-update", False)):
+        if bool(features.get("skip-update", False)):
             return True
 
         # next, check if qube itself has known eol
-        eol_string: str = vm.features.get("os-eol", "")
+        eol_string: str = features.get("os-eol", "")
 
         if not eol_string:
-            template_name: str = vm.features.get("template-name", "")
+            template_name: str = features.get("template-name", "")
             if not template_name:
                 return True
             for suffix in SUFFIXES:
@@ -130,3 +134,176 @@ def check_support(vm) -> bool:
         return True
     eol = datetime.strptime(eol_string + " UTC", "%Y-%m-%d %Z")
     return eol > datetime.now()
+
+
+class VMPropertyCache:
+    """
+    Per-process snapshot of the qube properties and storage information
+    shown in widget tooltips and menus. The snapshot is filled in a single
+    pass over all qubes and kept up to date with property-set/reset events,
+    so that reading it does not require a qubesd call.
+    """
+
+    PROPERTIES = ("template", "netvm")
+
+    def __init__(self, qapp, dispatcher=None):
+        self.qapp = qapp
+        self.dispatcher = dispatcher
+        # vm name -> property name -> str or None
+        self._properties: Dict[str, Dict[str, Optional[str]]] = {}
+        # vm name -> (disk utilization, private volume size), in bytes
+        self._storage: Dict[str, Tuple[int, int]] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.dispatcher:
+            self.register_events()
+
+    def register_events(self):
+        self.dispatcher.add_handler("property-set:*", self.property_changed)
+        self.dispatcher.add_handler("property-reset:*", self.property_changed)
+        self.dispatcher.add_handler("domain-delete", self._domain_deleted)
+        self.dispatcher.add_handler("connection-established", self._reconnected)
+
+    def unregister_events(self):
+        self.dispatcher.remove_handler("property-set:*", self.property_changed)
+        self.dispatcher.remove_handler("property-reset:*", self.property_changed)
+        self.dispatcher.remove_handler("domain-delete", self._domain_deleted)
+        self.dispatcher.remove_handler("connection-established", self._reconnected)
+
+    @staticmethod
+    def fetch_properties(vm) -> Dict[str, Optional[str]]:
+        """Get the snapshotted properties of a given qube from qubesd."""
+        result: Dict[str, Optional[str]] = {}
+        for prop in VMPropertyCache.PROPERTIES:
+            try:
+                value = getattr(vm, prop, None)
+            except exc.QubesException:
+                value = None
+            result[prop] = str(value) if value else None
+        return result
+
+    @staticmethod
+    def fetch_storage(vm) -> Tuple[int, int]:
+        """Get current disk utilization and private volume size of a given
+        qube from qubesd. Static, like fetch_properties: storing the result
+        is up to the caller (see set_storage)."""
+        try:
+            current = vm.get_disk_utilization()
+        except (exc.QubesException, KeyError):
+            current = 0
+        try:
+            maximum = vm.volumes["private"].size
+        except (exc.QubesException, KeyError):
+            maximum = 0
+        return current, maximum
+
+    def refresh_all(self, vms: Optional[Iterable] = None, storage: bool = False):
+        """Fetch properties (and, if storage is True, storage info) for
+        provided qubes (or all qubes, if none are provided) in one pass. If
+        the dispatcher is connected to qui.event_hub, the hub's snapshot is
+        used instead. Storage info costs two more qubesd calls per qube, so
+        by default it's left to be fetched later, see refresh_storage and
+        set_storage."""
+        if vms is None:
+            # only the hub dispatcher has a snapshot to offer
+            if hasattr(self.dispatcher, "get_snapshot"):
+                if self.load_snapshot(self.dispatcher.get_snapshot()):
+                    return
+            vms = self.qapp.domains
+        for vm in vms:
+            if getattr(vm, "klass", None) == "AdminVM":
+                continue
+            self._properties[vm.name] = self.fetch_properties(vm)
+            if storage:
+                self._storage[vm.name] = self.fetch_storage(vm)
+
+    def refresh_storage(self, vms: Iterable):
+        """Re-fetch storage info for provided qubes."""
+        for vm in vms:
+            self._storage[vm.name] = self.fetch_storage(vm)
+
+    def set_storage(self, vm, current: int, maximum: int):
+        """Store already fetched storage info for a qube."""
+        self._storage[str(vm)] = (current, maximum)
+
+    def export_snapshot(self) -> Dict[str, Any]:
+        """Snapshot in a JSON-serializable form, see load_snapshot."""
+        return {"properties": self._properties, "storage": self._storage}
+
+    def load_snapshot(self, snapshot: Optional[Dict[str, Any]]) -> bool:
+        """Replace the snapshot with one exported by another process (for
+        example, qui.event_hub). Returns False if there was nothing to
+        load."""
+        if not snapshot or not snapshot.get("properties"):
+            return False
+        self._properties = {
+            name: dict(properties)
+            for name, properties in snapshot.get("properties", {}).items()
+        }
+        self._storage = {
+            name: tuple(storage)
+            for name, storage in snapshot.get("storage", {}).items()
+        }
+        return True
+
+    def get_property(self, vm, prop: str) -> Optional[str]:
+        """Get property value (converted to str) or None if not set."""
+        properties = self._properties.get(vm.name)
+        if properties is not None and prop in properties:
+            self.hits += 1
+            return properties[prop]
+        self.misses += 1
+        properties = self.fetch_properties(vm)
+        self._properties[vm.name] = properties
+        return properties.get(prop)
+
+    def get_storage(self, vm) -> Tuple[int, int]:
+        """Get (disk utilization, private volume size) for a qube, in
+        bytes, or (0, 0) if it was not fetched yet. Unlike properties,
+        storage info is not fetched on a miss: it's refreshed
+        asynchronously by the owner of the cache (see set_storage)."""
+        storage = self._storage.get(vm.name)
+        if storage is not None:
+            self.hits += 1
+            return storage
+        self.misses += 1
+        return 0, 0
+
+    def invalidate(self, vm=None):
+        """Drop snapshot of a given qube, or of all qubes if vm is None."""
+        if vm is None:
+            self._properties.clear()
+            self._storage.clear()
+            return
+        self._properties.pop(str(vm), None)
+        self._storage.pop(str(vm), None)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._properties)}
+
+    def property_changed(self, vm, event, *_args, **kwargs):
+        """Event handler for property-set/reset events; it is idempotent, so
+        it can also be called manually by handlers that need to be sure the
+        snapshot is fresh regardless of handler order."""
+        prop = kwargs.get("name", event.split(":", 1)[-1])
+        properties = self._properties.get(str(vm))
+        if properties is None or prop not in self.PROPERTIES:
+            return
+        if event.startswith("property-set:") and "newvalue" in kwargs:
+            value = kwargs["newvalue"]
+            properties[prop] = str(value) if value else None
+        else:
+            # reset to default, we don't know the new value
+            properties.pop(prop, None)
+
+    def _domain_deleted(self, _submitter, _event, vm, **_kwargs):
+        self.invalidate(vm)
+
+    def _reconnected(self, _subject, _event, **_kwargs):
+        # events might have been lost while disconnected; the event hub
+        # sends connection-established once its snapshot is fresh
+        self.invalidate()
+        if hasattr(self.dispatcher, "get_snapshot"):
+            self.load_snapshot(self.dispatcher.get_snapshot())
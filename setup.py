@@ -98,7 +98,10 @@ setuptools.setup(
             "qubes-new-qube = qubes_config.new_qube.new_qube_app:main",
             "qubes-global-config = qubes_config.global_config.global_config:main",
             "qubes-policy-editor-gui = qubes_config.policy_editor.policy_editor:main",
-        ]
+        ],
+        "console_scripts": [
+            "qui-event-hub = qui.event_hub:main",
+        ],
     },
     package_data={
         "qui": [